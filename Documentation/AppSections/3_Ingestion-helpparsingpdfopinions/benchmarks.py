@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Michigan Court PDF to Markdown converter.
+
+Run directly to print timings:
+
+    python benchmarks.py classifier [--pages N] [--repeat N]
+    python benchmarks.py profiles [--pages N] [--repeat N]
+    python benchmarks.py stages [--full] [--repeat N] [--json FILE] [--pdf-dir DIR]
+    python benchmarks.py compare BASE.json NEW.json [--threshold 1.10]
+    python benchmarks.py generate OUT.pdf [--pages N] [--footnotes F] [--depth D]
+                                          [--spaced] [--two-column R] [--seed N]
+
+`stages` generates Michigan COA-style opinion PDFs with PyMuPDF, times each
+pipeline stage separately and can save the results as JSON; `compare` diffs
+two such files, e.g. from two commits. `profiles` times court profile
+dispatch against the line stages it saves.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import subprocess
+import tempfile
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import regex
+
+from pdf2md_core import (
+    BOILERPLATE_RE,
+    CAPTION_END_HINTS,
+    COURT_PROFILES,
+    FOOTNOTE_REF_CLOSE,
+    FOOTNOTE_REF_OPEN,
+    HEADING_REPLACERS,
+    LineClassifier,
+    PAGE_SEPARATOR,
+    clean_page,
+    convert_pages_to_markdown,
+    extract_meta_from_pages,
+    extract_pdf_text_with_blocks,
+    get_line_classifier,
+    join_lines_to_paragraphs,
+    link_footnote_refs,
+    map_headings,
+    select_court_profile,
+    split_body_and_footnotes,
+    _find_body_start_tagged,
+    _page_separator_lines,
+)
+
+# ===============================================
+# REFERENCE (PRE-CLASSIFIER) LINE STAGES
+# ===============================================
+# These are the original per-line implementations, kept verbatim so the
+# classifier can be checked and timed against them.
+
+def legacy_clean_page(page_text: str) -> str:
+    """Original boilerplate removal: one alternation search per line."""
+    lines = [ln for ln in page_text.splitlines() if not BOILERPLATE_RE.search(ln.strip())]
+    return "\n".join(lines).strip()
+
+def legacy_find_body_start(lines: List[str]) -> int:
+    """Original two-pass body start search."""
+    for i, ln in enumerate(lines):
+        for pat in CAPTION_END_HINTS:
+            if pat.search(ln.strip()):
+                return i
+
+    for i, ln in enumerate(lines):
+        if regex.match(r"^(I{1,6}|[A-Z]|\d+|[ivxlcdm]+)\.\s.*$", ln.strip()):
+            return i
+
+    return 0
+
+def legacy_map_headings(lines: List[str]) -> List[str]:
+    """Original heading mapping: match, then sub again on a hit."""
+    out = []
+    for ln in lines:
+        s = ln.rstrip()
+        replaced = False
+        for rx, repl in HEADING_REPLACERS:
+            m = rx.match(s)
+            if m:
+                out.append(rx.sub(repl, s))
+                replaced = True
+                break
+        if not replaced:
+            out.append(s)
+    return out
+
+def legacy_line_stages(pages: List[str]) -> List[str]:
+    """Boilerplate removal, body start and heading mapping, the original way."""
+    cleaned = [legacy_clean_page(pg) for pg in pages]
+    joined = (f"\n\n{PAGE_SEPARATOR}\n\n").join([p for p in cleaned if p])
+    all_lines = joined.splitlines()
+    while all_lines and not all_lines[0].strip():
+        all_lines.pop(0)
+    return legacy_map_headings(all_lines[legacy_find_body_start(all_lines):])
+
+def classifier_line_stages(pages: List[str]) -> List[str]:
+    """The same stages through the single-pass LineClassifier."""
+    clf = get_line_classifier()
+    separator = _page_separator_lines(clf)
+    all_lines = []
+    for pg in pages:
+        tagged = clf.classify_page(pg)
+        if not tagged:
+            continue
+        if all_lines:
+            all_lines.extend(separator)
+        all_lines.extend(tagged)
+    return [ln.markdown for ln in all_lines[_find_body_start_tagged(all_lines):]]
+
+# ===============================================
+# SYNTHETIC TEXT
+# ===============================================
+
+_WORDS = (
+    "the court defendant plaintiff trial motion evidence appeal record testimony "
+    "jury verdict statute MCL 750.316 People v Smith 123 NW2d 45 (2001) Mich App "
+    "judgment reversed affirmed remanded because however therefore pursuant to"
+).split()
+
+def synthetic_page_lines(rng: random.Random, page_no: int, lines: int = 45) -> List[str]:
+    """Lines of one opinion-like page: boilerplate, headings, body and footnotes."""
+    out = []
+    if page_no == 0:
+        out += ["STATE OF MICHIGAN", "C O U R T  O F  A P P E A L S", "", "JOHN DOE,",
+                "Plaintiff-Appellant,", "UNPUBLISHED", "January 15, 2025", "10:05 AM",
+                "v", "No. 123456", "LC No. 2023-001234-CZ", "JANE SMITH,",
+                "Before: Judge A, Judge B, and Judge C.", "", "PER CURIAM.", ""]
+    for _ in range(lines):
+        r = rng.random()
+        if r < 0.04:
+            out.append(rng.choice(["I. BACKGROUND", "II. ANALYSIS", "A. Standard of Review",
+                                   "1. Preservation", "iv. Harmless error", " B. Indented"]))
+        elif r < 0.10:
+            out.append("")
+        elif r < 0.13:
+            out.append(f"{rng.randint(1, 40)}) " + " ".join(rng.choices(_WORDS, k=9)))
+        else:
+            words = rng.choices(_WORDS, k=rng.randint(6, 14))
+            out.append(" ".join(words) + rng.choice(["", "", ".", ",", " v.", "-"]))
+    out.append(f"-{page_no + 1}-")
+    return out
+
+def synthetic_pages(pages: int, seed: int = 1) -> List[str]:
+    """Page texts for a synthetic opinion."""
+    rng = random.Random(seed)
+    return ["\n".join(synthetic_page_lines(rng, n)) for n in range(pages)]
+
+# ===============================================
+# SYNTHETIC OPINION PDFS
+# ===============================================
+
+@dataclass
+class OpinionSpec:
+    """Shape of a generated Michigan COA-style opinion PDF."""
+    pages: int = 10
+    footnote_density: float = 0.3   # Footnotes per body paragraph
+    heading_depth: int = 3          # Outline levels used: I., A., 1., i. (0-4)
+    spaced_headers: bool = False    # "S T A T E  O F  M I C H I G A N" caption
+    two_column: float = 0.0         # Share of pages laid out in two columns
+    seed: int = 1
+
+    @property
+    def name(self) -> str:
+        name = f"p{self.pages}-fn{self.footnote_density:g}-h{self.heading_depth}"
+        if self.spaced_headers:
+            name += "-spaced"
+        if self.two_column:
+            name += f"-2col{self.two_column:g}"
+        return name if self.seed == 1 else f"{name}-s{self.seed}"
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792   # US Letter, in points
+MARGIN = 72
+BODY_SIZE, FOOTNOTE_SIZE = 11, 8
+BODY_LINE = BODY_SIZE * 1.2
+COLUMN_GAP = 24
+
+_OUTLINE_LABELS = (
+    lambda n: "I" * min(n, 6),                                             # I., II., III.
+    lambda n: chr(ord("A") + (n - 1) % 26),                                # A., B., C.
+    lambda n: str(n),                                                      # 1., 2., 3.
+    lambda n: ("i", "ii", "iii", "iv", "v", "vi", "vii", "viii")[(n - 1) % 8],  # i., ii.
+)
+
+def _spaced(text: str) -> str:
+    """Letter-spaced caption text, as some COA PDFs extract it."""
+    return "  ".join(" ".join(word) for word in text.split())
+
+def _caption_lines(spec: OpinionSpec) -> List[str]:
+    state, court = "STATE OF MICHIGAN", "COURT OF APPEALS"
+    if spec.spaced_headers:
+        state, court = _spaced(state), _spaced(court)
+    return [
+        "COA 123456 JOHN DOE V JANE SMITH Opinion - Authored - Unpublished 1/15/2025", "",
+        state, court, "",
+        "JOHN DOE,", "Plaintiff-Appellant,", "", "UNPUBLISHED", "January 15, 2025", "10:05 AM", "",
+        "v", "No. 123456", "Wayne County Circuit Court", "LC No. 2023-001234-CZ", "",
+        "JANE SMITH,", "Defendant-Appellee.", "",
+        "Before: BORRELLO, P.J., and MURRAY and LETICA, JJ.", "", "PER CURIAM.", "",
+    ]
+
+def _wrap(words: List[str], width: int, rng: Optional[random.Random] = None) -> List[str]:
+    """Greedy line wrap; with ``rng``, some long words are hyphenated across lines."""
+    lines, current = [], ""
+    for word in words:
+        if current and len(current) + 1 + len(word) > width:
+            if rng and len(word) > 7 and len(current) + 5 < width and rng.random() < 0.3:
+                cut = len(word) // 2
+                lines.append(f"{current} {word[:cut]}-")
+                current = word[cut:]
+                continue
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+def _write_lines(page, x: float, y: float, lines: List[str], fontsize: float) -> None:
+    """Write lines like page.insert_text, setting marked footnote references as superscripts."""
+    writer = fitz.TextWriter(page.rect)
+    raise_by, ref_size = fontsize * 0.35, fontsize * 0.65
+    for line in lines:
+        pos = fitz.Point(x, y)
+        for i, part in enumerate(line.split(FOOTNOTE_REF_OPEN)):
+            ref, rest = part.split(FOOTNOTE_REF_CLOSE, 1) if i else ("", part)
+            if ref:
+                _, pos = writer.append((pos.x, pos.y - raise_by), ref, fontsize=ref_size)
+                pos = fitz.Point(pos.x, pos.y + raise_by)
+            if rest:
+                _, pos = writer.append(pos, rest, fontsize=fontsize)
+        y += fontsize * 1.2
+    writer.write_text(page)
+
+class _OpinionWriter:
+    """Generates the text of an opinion page by page."""
+
+    def __init__(self, spec: OpinionSpec):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.counters = [0, 0, 0, 0]
+        self.footnote_no = 0
+
+    def heading(self) -> str:
+        depth = self.rng.randint(1, self.spec.heading_depth)
+        self.counters[depth - 1] += 1
+        for deeper in range(depth, len(self.counters)):
+            self.counters[deeper] = 0
+        label = _OUTLINE_LABELS[depth - 1](self.counters[depth - 1])
+        title = " ".join(self.rng.choices(_WORDS, k=self.rng.randint(1, 4)))
+        return f"{label}. {title.upper() if depth == 1 else title.capitalize()}"
+
+    def paragraph(self, width: int) -> Tuple[List[str], List[str]]:
+        """Wrapped paragraph lines and the footnote definitions it references."""
+        words = []
+        for _ in range(self.rng.randint(3, 6)):
+            sentence = self.rng.choices(_WORDS, k=self.rng.randint(8, 20))
+            sentence[0] = sentence[0].capitalize()
+            sentence[-1] += "."
+            words += sentence
+
+        footnotes = []
+        density = self.spec.footnote_density
+        while density > 0 and self.rng.random() < density:
+            density -= 1
+            self.footnote_no += 1
+            i = self.rng.randrange(len(words))
+            if words[i][-1:].isalpha():
+                words[i] += f"{FOOTNOTE_REF_OPEN}{self.footnote_no}{FOOTNOTE_REF_CLOSE}"
+                text = " ".join(self.rng.choices(_WORDS, k=self.rng.randint(8, 30)))
+                footnotes.append(f"{self.footnote_no}) {text.capitalize()}.")
+        return _wrap(words, width, self.rng), footnotes
+
+    def page(self, page_no: int, width: int, body_lines: int) -> Tuple[List[str], List[str]]:
+        """Body lines (blank line between paragraphs) and footnote lines for one page."""
+        body = _caption_lines(self.spec) if page_no == 0 else []
+        footnotes = []
+        while len(body) < body_lines:
+            if self.spec.heading_depth and self.rng.random() < 0.15:
+                body += [self.heading(), ""]
+            lines, notes = self.paragraph(width)
+            body += lines[:max(1, body_lines - len(body))] + [""]
+            for note in notes:
+                footnotes += _wrap(note.split(), width * 3 // 2) + [""]
+        return body[:body_lines], footnotes[:12]
+
+def write_synthetic_opinion_pdf(pdf_path: Path, spec: OpinionSpec) -> Path:
+    """
+    Write a Michigan COA-style opinion PDF for benchmarks and tests.
+
+    Pages have a caption (first page), outline headings, wrapped and
+    hyphenated body text with superscript footnote references, footnote
+    definitions in a smaller font at the bottom and a "-N-" page number. Output is
+    deterministic for a given spec.
+
+    Returns:
+        pdf_path
+    """
+    writer = _OpinionWriter(spec)
+    doc = fitz.open()
+    footnote_top = PAGE_HEIGHT - MARGIN - 12 * FOOTNOTE_SIZE * 1.2
+    lines_per_column = int((footnote_top - MARGIN) / BODY_LINE) - 1
+    column_rng = random.Random(spec.seed + 1)
+
+    for n in range(spec.pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        two_column = n > 0 and column_rng.random() < spec.two_column
+        usable = PAGE_WIDTH - 2 * MARGIN
+
+        if two_column:
+            column_width = (usable - COLUMN_GAP) / 2
+            chars = int(column_width / (BODY_SIZE * 0.5))
+            footnotes = []
+            for col in range(2):
+                body, notes = writer.page(n, chars, lines_per_column)
+                footnotes += notes
+                _write_lines(page, MARGIN + col * (column_width + COLUMN_GAP), MARGIN, body, BODY_SIZE)
+        else:
+            body, footnotes = writer.page(n, int(usable / (BODY_SIZE * 0.5)), lines_per_column)
+            _write_lines(page, MARGIN, MARGIN, body, BODY_SIZE)
+
+        if footnotes:
+            _write_lines(page, MARGIN, footnote_top, footnotes[:12], FOOTNOTE_SIZE)
+        page.insert_text((PAGE_WIDTH / 2 - 8, PAGE_HEIGHT - MARGIN / 2), f"-{n + 1}-", fontsize=BODY_SIZE)
+
+    pdf_path = Path(pdf_path)
+    pdf_path.parent.mkdir(parents=True, exist_ok=True)
+    doc.save(str(pdf_path), garbage=3, deflate=True)
+    doc.close()
+    return pdf_path
+
+# Benchmark suite: page counts from 1 to 2,000 plus structural variants
+QUICK_SUITE = [
+    OpinionSpec(pages=1),
+    OpinionSpec(pages=10),
+    OpinionSpec(pages=100),
+    OpinionSpec(pages=100, footnote_density=1.5, heading_depth=4),
+    OpinionSpec(pages=100, footnote_density=0.0, heading_depth=1),
+    OpinionSpec(pages=100, spaced_headers=True, two_column=0.5),
+]
+FULL_SUITE = QUICK_SUITE + [
+    OpinionSpec(pages=500),
+    OpinionSpec(pages=2000),
+    OpinionSpec(pages=2000, footnote_density=1.5, heading_depth=4, two_column=0.3),
+]
+
+# ===============================================
+# BENCHMARKS
+# ===============================================
+
+def _best_time(fn, *args, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_line_classifier(pages: int = 200, repeat: int = 5) -> Tuple[float, float]:
+    """
+    Time the line stages before and after the single-pass classifier.
+
+    Returns:
+        Tuple of (legacy_lines_per_sec, classifier_lines_per_sec)
+    """
+    texts = synthetic_pages(pages)
+    n_lines = sum(len(t.splitlines()) for t in texts)
+
+    if legacy_line_stages(texts) != classifier_line_stages(texts):
+        raise AssertionError("classifier output differs from the legacy line stages")
+
+    legacy = n_lines / _best_time(legacy_line_stages, texts, repeat=repeat)
+    classifier = n_lines / _best_time(classifier_line_stages, texts, repeat=repeat)
+    return legacy, classifier
+
+def _classify_pages(clf: LineClassifier, pages: List[str]) -> int:
+    return sum(len(clf.classify_page(pg)) for pg in pages)
+
+def bench_court_profiles(pages: int = 200, repeat: int = 5) -> Dict[str, float]:
+    """
+    Time first-page profile dispatch and the line stages with one profile
+    against one classifier holding every profile's boilerplate.
+
+    Returns:
+        Dict with dispatch_us (per document), single_lines_per_sec and
+        merged_lines_per_sec
+    """
+    texts = synthetic_pages(pages)
+    n_lines = sum(len(t.splitlines()) for t in texts)
+    profile = select_court_profile(texts[0])
+    single = get_line_classifier(profile)
+    merged = LineClassifier(
+        [p for prof in COURT_PROFILES.values() for p in prof.boilerplate],
+        HEADING_REPLACERS,
+        list(CAPTION_END_HINTS) + [rx for prof in COURT_PROFILES.values() for rx in prof.body_markers],
+    )
+    
+    dispatch = _best_time(lambda: [select_court_profile(texts[0]) for _ in range(1000)], repeat=repeat) / 1000
+    return {
+        "profile": profile.name,
+        "dispatch_us": dispatch * 1e6,
+        "single_lines_per_sec": n_lines / _best_time(_classify_pages, single, texts, repeat=repeat),
+        "merged_lines_per_sec": n_lines / _best_time(_classify_pages, merged, texts, repeat=repeat),
+    }
+
+# Stages in pipeline order. "boilerplate" and "map_headings" time the
+# standalone functions; "line_classifier" is the fused pass the pipeline
+# actually runs (boilerplate, body start and headings together).
+STAGES = (
+    "extract", "meta", "boilerplate", "map_headings", "line_classifier",
+    "join_paragraphs", "split_footnotes", "link_footnotes", "total",
+)
+
+def bench_stages(pdf_path: Path, repeat: int = 3) -> Dict[str, float]:
+    """
+    Time each pipeline stage on one PDF, best of ``repeat`` runs.
+
+    Every stage gets the same input it sees inside convert_pdf_to_markdown.
+
+    Returns:
+        Dict of stage name -> seconds, plus "pages" and "paragraphs" counts
+    """
+    # Extracted as for inline footnotes, with references marked
+    pages = extract_pdf_text_with_blocks(pdf_path, footnote_refs=True)
+    cleaned = "\n".join(clean_page(pg) for pg in pages).splitlines()
+    body_lines = classifier_line_stages(pages)
+    paras = join_lines_to_paragraphs(body_lines)
+    body, footnotes = split_body_and_footnotes(paras)
+
+    def total():
+        pages = extract_pdf_text_with_blocks(pdf_path, footnote_refs=True)
+        convert_pages_to_markdown(pages, inline_footnotes=True)
+
+    stages = {
+        "extract": (lambda: extract_pdf_text_with_blocks(pdf_path, footnote_refs=True),),
+        "meta": (extract_meta_from_pages, pages),
+        "boilerplate": (lambda: [clean_page(pg) for pg in pages],),
+        "map_headings": (map_headings, cleaned),
+        "line_classifier": (classifier_line_stages, pages),
+        "join_paragraphs": (join_lines_to_paragraphs, body_lines),
+        "split_footnotes": (split_body_and_footnotes, paras),
+        "link_footnotes": (link_footnote_refs, body, footnotes),
+        "total": (total,),
+    }
+    timings = {name: _best_time(fn, *args, repeat=repeat) for name, (fn, *args) in stages.items()}
+    timings["pages"] = len(pages)
+    timings["paragraphs"] = len(paras)
+    return timings
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, cwd=Path(__file__).parent, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+def run_stage_suite(specs: List[OpinionSpec], pdf_dir: Path, repeat: int = 3,
+                    progress: bool = True) -> dict:
+    """
+    Generate (or reuse) each spec's PDF and time its stages.
+
+    Returns:
+        JSON-serializable report: environment plus one entry per case
+    """
+    report = {
+        "schema": 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "cases": [],
+    }
+    for spec in specs:
+        pdf_path = Path(pdf_dir) / f"{spec.name}.pdf"
+        if not pdf_path.exists():
+            write_synthetic_opinion_pdf(pdf_path, spec)
+        timings = bench_stages(pdf_path, repeat=repeat)
+        case = {
+            "name": spec.name,
+            "spec": asdict(spec),
+            "bytes": pdf_path.stat().st_size,
+            "pages": timings.pop("pages"),
+            "paragraphs": timings.pop("paragraphs"),
+            "seconds": timings,
+        }
+        report["cases"].append(case)
+        if progress:
+            print(f"{spec.name:40s} {case['pages'] / timings['total']:10,.0f} pages/s")
+    return report
+
+def print_stage_report(report: dict):
+    """Print a stage x case table in milliseconds."""
+    print(f"\n{'stage (ms)':18s}" + "".join(f"{c['name'][:14]:>15s}" for c in report["cases"]))
+    for stage in STAGES:
+        print(f"{stage:18s}" + "".join(f"{c['seconds'][stage] * 1000:15.2f}" for c in report["cases"]))
+
+def compare_reports(base: dict, new: dict, threshold: float = 1.10) -> List[Tuple[str, str, float]]:
+    """
+    Compare two stage reports case by case.
+
+    Returns:
+        (case, stage, new/base time ratio) for every stage slower than threshold
+    """
+    base_cases = {c["name"]: c for c in base["cases"]}
+    print(f"{'case':40s} {'stage':18s} {'base ms':>10s} {'new ms':>10s} {'ratio':>7s}")
+    regressions = []
+    for case in new["cases"]:
+        old = base_cases.get(case["name"])
+        if old is None:
+            continue
+        for stage in STAGES:
+            before, after = old["seconds"].get(stage), case["seconds"].get(stage)
+            if not before or after is None:
+                continue
+            ratio = after / before
+            flag = "  SLOWER" if ratio > threshold else ""
+            print(f"{case['name']:40s} {stage:18s} {before * 1000:10.2f} {after * 1000:10.2f} {ratio:7.2f}{flag}")
+            if ratio > threshold:
+                regressions.append((case["name"], stage, ratio))
+    return regressions
+
+USAGE = """Usage:
+  python benchmarks.py classifier [--pages N] [--repeat N]
+  python benchmarks.py profiles [--pages N] [--repeat N]
+  python benchmarks.py stages [--full] [--repeat N] [--json FILE] [--pdf-dir DIR]
+  python benchmarks.py compare BASE.json NEW.json [--threshold 1.10]
+  python benchmarks.py generate OUT.pdf [--pages N] [--footnotes F] [--depth D] [--spaced] [--two-column R] [--seed N]"""
+
+def main():
+    """Command line entry point."""
+    args = sys.argv[1:]
+
+    def option(name: str, default, kind=int):
+        if name in args:
+            return kind(args[args.index(name) + 1])
+        return default
+
+    if not args or args[0] not in ("classifier", "profiles", "stages", "compare", "generate"):
+        print(USAGE)
+        sys.exit(1)
+
+    if args[0] == "classifier":
+        legacy, classifier = bench_line_classifier(option("--pages", 200), option("--repeat", 5))
+        print(f"legacy line stages:     {legacy:12,.0f} lines/s")
+        print(f"single-pass classifier: {classifier:12,.0f} lines/s")
+        print(f"speedup:                {classifier / legacy:12.2f}x")
+
+    elif args[0] == "profiles":
+        result = bench_court_profiles(option("--pages", 200), option("--repeat", 5))
+        print(f"profiles loaded:        {len(COURT_PROFILES):12d} ({', '.join(COURT_PROFILES)})")
+        print(f"dispatch per document:  {result['dispatch_us']:12.1f} us ({result['profile']})")
+        print(f"{result['profile'] + ' profile only:':24s}{result['single_lines_per_sec']:12,.0f} lines/s")
+        print(f"all profiles merged:    {result['merged_lines_per_sec']:12,.0f} lines/s")
+        print(f"speedup:                {result['single_lines_per_sec'] / result['merged_lines_per_sec']:12.2f}x")
+
+    elif args[0] == "stages":
+        specs = FULL_SUITE if "--full" in args else QUICK_SUITE
+        pdf_dir = option("--pdf-dir", None, Path)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report = run_stage_suite(specs, pdf_dir or Path(temp_dir), option("--repeat", 3))
+        print_stage_report(report)
+        out = option("--json", None, Path)
+        if out:
+            out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+            print(f"\nSaved: {out}")
+
+    elif args[0] == "compare":
+        if len(args) < 3:
+            print(USAGE)
+            sys.exit(1)
+        base, new = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args[1:3])
+        regressions = compare_reports(base, new, option("--threshold", 1.10, float))
+        print(f"\n{len(regressions)} stage(s) slower than threshold")
+        sys.exit(1 if regressions else 0)
+
+    elif args[0] == "generate":
+        if len(args) < 2:
+            print(USAGE)
+            sys.exit(1)
+        spec = OpinionSpec(
+            pages=option("--pages", 10),
+            footnote_density=option("--footnotes", 0.3, float),
+            heading_depth=option("--depth", 3),
+            spaced_headers="--spaced" in args,
+            two_column=option("--two-column", 0.0, float),
+            seed=option("--seed", 1),
+        )
+        path = write_synthetic_opinion_pdf(Path(args[1]), spec)
+        print(f"Wrote {path} ({spec.name}, {path.stat().st_size:,} bytes)")
+
+if __name__ == "__main__":
+    main()
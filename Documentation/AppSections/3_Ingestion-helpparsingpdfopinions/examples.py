@@ -2,10 +2,12 @@
 """
 Example implementations showing how to integrate the Michigan Court
 PDF to Markdown converter into different types of systems.
+
+The converter is imported inside each example, so printing usage or
+--help does not load it.
 """
 
 from pathlib import Path
-from pdf2md_core import convert_pdf_to_markdown
 import json
 import tempfile
 import sys
@@ -14,62 +16,96 @@ import sys
 # Example 1: Simple Batch Processor
 # ========================================
 
-def batch_convert_directory(input_dir: str, output_dir: str):
+def batch_convert_directory(input_dir: str, output_dir: str, workers: int = None,
+                            cache_dir: str = None, ledger_path: str = None,
+                            resume: bool = False, retry_failed: bool = False,
+                            ocr_engine: str = None) -> int:
     """
     Convert all PDFs in a directory to Markdown files.
     
     Args:
         input_dir: Path to directory containing PDF files
         output_dir: Path to directory for output files
+        workers: Number of worker processes (default: one per CPU)
+        cache_dir: Optional conversion cache directory; unchanged PDFs are
+            served from the cache without re-extraction
+        ledger_path: Optional SQLite job ledger recording every file's outcome
+        resume: With a ledger, skip files an earlier run already converted
+        retry_failed: With a ledger, only retry files that failed before
+        ocr_engine: Optional OCR engine name (e.g. "tesseract") for scanned
+            PDFs; without one they are reported as failed
+        
+    Returns:
+        Exit code: the number of files that failed to convert
     """
+    from pdf2md_core import run_batch, batch_exit_code, ConversionCache
+    from pdf2md_ledger import JobLedger
+    
     input_path = Path(input_dir)
     output_path = Path(output_dir)
     
     if not input_path.exists():
         print(f"❌ Input directory not found: {input_dir}")
-        return
+        return 1
     
     # Create output directory
     output_path.mkdir(parents=True, exist_ok=True)
     
     # Find all PDF files
-    pdf_files = list(input_path.glob("*.pdf"))
+    pdf_files = sorted(input_path.glob("*.pdf"))
     
     if not pdf_files:
         print(f"No PDF files found in {input_dir}")
-        return
+        return 0
     
     print(f"🔄 Converting {len(pdf_files)} PDF files...")
     
-    successful = 0
-    failed = 0
+    def report(done, total, result, elapsed):
+        rate = done / elapsed if elapsed > 0 else 0.0
+        if result.success:
+            print(f"[{done}/{total}] {result.pdf_path.name} ✅ ({rate:.1f} files/s)")
+        else:
+            print(f"[{done}/{total}] {result.pdf_path.name} ❌ {result.error}")
     
-    for pdf_file in pdf_files:
-        print(f"Processing {pdf_file.name}...", end=" ")
-        
-        success, md_path, meta_path = convert_pdf_to_markdown(
-            pdf_path=pdf_file,
-            output_dir=output_path,
-            inline_footnotes=False
+    ledger = JobLedger(Path(ledger_path)) if ledger_path else None
+    try:
+        summary = run_batch(
+            pdf_files,
+            output_path,
+            inline_footnotes=False,
+            workers=workers,
+            ordered=False,
+            progress=report,
+            cache=ConversionCache(Path(cache_dir)) if cache_dir else None,
+            ledger=ledger,
+            resume=resume,
+            retry_failed=retry_failed,
+            ocr_engine=ocr_engine
         )
         
-        if success:
-            print("✅")
-            successful += 1
-        else:
-            print("❌")
-            failed += 1
-    
-    print(f"\n📊 Results: {successful} successful, {failed} failed")
+        print(f"\n📊 Results: {summary.succeeded} successful, {summary.failed} failed "
+              f"in {summary.elapsed:.1f}s ({summary.files_per_second:.1f} files/s)")
+        if summary.skipped:
+            print(f"⏭️  {summary.skipped} files skipped (already done or waiting to retry)")
+        if ledger is not None:
+            print(f"\n{ledger.report(5)}")
+    finally:
+        if ledger is not None:
+            ledger.close()
+    return batch_exit_code(summary)
 
 # ========================================
 # Example 2: Web API Server
 # ========================================
 
-def create_web_api():
+def create_web_api(cache_dir: str = None):
     """
     Example Flask web API for PDF conversion.
     
+    Args:
+        cache_dir: Optional conversion cache directory, so duplicate uploads
+            are answered without re-running the pipeline
+    
     Endpoints:
         POST /convert - Upload PDF and get Markdown
         GET /health - Health check
@@ -79,9 +115,11 @@ def create_web_api():
     except ImportError:
         print("Flask not installed. Run: pip install flask")
         return
+    from pdf2md_core import convert_pdf, ConversionCache
     
     app = Flask(__name__)
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    cache = ConversionCache(Path(cache_dir)) if cache_dir else None
     
     @app.route('/health', methods=['GET'])
     def health_check():
@@ -102,46 +140,27 @@ def create_web_api():
         if not file.filename.lower().endswith('.pdf'):
             return jsonify({'error': 'File must be a PDF'}), 400
         
-        # Process the file
+        # Convert the upload in memory (no temp files)
         try:
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_dir = Path(temp_dir)
-                
-                # Save uploaded file
-                pdf_path = temp_dir / file.filename
-                file.save(pdf_path)
-                
-                # Convert to markdown
-                success, md_path, meta_path = convert_pdf_to_markdown(
-                    pdf_path=pdf_path,
-                    output_dir=temp_dir,
-                    inline_footnotes=request.form.get('inline_footnotes', 'false').lower() == 'true'
-                )
-                
-                if success and md_path:
-                    # Read results
-                    markdown_content = md_path.read_text(encoding='utf-8')
-                    
-                    metadata = {}
-                    if meta_path:
-                        metadata = json.loads(meta_path.read_text(encoding='utf-8'))
-                    
-                    return jsonify({
-                        'success': True,
-                        'filename': file.filename,
-                        'markdown': markdown_content,
-                        'metadata': metadata,
-                        'stats': {
-                            'length': len(markdown_content),
-                            'paragraphs': markdown_content.count('\n\n'),
-                            'headings': markdown_content.count('#')
-                        }
-                    })
-                else:
-                    return jsonify({'error': 'Conversion failed'}), 500
-                    
+            markdown_content, metadata = convert_pdf(
+                file.stream,
+                inline_footnotes=request.form.get('inline_footnotes', 'false').lower() == 'true',
+                cache=cache
+            )
         except Exception as e:
             return jsonify({'error': f'Processing error: {str(e)}'}), 500
+        
+        return jsonify({
+            'success': True,
+            'filename': file.filename,
+            'markdown': markdown_content,
+            'metadata': metadata,
+            'stats': {
+                'length': len(markdown_content),
+                'paragraphs': markdown_content.count('\n\n'),
+                'headings': markdown_content.count('#')
+            }
+        })
     
     return app
 
@@ -176,6 +195,18 @@ def create_cli_tool():
         batch_parser = subparsers.add_parser('batch', help='Batch convert directory')
         batch_parser.add_argument('input_dir', help='Input directory containing PDFs')
         batch_parser.add_argument('output_dir', help='Output directory for Markdown files')
+        batch_parser.add_argument('--workers', '-j', type=int, default=None,
+                                 help='Number of worker processes (default: one per CPU)')
+        batch_parser.add_argument('--cache', default=None,
+                                 help='Conversion cache directory (skips unchanged PDFs)')
+        batch_parser.add_argument('--ledger', default=None,
+                                 help='SQLite job ledger recording each file (enables --resume)')
+        batch_parser.add_argument('--resume', action='store_true',
+                                 help='Skip files the ledger already records as converted')
+        batch_parser.add_argument('--retry-failed', action='store_true',
+                                 help='Only retry files the ledger records as failed')
+        batch_parser.add_argument('--ocr', default=None, metavar='ENGINE',
+                                 help='OCR engine for scanned PDFs, e.g. tesseract')
         
         # Info command
         info_parser = subparsers.add_parser('info', help='Show PDF information')
@@ -189,6 +220,7 @@ def create_cli_tool():
             
             if input_path.is_file():
                 # Single file conversion
+                from pdf2md_core import convert_pdf_to_markdown
                 success, md_path, meta_path = convert_pdf_to_markdown(
                     input_path, output_path, args.inline_footnotes
                 )
@@ -207,14 +239,15 @@ def create_cli_tool():
             
             elif input_path.is_dir():
                 # Directory conversion
-                batch_convert_directory(str(input_path), str(output_path))
+                sys.exit(batch_convert_directory(str(input_path), str(output_path)))
         
         elif args.command == 'batch':
-            batch_convert_directory(args.input_dir, args.output_dir)
+            sys.exit(batch_convert_directory(args.input_dir, args.output_dir, args.workers, args.cache,
+                                             args.ledger, args.resume, args.retry_failed, args.ocr))
         
         elif args.command == 'info':
-            # Show PDF information
-            from pdf2md_core import extract_pdf_text_with_blocks, extract_meta_from_pages
+            # Show PDF information (only the first page is read)
+            from pdf2md_core import read_first_page, extract_meta_from_pages
             
             pdf_path = Path(args.pdf_file)
             if not pdf_path.exists():
@@ -222,19 +255,23 @@ def create_cli_tool():
                 sys.exit(1)
             
             try:
-                pages = extract_pdf_text_with_blocks(pdf_path)
-                metadata = extract_meta_from_pages(pages)
+                triage_found = []
+                first_page, page_count = read_first_page(pdf_path, triage=triage_found)
+                metadata = extract_meta_from_pages([first_page] if page_count else [])
+                triage = triage_found[0]
                 
                 print(f"📄 PDF Information: {pdf_path.name}")
-                print(f"   Pages: {len(pages)}")
-                print(f"   Total characters: {sum(len(p) for p in pages)}")
+                print(f"   Pages: {page_count}")
+                print(f"   First page characters: {len(first_page)}")
+                print(f"   Triage (first page): {triage.kind} ({triage.chars_per_page:.0f} characters, "
+                      f"{triage.image_coverage:.0%} image coverage)")
                 print("\n📋 Extracted Metadata:")
                 for key, value in metadata.items():
                     if value:
                         print(f"   {key}: {value}")
                 
-                if pages:
-                    sample = pages[0][:200] + "..." if len(pages[0]) > 200 else pages[0]
+                if first_page:
+                    sample = first_page[:200] + "..." if len(first_page) > 200 else first_page
                     print(f"\n📝 First page sample:\n{sample}")
                     
             except Exception as e:
@@ -270,44 +307,36 @@ class DocumentProcessor:
         Returns:
             Dictionary with processing results
         """
-        # Create temporary output directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_dir = Path(temp_dir)
-            
-            # Convert PDF
-            success, md_path, meta_path = convert_pdf_to_markdown(
-                pdf_path=pdf_path,
-                output_dir=temp_dir,
-                inline_footnotes=True
-            )
-            
-            if not success:
-                return {'success': False, 'error': 'Conversion failed'}
-            
-            # Read results
-            markdown_content = md_path.read_text(encoding='utf-8')
-            metadata = {}
-            if meta_path:
-                metadata = json.loads(meta_path.read_text(encoding='utf-8'))
-            
-            result = {
-                'success': True,
-                'filename': pdf_path.name,
-                'markdown': markdown_content,
-                'metadata': metadata,
-                'stats': {
-                    'length': len(markdown_content),
-                    'word_count': len(markdown_content.split()),
-                    'paragraph_count': markdown_content.count('\n\n'),
-                    'heading_count': markdown_content.count('#')
-                }
+        from pdf2md_core import convert_pdf
+        
+        # Convert PDF in memory
+        try:
+            markdown_content, metadata = convert_pdf(pdf_path, inline_footnotes=True)
+        except Exception as e:
+            return {'success': False, 'error': f'Conversion failed: {e}'}
+        
+        result = self._build_result(pdf_path, markdown_content, metadata)
+        
+        # Store in database if requested
+        if store_in_db:
+            self._store_document(result)
+        
+        return result
+    
+    def _build_result(self, pdf_path: Path, markdown_content: str, metadata: dict):
+        """Build the result dictionary for a converted document."""
+        return {
+            'success': True,
+            'filename': pdf_path.name,
+            'markdown': markdown_content,
+            'metadata': metadata,
+            'stats': {
+                'length': len(markdown_content),
+                'word_count': len(markdown_content.split()),
+                'paragraph_count': markdown_content.count('\n\n'),
+                'heading_count': markdown_content.count('#')
             }
-            
-            # Store in database if requested
-            if store_in_db:
-                self._store_document(result)
-            
-            return result
+        }
     
     def _store_document(self, doc_data):
         """
@@ -318,15 +347,40 @@ class DocumentProcessor:
         # Your database storage logic here
         pass
     
-    def process_directory(self, directory_path: Path):
-        """Process all PDFs in a directory."""
-        pdf_files = list(directory_path.glob("*.pdf"))
+    def process_directory(self, directory_path: Path, workers: int = None):
+        """Process all PDFs in a directory using the parallel batch engine."""
+        from pdf2md_core import run_batch
+        
+        pdf_files = sorted(directory_path.glob("*.pdf"))
         results = []
         
-        for pdf_file in pdf_files:
-            print(f"Processing {pdf_file.name}...")
-            result = self.process_pdf(pdf_file)
-            results.append(result)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            summary = run_batch(
+                pdf_files,
+                Path(temp_dir),
+                inline_footnotes=True,
+                workers=workers
+            )
+            
+            for batch_result in summary.results:
+                if not batch_result.success:
+                    results.append({
+                        'success': False,
+                        'filename': batch_result.pdf_path.name,
+                        'error': batch_result.error
+                    })
+                    continue
+                
+                metadata = {}
+                if batch_result.meta_path:
+                    metadata = json.loads(batch_result.meta_path.read_text(encoding='utf-8'))
+                result = self._build_result(
+                    batch_result.pdf_path,
+                    batch_result.md_path.read_text(encoding='utf-8'),
+                    metadata
+                )
+                self._store_document(result)
+                results.append(result)
         
         return results
 
@@ -341,7 +395,7 @@ if __name__ == "__main__":
         print("📚 PDF to Markdown Converter - Example Implementations")
         print("\nUsage:")
         print("  python examples.py batch <input_dir> <output_dir>")
-        print("  python examples.py server")
+        print("  python examples.py server [cache_dir]")
         print("  python examples.py cli [args...]")
         print("  python examples.py test")
         sys.exit(1)
@@ -352,19 +406,20 @@ if __name__ == "__main__":
         if len(sys.argv) != 4:
             print("Usage: python examples.py batch <input_dir> <output_dir>")
             sys.exit(1)
-        batch_convert_directory(sys.argv[2], sys.argv[3])
+        sys.exit(batch_convert_directory(sys.argv[2], sys.argv[3]))
     
     elif command == "server":
-        app = create_web_api()
+        app = create_web_api(sys.argv[2] if len(sys.argv) > 2 else None)
         if app:
             print("🚀 Starting web server on http://127.0.0.1:5000")
             print("📝 Upload PDFs to: POST http://127.0.0.1:5000/convert")
-            app.run(debug=True, port=5000)
+            print("💡 For production use the async service: python pdf2md_service.py")
+            app.run(port=5000)
     
     elif command == "cli":
         cli_main = create_cli_tool()
-        # Remove the first two arguments (python examples.py cli)
-        sys.argv = sys.argv[2:]
+        # Drop "examples.py" so argparse sees the arguments after "cli"
+        sys.argv = sys.argv[1:]
         cli_main()
     
     elif command == "test":
@@ -7,16 +7,22 @@ This is the rule-based conversion system that works without AI/LLMs.
 It uses pattern recognition to identify and format Michigan court opinions.
 """
 
+import os
 import re
+import sys
 import json
+import time
+import mmap
+import struct
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+import concurrent.futures
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Tuple, Optional
-
-try:
-    import fitz  # PyMuPDF
-except ImportError:
-    print("ERROR: PyMuPDF (fitz) not installed. Run: pip install PyMuPDF")
-    raise
+from typing import (TYPE_CHECKING, BinaryIO, Callable, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Tuple,
+                    Optional, Union)
 
 try:
     import regex
@@ -24,323 +30,2302 @@ except ImportError:
     print("ERROR: regex module not installed. Run: pip install regex")
     raise
 
+if TYPE_CHECKING:
+    # The indexes and the ledger live in their own modules, which import
+    # this one; the converter imports them where it uses them
+    from pdf2md_dedup import DuplicateIndex, DuplicateMatch
+    from pdf2md_ledger import JobLedger
+    from pdf2md_search import SearchIndex
+
+# PyMuPDF takes longer to import than everything else here together, so it
+# is imported on first use (_load_fitz): --help, the index and ledger
+# commands and modules that only need the rules never load it.
+fitz = None
+
+def _load_fitz():
+    """Import PyMuPDF (once) and return the module."""
+    global fitz
+    if fitz is None:
+        try:
+            import pymupdf as module
+        except ImportError:
+            try:
+                import fitz as module  # PyMuPDF before 1.24.3
+            except ImportError:
+                print("ERROR: PyMuPDF (fitz) not installed. Run: pip install PyMuPDF")
+                raise
+        fitz = module
+    return fitz
+
+class LazyPattern:
+    """
+    A regex that is compiled the first time it is used.
+    
+    Stands in for regex.compile(pattern, flags) in the module-level rules,
+    so importing the module compiles nothing. After the first use, the
+    compiled pattern's methods are stored on the instance, so later calls
+    cost the same as on the compiled pattern itself.
+    """
+    
+    _METHODS = ("search", "match", "fullmatch", "sub", "subn", "split", "splititer",
+                "finditer", "findall", "scanner", "flags", "groups", "groupindex")
+    
+    def __init__(self, pattern: str, flags: int = 0):
+        self.pattern = pattern
+        self._flags = flags
+        self._compiled = None
+    
+    def compiled(self):
+        """The compiled regex pattern."""
+        if self._compiled is None:
+            self._compiled = regex.compile(self.pattern, self._flags)
+            for name in self._METHODS:
+                setattr(self, name, getattr(self._compiled, name))
+        return self._compiled
+    
+    def __getattr__(self, name: str):
+        # Only reached before the first compile (or for rarely used attributes)
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.compiled(), name)
+    
+    def __repr__(self) -> str:
+        return f"LazyPattern({self.pattern!r}, {self._flags})"
+
 # ===============================================
 # PATTERN RECOGNITION RULES
 # ===============================================
 
-# Boilerplate patterns to remove from Michigan Court of Appeals PDFs
-COA_BOILERPLATE_PATTERNS = [
-    # Normal and "spaced-letter" variants:
-    r"^\s*STATE\s+OF\s+MICHIGAN\s*$",
-    r"^\s*S\s*T\s*A\s*T\s*E\s+O\s*F\s+M\s*I\s*C\s*H\s*I\s*G\s*A\s*N\s*$",
-    r"^\s*COURT\s+OF\s+APPEALS\s*$",
-    r"^\s*C\s*O\s*U\s*R\s*T\s+O\s*F\s*A\s*P\s*P\s*E\s*A\s*L\s*S\s*$",
-    r"^\s*-\d+-\s*$",  # Page numbers like "-3-"
-    r"If this opinion indicates that it is ['']FOR PUBLICATION[''].*$",
-    r"^UNPUBLISHED\b.*$",
-    r"^PUBLISHED\b.*$",
-    r"^No\.\s*\d+\b.*$",  # Case numbers
-    r"^LC\s*No\.\s*\S+.*$",  # Lower court numbers
-    r"^\d{1,2}:\d{2}\s*(AM|PM)\s*$",  # Timestamps
-]
+# Court-specific rules (boilerplate, case name banner, body start markers,
+# metadata patterns) come from one JSON profile per court in
+# COURT_PROFILE_DIR. The first page of each document selects its profile
+# (see select_court_profile), and only that profile's patterns run on it.
+COURT_PROFILE_DIR = Path(__file__).resolve().parent / "court_profiles"
+DEFAULT_COURT_PROFILE = "coa"  # Used when no profile's fingerprint matches
+
+class CourtProfile(NamedTuple):
+    """The rules for one court, as loaded from a court_profiles/*.json file."""
+    name: str
+    court: str                           # Stored as "court" in the metadata
+    fingerprint: List[str]               # First-page patterns that select this profile
+    boilerplate: List[str]               # Lines removed before conversion
+    banner: Optional[LazyPattern]        # Case name banner (group 1), or None
+    body_markers: List[LazyPattern]      # Body start markers besides CAPTION_END_HINTS
+    meta_patterns: Dict[str, LazyPattern]  # Overrides of META_PATTERNS, plus optional "court"
+
+def load_court_profile(path: Path) -> CourtProfile:
+    """Read one court profile from its JSON file."""
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    flags = regex.IGNORECASE
+    return CourtProfile(
+        name=data["name"],
+        court=data["court"],
+        fingerprint=list(data.get("fingerprint", [])),
+        boilerplate=list(data.get("boilerplate", [])),
+        banner=LazyPattern(data["banner"], flags) if data.get("banner") else None,
+        body_markers=[LazyPattern(p, flags) for p in data.get("body_markers", [])],
+        meta_patterns={key: LazyPattern(p, flags | regex.MULTILINE) for key, p in data.get("meta", {}).items()},
+    )
+
+def load_court_profiles(directory: Path = COURT_PROFILE_DIR) -> Dict[str, CourtProfile]:
+    """Read every *.json court profile in a directory, by name, in file name order."""
+    profiles: Dict[str, CourtProfile] = {}
+    for path in sorted(Path(directory).glob("*.json")):
+        profile = load_court_profile(path)
+        profiles[profile.name] = profile
+    return profiles
 
-BOILERPLATE_RE = regex.compile("|".join(f"({p})" for p in COA_BOILERPLATE_PATTERNS), regex.IGNORECASE)
+COURT_PROFILES = load_court_profiles()
+if DEFAULT_COURT_PROFILE not in COURT_PROFILES:
+    print(f"ERROR: Court profile {DEFAULT_COURT_PROFILE!r} not found in {COURT_PROFILE_DIR}")
+    raise FileNotFoundError(COURT_PROFILE_DIR / f"{DEFAULT_COURT_PROFILE}.json")
+
+# Boilerplate patterns to remove from Michigan Court of Appeals PDFs: the
+# "coa" profile's list, so changes made to it at runtime apply to that profile
+COA_BOILERPLATE_PATTERNS = COURT_PROFILES[DEFAULT_COURT_PROFILE].boilerplate
+
+BOILERPLATE_RE = LazyPattern("|".join(f"({p})" for p in COA_BOILERPLATE_PATTERNS), regex.IGNORECASE)
 
 # Heading mappers - convert court outline format to Markdown
 HEADING_REPLACERS = [
     # Map leading tokens to markdown levels, keep the token text.
-    (regex.compile(r"^(I{1,6})\.(\s+)(.+)$"), r"# \1. \3"),        # I., II., III. -> #
-    (regex.compile(r"^([A-Z])\.(\s+)(.+)$"), r"## \1. \3"),         # A., B., C. -> ##
-    (regex.compile(r"^(\d{1,2})\.(\s+)(.+)$"), r"### \1. \3"),      # 1., 2., 3. -> ###
-    (regex.compile(r"^([ivxlcdm]{1,6})\.(\s+)(.+)$", regex.IGNORECASE), r"#### \1. \3"),  # i., ii., iii. -> ####
+    (LazyPattern(r"^(I{1,6})\.(\s+)(.+)$"), r"# \1. \3"),        # I., II., III. -> #
+    (LazyPattern(r"^([A-Z])\.(\s+)(.+)$"), r"## \1. \3"),         # A., B., C. -> ##
+    (LazyPattern(r"^(\d{1,2})\.(\s+)(.+)$"), r"### \1. \3"),      # 1., 2., 3. -> ###
+    (LazyPattern(r"^([ivxlcdm]{1,6})\.(\s+)(.+)$", regex.IGNORECASE), r"#### \1. \3"),  # i., ii., iii. -> ####
 ]
 
 # Legal abbreviations that should NOT end sentences
 ABBR_TOKENS = {"MCL.", "MRE.", "U.S.", "Inc.", "Co.", "Ct.", "App.", "No.", "v.", "Ltd.", "L.L.C.", "L.L.P."}
 
 # Footnote definition pattern
-FOOTNOTE_DEF_RE = regex.compile(r"^(\d{1,3})[\).]\s+(.*)$")
+FOOTNOTE_DEF_RE = LazyPattern(r"^(\d{1,3})[\).]\s+(.*)$")
+
+# Footnote reference markers. Reference digits found in the PDF's span data
+# are wrapped in these (Unicode noncharacters, never present in page text)
+# so they survive the line stages and can be linked once the footnote
+# definitions are known.
+FOOTNOTE_REF_OPEN = "\ufdd0"
+FOOTNOTE_REF_CLOSE = "\ufdd1"
+
+# A digit span at most this fraction of its neighbour's font size, and set
+# above its baseline, is a footnote reference (when not flagged superscript)
+SUPERSCRIPT_SIZE_RATIO = 0.8
+
+# Footnote definition led by a marked (superscript) number
+FOOTNOTE_MARKED_DEF_RE = LazyPattern(r"^\ufdd0(\d{1,3})\ufdd1\s*(.*)$")
 
 # Sentence ending patterns
-SENT_END_RE = regex.compile(r"([\.!?]|\]\))\s*$")
-ABBR_RE = regex.compile(r"(MCL\.|MRE\.|U\.S\.|Inc\.|Co\.|Ct\.|App\.|No\.|v\.|Ltd\.|L\.L\.C\.|L\.L\.P\.)$")
+SENT_END_RE = LazyPattern(r"([\.!?]|\]\))\s*$")
+ABBR_RE = LazyPattern(r"(MCL\.|MRE\.|U\.S\.|Inc\.|Co\.|Ct\.|App\.|No\.|v\.|Ltd\.|L\.L\.C\.|L\.L\.P\.)$")
 
 # ===============================================
-# PDF TEXT EXTRACTION
+# CONVERSION STATS
 # ===============================================
 
-def extract_pdf_text_with_blocks(pdf_path: Path) -> List[str]:
+@dataclass
+class ConversionStats:
     """
-    Extract text from PDF using PyMuPDF block-based extraction.
-    This preserves layout better than simple text extraction.
+    Wall time per stage and counters for one conversion.
     
-    Returns:
-        List of strings, one per page
+    Pass an instance to convert_pdf_to_markdown (or convert_pdf) and it is
+    filled in as the document is converted. Without one, nothing is timed
+    or counted.
     """
-    doc = fitz.open(str(pdf_path))
-    pages: List[str] = []
-    
-    for page in doc:
-        # Get text blocks (preserves layout)
-        blocks = page.get_text("blocks")
-        
-        # Sort blocks by position (top to bottom, left to right)
-        blocks_sorted = sorted(blocks, key=lambda b: (round(b[1], 1), round(b[0], 1)))
-        
-        texts = []
-        for b in blocks_sorted:
-            block_text = b[4]  # Text content is at index 4
-            if not block_text:
-                continue
-            
-            # Normalize line endings
-            block_text = block_text.replace("\r\n", "\n").replace("\r", "\n")
-            texts.append(block_text.strip("\n"))
-        
-        # Join blocks with double newlines
-        page_text = "\n\n".join(texts)
-        pages.append(page_text)
-    
-    doc.close()
-    return pages
+    seconds: Dict[str, float] = field(default_factory=dict)  # Stage -> wall time
+    pages: int = 0
+    blocks: int = 0
+    boilerplate_lines: int = 0      # Lines removed as boilerplate
+    headings: int = 0               # Body lines mapped to Markdown headings
+    paragraphs: int = 0             # Body paragraphs (footnotes excluded)
+    footnotes: int = 0
+    inline_footnotes: int = 0       # Footnote references linked as [^n]
+    layout_dropped: int = 0         # Header/footer blocks dropped by layout analysis
+    two_column_pages: int = 0       # Pages read column by column
+    ocr_pages: int = 0              # Scanned pages converted with OCR
+    bytes_written: int = 0
+    cache_hit: bool = False
+
+    def lap(self, stage: str, since: float) -> float:
+        """Add the time since ``since`` to a stage and return the current time."""
+        now = time.perf_counter()
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + (now - since)
+        return now
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    @property
+    def slowest_stage(self) -> Optional[str]:
+        return max(self.seconds, key=self.seconds.get) if self.seconds else None
+
+    def summary(self) -> str:
+        """One-line report: counters, then stages slowest first."""
+        stages = ", ".join(f"{k} {v * 1000:.1f}ms" for k, v in
+                           sorted(self.seconds.items(), key=lambda kv: kv[1], reverse=True))
+        return (f"{self.total_seconds:.2f}s; {self.pages} pages, {self.blocks} blocks, "
+                f"{self.boilerplate_lines} boilerplate lines, {self.headings} headings, "
+                f"{self.paragraphs} paragraphs, {self.footnotes} footnotes, "
+                f"{self.inline_footnotes} inline refs, {self.layout_dropped} layout blocks dropped, "
+                f"{self.two_column_pages} two-column pages, {self.ocr_pages} OCR pages, "
+                f"{self.bytes_written} bytes written"
+                f"{' (cache hit)' if self.cache_hit else ''}; {stages}")
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form, as written to the .meta.json sidecar."""
+        d = {k: v for k, v in self.__dict__.items() if k != "seconds"}
+        d["seconds"] = {k: round(v, 6) for k, v in self.seconds.items()}
+        d["total_seconds"] = round(self.total_seconds, 6)
+        return d
 
 # ===============================================
-# CLEANING AND BOILERPLATE REMOVAL
+# PDF TEXT EXTRACTION
 # ===============================================
 
-def strip_boilerplate(line: str) -> bool:
-    """Check if a line matches boilerplate patterns that should be removed."""
-    return bool(BOILERPLATE_RE.search(line))
+def _page_text_from_blocks(
+    page,
+    stats: Optional[ConversionStats] = None,
+    keep_blocks: Optional[list] = None,
+    footnote_refs: bool = False,
+    keep_refs: Optional[list] = None
+) -> str:
+    """
+    Extract one page's text from its PyMuPDF text blocks.
+    
+    With footnote_refs, footnote reference digits are wrapped in
+    FOOTNOTE_REF_OPEN/FOOTNOTE_REF_CLOSE. With keep_refs, the page's
+    reference locations are appended to it (found even without footnote_refs).
+    """
+    if footnote_refs or keep_refs is not None:
+        # One text page serves both the blocks and the span-level dict
+        tp = page.get_textpage(flags=_load_fitz().TEXTFLAGS_BLOCKS)
+        blocks = page.get_text("blocks", textpage=tp)
+        refs = _footnote_ref_spans(tp.extractDICT())
+    else:
+        # Get text blocks (preserves layout)
+        blocks = page.get_text("blocks")
+        refs = []
+    if stats is not None:
+        stats.blocks += len(blocks)
+    if keep_blocks is not None:
+        keep_blocks.append(blocks)
+    if keep_refs is not None:
+        keep_refs.append(refs)
+    if footnote_refs:
+        blocks = _mark_footnote_refs(blocks, refs)
+    return _text_from_blocks(blocks)
 
-# Patterns that indicate the start of the actual opinion body
-CAPTION_END_HINTS = [
-    regex.compile(r"^PER\s+CURIAM\.\s*$", regex.IGNORECASE),
-    regex.compile(r"^OPINION\b", regex.IGNORECASE),
-]
+def _is_superscript_span(spans: List[dict], i: int) -> bool:
+    """True if spans[i] is flagged superscript, or smaller and raised against its neighbour."""
+    span = spans[i]
+    if span["flags"] & _load_fitz().TEXT_FONT_SUPERSCRIPT:
+        return True
+    other = spans[i + 1] if i + 1 < len(spans) else spans[i - 1]
+    return (span["size"] <= SUPERSCRIPT_SIZE_RATIO * other["size"]
+            and span["origin"][1] < other["origin"][1])
 
-def find_body_start(lines: List[str]) -> int:
+def _footnote_ref_spans(page_dict: dict) -> List[Tuple[int, int, int, int]]:
     """
-    Find where the actual opinion body starts (after caption/metadata).
+    Locate footnote references in a page's get_text("dict") output.
+    
+    A reference is a span of one to three digits that shares its line with
+    other text and is superscript (see _is_superscript_span). This also
+    catches the number leading a footnote definition.
     
     Returns:
-        Index of the first line of the opinion body
+        List of (block_no, line_no, start, length) tuples, where start and
+        length are character offsets of the digits within the line's text
     """
-    # Look for explicit markers like "PER CURIAM." or "OPINION"
-    for i, ln in enumerate(lines):
-        for pat in CAPTION_END_HINTS:
-            if pat.search(ln.strip()):
-                return i
+    refs = []
+    for block in page_dict["blocks"]:
+        if block.get("type", 0) != 0:
+            continue
+        for line_no, line in enumerate(block["lines"]):
+            spans = line["spans"]
+            if len(spans) < 2:
+                continue
+            offset = 0
+            for i, span in enumerate(spans):
+                text = span["text"]
+                digits = text.strip()
+                if (0 < len(digits) <= 3 and digits.isascii() and digits.isdigit()
+                        and _is_superscript_span(spans, i)):
+                    refs.append((block["number"], line_no, offset + text.index(digits), len(digits)))
+                offset += len(text)
+    return refs
+
+def _mark_footnote_refs(blocks: List[tuple], refs: List[Tuple[int, int, int, int]]) -> List[tuple]:
+    """Wrap the referenced digits of block texts in FOOTNOTE_REF_OPEN/CLOSE."""
+    if not refs:
+        return blocks
+    by_block: dict = {}
+    for block_no, line_no, start, length in refs:
+        by_block.setdefault(block_no, []).append((line_no, start, length))
     
-    # Fallback: look for first heading pattern
-    for i, ln in enumerate(lines):
-        if regex.match(r"^(I{1,6}|[A-Z]|\d+|[ivxlcdm]+)\.\s.*$", ln.strip()):
-            return i
+    marked = []
+    for b in blocks:
+        hits = by_block.get(b[5])
+        if hits and b[4]:
+            lines = b[4].split("\n")
+            # Right to left, so earlier offsets on the same line stay valid
+            for line_no, start, length in sorted(hits, reverse=True):
+                if line_no >= len(lines):
+                    continue
+                ln = lines[line_no]
+                digits = ln[start:start + length]
+                if len(digits) == length and digits.isdigit():
+                    lines[line_no] = (ln[:start] + FOOTNOTE_REF_OPEN + digits
+                                      + FOOTNOTE_REF_CLOSE + ln[start + length:])
+            b = b[:4] + ("\n".join(lines),) + b[5:]
+        marked.append(b)
+    return marked
+
+def strip_footnote_refs(text: str) -> str:
+    """Remove footnote reference markers, leaving the plain digits."""
+    if FOOTNOTE_REF_OPEN not in text:
+        return text
+    return text.replace(FOOTNOTE_REF_OPEN, "").replace(FOOTNOTE_REF_CLOSE, "")
+
+def _reading_order_key(b: tuple) -> Tuple[float, float]:
+    """Sort key for blocks: top to bottom, then left to right."""
+    return (round(b[1], 1), round(b[0], 1))
+
+def _text_from_blocks(blocks: List[tuple]) -> str:
+    """Join PyMuPDF block tuples (x0, y0, x1, y1, text, ...) into page text."""
+    # Sort blocks by position (top to bottom, left to right)
+    return _join_block_texts(sorted(blocks, key=_reading_order_key))
+
+def _join_block_texts(blocks_sorted: List[tuple]) -> str:
+    """Join block texts in the given order."""
+    texts = []
+    for b in blocks_sorted:
+        block_text = b[4]  # Text content is at index 4
+        if not block_text:
+            continue
+        
+        # Normalize line endings
+        block_text = block_text.replace("\r\n", "\n").replace("\r", "\n")
+        texts.append(block_text.strip("\n"))
     
-    return 0
+    # Join blocks with double newlines
+    return "\n\n".join(texts)
 
-# ===============================================
-# HEADING MAPPING
-# ===============================================
+# A PDF given as a file path, raw bytes, or a binary file-like object
+PdfSource = Union[Path, str, bytes, bytearray, memoryview, BinaryIO]
 
-def map_headings(lines: List[str]) -> List[str]:
+def _is_bytes_like(source) -> bool:
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+def open_pdf(source: PdfSource):
+    """Open a PDF with PyMuPDF from a path, bytes or a binary file-like object."""
+    pymupdf = _load_fitz()
+    if _is_bytes_like(source):
+        return pymupdf.open(stream=bytes(source), filetype="pdf")
+    if hasattr(source, "read"):
+        return pymupdf.open(stream=source.read(), filetype="pdf")
+    return pymupdf.open(str(source))
+
+def iter_pdf_pages(
+    pdf_path: PdfSource,
+    stats: Optional[ConversionStats] = None,
+    keep_blocks: Optional[list] = None,
+    footnote_refs: bool = False,
+    keep_refs: Optional[list] = None
+) -> Iterator[str]:
     """
-    Convert court outline headings to Markdown format.
+    Yield page texts one at a time, in page order.
     
-    Examples:
-        "I. BACKGROUND" -> "# I. BACKGROUND"
-        "A. The Trial" -> "## A. The Trial"
-        "1. Evidence" -> "### 1. Evidence"
-        "i. Testimony" -> "#### i. Testimony"
+    Only the current page is held in memory, which keeps extraction of very
+    large records flat in memory. With stats, extraction time (excluding
+    the consumer's time between pages), pages and blocks are recorded.
+    With keep_blocks / keep_refs, each page's raw block tuples / footnote
+    reference locations are appended to them. With footnote_refs, reference
+    digits are marked in the page text (see _page_text_from_blocks).
     """
-    out = []
-    for ln in lines:
-        s = ln.rstrip()
-        replaced = False
-        
-        # Try each heading pattern
-        for rx, repl in HEADING_REPLACERS:
-            m = rx.match(s)
-            if m:
-                out.append(rx.sub(repl, s))
-                replaced = True
-                break
-        
-        if not replaced:
-            out.append(s)
+    timed = stats is not None
+    if timed:
+        start = time.perf_counter()
+    doc = open_pdf(pdf_path)
+    try:
+        for page in doc:
+            text = _page_text_from_blocks(page, stats, keep_blocks, footnote_refs, keep_refs)
+            if timed:
+                stats.pages += 1
+                stats.lap("extract", start)
+            yield text
+            if timed:
+                start = time.perf_counter()
+    finally:
+        doc.close()
+
+# Intra-document parallelism: long documents are split into page ranges,
+# each extracted by a worker process with its own document handle
+# (PyMuPDF is not thread-safe)
+PARALLEL_PAGE_THRESHOLD = 1000  # Pages; shorter documents are extracted in-process
+PARALLEL_MIN_RANGE = 200        # Fewest pages handed to one worker
+
+def _extract_page_range(
+    job: Tuple[Union[str, bytes], int, int, bool, bool, bool]
+) -> Tuple[List[str], int, Optional[list], Optional[list]]:
+    """
+    Extract pages [start, stop) inside a page worker.
     
-    return out
+    Returns:
+        Tuple of (page_texts, block_count, page_blocks or None, page_refs or None)
+    """
+    source, start, stop, footnote_refs, keep_blocks, keep_refs = job
+    counter = ConversionStats()
+    blocks: Optional[list] = [] if keep_blocks else None
+    refs: Optional[list] = [] if keep_refs else None
+    doc = open_pdf(source)
+    try:
+        texts = [_page_text_from_blocks(doc[i], counter, blocks, footnote_refs, refs)
+                 for i in range(start, stop)]
+    finally:
+        doc.close()
+    return texts, counter.blocks, blocks, refs
 
-# ===============================================
-# PARAGRAPH JOINING
-# ===============================================
+# A batch shares one budget of `workers` slots between its workers and the
+# page workers they start. A batch worker holds a slot while it converts a
+# document; a long document only gets the slots that are free, typically
+# near the end of the batch when other workers have run out of files.
+_BATCH_SLOTS = None  # Semaphore handed to batch pool workers (see _init_batch_worker)
 
-def join_lines_to_paragraphs(lines: List[str]) -> List[str]:
+def _init_batch_worker(slots) -> None:
+    """Pool initializer of batch workers: join the batch's shared slot budget."""
+    global _BATCH_SLOTS
+    _BATCH_SLOTS = slots
+
+def _reserve_page_workers(page_workers: int) -> int:
     """
-    Join wrapped lines into proper paragraphs while preserving structure.
+    Number of page workers to start now, at most page_workers.
     
-    This is the "smart" part that handles:
-    - Hyphenated words broken across lines
-    - Legal abbreviations that shouldn't end sentences
-    - Proper paragraph breaks
+    Inside a batch worker, the extra processes come out of the batch's free
+    slots (without waiting); hand the result to _release_page_workers.
     """
-    paras: List[str] = []
-    buf: List[str] = []
+    if _BATCH_SLOTS is None:
+        return page_workers
+    extra = 0
+    while extra < page_workers - 1 and _BATCH_SLOTS.acquire(block=False):
+        extra += 1
+    return extra + 1
 
-    def flush():
-        """Flush current buffer to a paragraph."""
-        if not buf:
-            return
-        text = " ".join(x.strip() for x in buf)
-        
-        # Fix hyphenated words broken across lines
-        text = regex.sub(r"(\w)-\s+(\w)", r"\1\2", text)
-        
-        paras.append(text)
-        buf.clear()
+def _release_page_workers(workers: int) -> None:
+    if _BATCH_SLOTS is not None:
+        for _ in range(workers - 1):
+            _BATCH_SLOTS.release()
 
-    for ln in lines:
-        st = ln.rstrip()
-        
-        # Empty line = paragraph break
-        if not st.strip():
-            flush()
-            continue
-        
-        # Markdown heading = paragraph break
-        if st.startswith("# "):
-            flush()
-            paras.append(st)
-            continue
-        
-        # First line in buffer
-        if not buf:
-            buf.append(st)
-            continue
-        
-        # Check if previous line ended a sentence (but not with abbreviation)
-        if SENT_END_RE.search(buf[-1]) and not ABBR_RE.search(buf[-1]):
-            flush()
-            buf.append(st)
-        else:
-            buf.append(st)
+def _page_ranges(page_count: int, workers: int) -> List[Tuple[int, int]]:
+    """Split pages into contiguous ranges, two per worker for load balancing."""
+    n = max(1, min(2 * workers, page_count // PARALLEL_MIN_RANGE))
+    bounds = [page_count * i // n for i in range(n + 1)]
+    return list(zip(bounds, bounds[1:]))
 
-    flush()
-    return paras
+def _spill_pdf_bytes(source: PdfSource) -> Optional[str]:
+    """Write PDF bytes to a temporary file for worker processes; None for a path."""
+    if not _is_bytes_like(source):
+        return None
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(source)
+    return f.name
 
-# ===============================================
-# FOOTNOTE PROCESSING
-# ===============================================
+def _extract_ranges_in_pool(
+    source: str,
+    workers: int,
+    footnote_refs: bool,
+    keep_blocks: Optional[list],
+    keep_refs: Optional[list],
+    page_count: Optional[int]
+) -> Tuple[List[str], int]:
+    """Extract a PDF file's page ranges in a pool; returns (pages, block_count)."""
+    if page_count is None:
+        page_count = _page_count(source)
+    ranges = _page_ranges(page_count, workers)
+    jobs = [(source, first, last, footnote_refs, keep_blocks is not None, keep_refs is not None)
+            for first, last in ranges]
+    pages: List[str] = []
+    block_count = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        for texts, n_blocks, blocks, refs in pool.map(_extract_page_range, jobs):
+            pages.extend(texts)
+            block_count += n_blocks
+            if keep_blocks is not None:
+                keep_blocks.extend(blocks)
+            if keep_refs is not None:
+                keep_refs.extend(refs)
+    return pages, block_count
 
-def split_body_and_footnotes(paras: List[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
+def _use_page_workers(source: PdfSource, page_workers: Optional[int], page_count: Optional[int] = None) -> bool:
     """
-    Separate main body from footnote definitions.
+    True if source is long enough to extract with page workers, and we may start processes.
+    
+    The document is only opened to count its pages if page_count is not given.
+    """
+    if not page_workers or page_workers < 2 or multiprocessing.current_process().daemon:
+        return False
+    if page_count is None:
+        page_count = _page_count(source)
+    return page_count >= PARALLEL_PAGE_THRESHOLD
+
+def _page_count(source: PdfSource) -> int:
+    doc = open_pdf(source)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+def extract_pages_parallel(
+    pdf_path: Union[Path, str, bytes],
+    workers: int,
+    stats: Optional[ConversionStats] = None,
+    footnote_refs: bool = False,
+    keep_blocks: Optional[list] = None,
+    keep_refs: Optional[list] = None,
+    page_count: Optional[int] = None
+) -> List[str]:
+    """
+    Extract page texts with several worker processes.
+    
+    The page ranges are merged back in order, so the result equals
+    list(iter_pdf_pages(...)) with the same arguments. Inside a batch, only
+    the batch's free slots are used (see _reserve_page_workers); with none
+    free, the pages are extracted in-process. PDF bytes are written to a
+    temporary file once, so workers are not each sent a copy.
+    
+    Args:
+        pdf_path: PDF file path or PDF bytes
+        workers: Number of worker processes
+        page_count: The document's page count, if already known
     
     Returns:
-        Tuple of (body_paragraphs, footnotes_list)
-        footnotes_list contains (number, text) tuples
+        List of strings, one per page
     """
-    body, fns = [], []
+    workers = _reserve_page_workers(workers)
+    try:
+        if workers < 2:
+            return list(iter_pdf_pages(pdf_path, stats, keep_blocks, footnote_refs, keep_refs))
+        if stats is not None:
+            start = time.perf_counter()
+        spilled = _spill_pdf_bytes(pdf_path)
+        try:
+            pages, block_count = _extract_ranges_in_pool(spilled or str(pdf_path), workers, footnote_refs,
+                                                         keep_blocks, keep_refs, page_count)
+        finally:
+            if spilled:
+                os.unlink(spilled)
+    finally:
+        _release_page_workers(workers)
     
-    for p in paras:
-        m = FOOTNOTE_DEF_RE.match(p.strip())
-        if m and len(p.split()) > 3:  # Must have substantial content
-            num = m.group(1)
-            text = m.group(2).strip()
-            fns.append((num, text))
-        else:
-            body.append(p)
+    if stats is not None:
+        stats.pages += len(pages)
+        stats.blocks += block_count
+        stats.lap("extract", start)
+    return pages
+
+def extract_pdf_text_with_blocks(
+    pdf_path: PdfSource,
+    stats: Optional[ConversionStats] = None,
+    snapshot_path: Optional[Path] = None,
+    footnote_refs: bool = False,
+    layout_analysis: bool = False,
+    page_workers: Optional[int] = None,
+    triage: Optional["Triage"] = None
+) -> List[str]:
+    """
+    Extract text from PDF using PyMuPDF block-based extraction.
+    This preserves layout better than simple text extraction.
     
-    # Remove duplicates while preserving order
-    seen = {}
-    ordered = []
-    for n, t in fns:
-        if n not in seen:
-            seen[n] = t
-            ordered.append((n, t))
+    Args:
+        pdf_path: PDF file path, PDF bytes, or a binary file-like object
+        stats: Optional ConversionStats to record extraction in
+        snapshot_path: Also save the raw blocks here as an extraction
+            snapshot, so later rule changes can be replayed without the PDF
+        footnote_refs: Mark footnote references found in the span data
+            (needed by link_footnote_refs)
+        layout_analysis: Drop repeated headers/footers and read two-column
+            pages by column (see analyze_page_layout)
+        page_workers: Extract documents of PARALLEL_PAGE_THRESHOLD pages or
+            more with this many worker processes (see extract_pages_parallel)
+        triage: The document's triage_pdf result, stored in the snapshot.
+            Its page count also saves opening the PDF to decide on page
+            workers.
     
-    return body, ordered
+    Returns:
+        List of strings, one per page
+    """
+    if hasattr(pdf_path, "read"):
+        pdf_path = pdf_path.read()
+    page_count = triage.pages if triage is not None else None
+    parallel = _use_page_workers(pdf_path, page_workers, page_count)
+    
+    if snapshot_path is None and not layout_analysis:
+        if parallel:
+            return extract_pages_parallel(pdf_path, page_workers, stats, footnote_refs, page_count=page_count)
+        return list(iter_pdf_pages(pdf_path, stats, footnote_refs=footnote_refs))
+    
+    page_blocks: List[List[tuple]] = []
+    keep_refs: Optional[List[list]] = [] if snapshot_path is not None or footnote_refs else None
+    if parallel:
+        pages = extract_pages_parallel(pdf_path, page_workers, stats, footnote_refs, page_blocks, keep_refs,
+                                       page_count)
+    else:
+        pages = list(iter_pdf_pages(pdf_path, stats, page_blocks, footnote_refs, keep_refs))
+    page_refs = keep_refs if keep_refs is not None else [[] for _ in page_blocks]
+    if layout_analysis:
+        pages = _layout_page_texts(page_blocks, page_refs, footnote_refs, stats)
+    
+    if snapshot_path is not None:
+        if stats is not None:
+            t = time.perf_counter()
+        source = "<bytes>" if _is_bytes_like(pdf_path) else Path(pdf_path).name
+        source_hash = pdf_content_hash(pdf_path if _is_bytes_like(pdf_path) else Path(pdf_path))
+        write_extraction_snapshot(snapshot_path, page_blocks, source, source_hash, page_refs,
+                                  triage.to_dict() if triage is not None else None)
+        if stats is not None:
+            stats.lap("snapshot", t)
+    return pages
 
 # ===============================================
-# METADATA EXTRACTION
+# PDF TRIAGE AND OCR
 # ===============================================
+# A scanned opinion has page images but no text layer, so extraction returns
+# empty pages. triage_pdf samples a few pages before conversion; documents
+# found to be scanned are converted from OCR text (ocr_pdf_pages) or fail,
+# instead of producing an empty .md.
 
-# Month names for date extraction
-MONTHS = (
-    "January", "February", "March", "April", "May", "June",
-    "July", "August", "September", "October", "November", "December"
-)
-MONTH_PATTERN = r"(?:%s)\s+\d{1,2},\s+\d{4}" % "|".join(MONTHS)
+TRIAGE_SAMPLE_PAGES = 3        # Pages sampled: first, last and evenly in between
+TRIAGE_MIN_CHARS = 100         # A page with fewer non-space characters has no usable text
+TRIAGE_IMAGE_COVERAGE = 0.5    # Share of the page images must cover for it to count as a scan
 
-# Metadata extraction patterns
-META_PATTERNS = {
-    "case_no": regex.compile(r"\bNo\.\s*(\d{3,})\b", regex.IGNORECASE),
-    "lc_no":   regex.compile(r"\bLC\s*No\.\s*([A-Za-z0-9\-]+)", regex.IGNORECASE),
-    "judges":  regex.compile(r"^Before:\s*(.+)$", regex.IGNORECASE|regex.MULTILINE),
-    "date":    regex.compile(MONTH_PATTERN),
-    "pub":     regex.compile(r"\b(UNPUBLISHED|FOR\s+PUBLICATION)\b", regex.IGNORECASE),
-    "lower_court": regex.compile(r"\b([A-Z][a-z]+ County Circuit Court)\b"),
-}
+# Triage kinds
+TRIAGE_TEXT = "text"           # Has a text layer: the normal extraction path
+TRIAGE_SCANNED = "scanned"     # Most sampled pages are images without text: needs OCR
+TRIAGE_EMPTY = "empty"         # No text and no page images
 
-def _normalize_spaces(s: str) -> str:
-    """Normalize whitespace in a string."""
-    return regex.sub(r"\s+", " ", s).strip()
+OCR_DPI = 300                  # Resolution pages are rendered at for the OCR engine
+OCR_LANGUAGE = "eng"           # Tesseract language(s) of the built-in engine
+
+class Triage(NamedTuple):
+    """Outcome of triage_pdf, stored under "triage" in the .meta.json sidecar."""
+    kind: str
+    pages: int
+    sampled: int
+    chars_per_page: float     # Mean non-space text characters of the sampled pages
+    image_coverage: float     # Mean share of the sampled pages covered by images
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "pages": self.pages, "sampled": self.sampled,
+                "chars_per_page": round(self.chars_per_page, 1),
+                "image_coverage": round(self.image_coverage, 3)}
+
+class ScannedPdfError(ValueError):
+    """Raised when a scanned PDF is converted without an OCR engine."""
+
+    def __init__(self, triage: Triage):
+        super().__init__(f"Scanned PDF without a text layer ({triage.pages} pages); "
+                         f"convert it with an OCR engine")
+        self.triage = triage
+
+    def __reduce__(self):
+        # Rebuilt from the triage when sent back from a worker process
+        return ScannedPdfError, (self.triage,)
+
+def _require_text_layer(triage: Triage) -> Triage:
+    """Return triage if the document has text to extract, else raise."""
+    if triage.kind == TRIAGE_SCANNED:
+        raise ScannedPdfError(triage)
+    if triage.kind == TRIAGE_EMPTY:
+        raise ValueError(f"PDF has no text and no page images ({triage.pages} pages)")
+    return triage
 
-def extract_case_name_from_banner(first_page: str) -> Optional[str]:
+def _text_chars(text: str) -> int:
+    """Number of non-space characters in text."""
+    return sum(len(word) for word in text.split())
+
+def _image_coverage(page) -> float:
+    """Share of the page area covered by images (overlaps counted once per image, capped at 1)."""
+    rect = page.rect
+    area = rect.width * rect.height
+    if area <= 0:
+        return 0.0
+    covered = 0.0
+    for info in page.get_image_info():
+        box = _load_fitz().Rect(info["bbox"]) & rect
+        if not box.is_empty:
+            covered += box.width * box.height
+    return min(1.0, covered / area)
+
+def _page_is_scan(chars: int, coverage: float) -> bool:
+    return chars < TRIAGE_MIN_CHARS and coverage >= TRIAGE_IMAGE_COVERAGE
+
+def _sample_pages(page_count: int, n: int) -> List[int]:
+    """Up to n page numbers spread evenly over the document, first and last included."""
+    n = min(n, page_count)
+    if n <= 1:
+        return list(range(n))
+    return sorted({round(i * (page_count - 1) / (n - 1)) for i in range(n)})
+
+def triage_pdf(source: PdfSource, sample_pages: int = TRIAGE_SAMPLE_PAGES) -> Triage:
     """
-    Extract case name from PDF banner (common in MCOA PDFs).
+    Classify a PDF as text-native, scanned or empty from a few sampled pages.
     
-    Example banner:
-    'COA 369250 CORE VALUES CONSTRUCTION LLC V SHEEHAN'S ON THE GREEN INC Opinion - Authored - Published 7/9/2025'
-    """
-    m = regex.search(r"\bCOA\s+\d+\s+(.+?)\s+Opinion\b", first_page, regex.IGNORECASE)
-    if not m:
-        return None
+    Only the sampled pages' plain text and image placements are read, which
+    costs a small fraction of a full extraction.
     
-    chunk = m.group(1)
-    # Normalize ' V ' to ' v '
-    chunk = regex.sub(r"\s+V\s+", " v ", chunk, flags=regex.IGNORECASE)
-    return _normalize_spaces(chunk)
+    Returns:
+        Triage with kind TRIAGE_TEXT, TRIAGE_SCANNED or TRIAGE_EMPTY
+    """
+    doc = open_pdf(source)
+    try:
+        return _triage_document(doc, sample_pages)
+    finally:
+        doc.close()
 
-def extract_meta_from_pages(pages: List[str]) -> dict:
+def _triage_document(doc, sample_pages: int, first_page_text: Optional[str] = None) -> Triage:
     """
-    Extract metadata from the first page of the PDF.
+    triage_pdf on an open document.
     
-    Returns:
-        Dictionary with case metadata
+    first_page_text is the first page's already extracted text; its
+    characters are counted instead of laying the page out again.
     """
-    meta: dict = {
-        "case_name": None,
-        "case_no": None,
-        "lc_no": None,
-        "judges": None,
-        "date": None,
-        "publication": None,
-        "lower_court": None,
-        "source": "pdf2md_core.py",
-    }
+    numbers = _sample_pages(doc.page_count, sample_pages)
+    chars = [_text_chars(first_page_text) if i == 0 and first_page_text is not None
+             else _text_chars(doc[i].get_text("text")) for i in numbers]
+    coverage = [_image_coverage(doc[i]) for i in numbers]
+    page_count = doc.page_count
     
-    if not pages:
-        return meta
+    n = len(numbers)
+    scans = sum(1 for c, cov in zip(chars, coverage) if _page_is_scan(c, cov))
+    if scans * 2 > n:
+        kind = TRIAGE_SCANNED
+    elif not any(chars):
+        kind = TRIAGE_EMPTY
+    else:
+        kind = TRIAGE_TEXT
+    return Triage(kind, page_count, n, sum(chars) / n if n else 0.0, sum(coverage) / n if n else 0.0)
 
-    first = pages[0]
-    flat = _normalize_spaces(first)
+# OCR engines, by name. An engine takes one page rendered as PNG bytes and
+# returns its text: lines separated by newlines, paragraphs by blank lines.
+# Engines run in worker processes, so they are passed around by name.
+_OCR_ENGINES: Dict[str, Callable[[bytes], str]] = {}
 
-    # Extract case name from banner first
-    case_name = extract_case_name_from_banner(first)
-    if not case_name:
-        # Try from caption: look for plaintiff v defendant pattern
-        cap = "\n".join(first.splitlines()[:120])
-        cap_norm = _normalize_spaces(cap)
-        mcap = regex.search(r"([A-Z0-9\.''\-,& ]+\s+v\s+[A-Z0-9\.''\-,& ]+)", cap_norm)
-        if mcap:
-            case_name = _normalize_spaces(mcap.group(1))
-    
-    meta["case_name"] = case_name
+def register_ocr_engine(name: str, engine: Callable[[bytes], str]) -> None:
+    """Make an OCR engine available by name (register it before starting a batch)."""
+    _OCR_ENGINES[name] = engine
 
-    # Extract other metadata fields
-    for key, rx in META_PATTERNS.items():
-        m = rx.search(first) or rx.search(flat)
-        if m:
+def get_ocr_engine(name: str) -> Callable[[bytes], str]:
+    """
+    Look up an OCR engine by registered name, or import one given as "module:function".
+    """
+    if name in _OCR_ENGINES:
+        return _OCR_ENGINES[name]
+    module_name, sep, attr = name.partition(":")
+    if not sep:
+        raise ValueError(f"Unknown OCR engine: {name} (known: {', '.join(sorted(_OCR_ENGINES))})")
+    import importlib
+    engine = getattr(importlib.import_module(module_name), attr)
+    _OCR_ENGINES[name] = engine
+    return engine
+
+def _tesseract_ocr(png: bytes) -> str:
+    """Built-in engine: Tesseract through PyMuPDF (needs Tesseract and its language data installed)."""
+    pymupdf = _load_fitz()
+    ocr_pdf = pymupdf.Pixmap(png).pdfocr_tobytes(language=OCR_LANGUAGE)
+    doc = pymupdf.open(stream=ocr_pdf, filetype="pdf")
+    try:
+        return _text_from_blocks(doc[0].get_text("blocks"))
+    finally:
+        doc.close()
+
+register_ocr_engine("tesseract", _tesseract_ocr)
+
+def _ocr_page_range(job: Tuple[Union[str, bytes], int, int, str]) -> Tuple[List[str], int]:
+    """
+    Extract pages [start, stop), sending scanned pages through the OCR engine.
+    
+    Returns:
+        Tuple of (page_texts, pages_ocred)
+    """
+    source, start, stop, engine_name = job
+    engine = get_ocr_engine(engine_name)
+    texts = []
+    ocred = 0
+    doc = open_pdf(source)
+    try:
+        for i in range(start, stop):
+            page = doc[i]
+            text = _page_text_from_blocks(page)
+            if _page_is_scan(_text_chars(text), _image_coverage(page)):
+                text = engine(page.get_pixmap(dpi=OCR_DPI).tobytes("png"))
+                ocred += 1
+            texts.append(text)
+    finally:
+        doc.close()
+    return texts, ocred
+
+def ocr_pdf_pages(
+    source: PdfSource,
+    engine: str,
+    workers: Optional[int] = None,
+    stats: Optional[ConversionStats] = None
+) -> List[str]:
+    """
+    Extract page texts of a scanned PDF, running OCR on the pages that need it.
+    
+    Pages that do have a text layer (e.g. a typed cover sheet) are extracted
+    normally. With workers > 1, pages are spread over that many processes.
+    
+    Args:
+        source: PDF file path, PDF bytes, or a binary file-like object
+        engine: OCR engine name (see register_ocr_engine / get_ocr_engine)
+        workers: Number of worker processes (default: 1, in-process)
+        stats: Optional ConversionStats; OCR time is recorded as "ocr"
+    
+    Returns:
+        List of strings, one per page
+    """
+    if stats is not None:
+        start = time.perf_counter()
+    if hasattr(source, "read"):
+        source = source.read()
+    source = bytes(source) if _is_bytes_like(source) else str(source)
+    get_ocr_engine(engine)  # Fail early on an unknown engine
+    doc = open_pdf(source)
+    try:
+        page_count = doc.page_count
+    finally:
+        doc.close()
+    
+    workers = min(workers or 1, page_count)
+    if workers > 1 and not multiprocessing.current_process().daemon:
+        spilled = _spill_pdf_bytes(source)
+        try:
+            jobs = [(spilled or source, i, i + 1, engine) for i in range(page_count)]
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(_ocr_page_range, jobs))
+        finally:
+            if spilled:
+                os.unlink(spilled)
+    else:
+        parts = [_ocr_page_range((source, 0, page_count, engine))]
+    pages = [text for texts, _ in parts for text in texts]
+    
+    if stats is not None:
+        stats.pages += len(pages)
+        stats.ocr_pages += sum(n for _, n in parts)
+        stats.lap("ocr", start)
+    return pages
+
+# ===============================================
+# PAGE LAYOUT ANALYSIS
+# ===============================================
+# Optional geometric pass over the whole document's block coordinates, run
+# before any text rule: blocks repeated at the same height on many pages
+# (running headers, footers, page numbers, case-name banners) are dropped,
+# and two-column pages are read column by column. Needs NumPy.
+
+LAYOUT_MIN_PAGES = 3            # Shortest document checked for repeated blocks
+LAYOUT_REPEAT_SHARE = 0.5       # Share of pages a header/footer must appear on
+LAYOUT_BAND_SHARE = 0.15        # Top/bottom share of the text area searched
+LAYOUT_Y_TOLERANCE = 2.0        # Points; repeated blocks must start this close
+LAYOUT_MAX_LINES = 2            # Longer blocks are body text, never headers/footers
+LAYOUT_COLUMN_WIDTH = 0.3       # Min width of a column block, share of the text width
+
+_DIGIT_RUN_RE = LazyPattern(r"\d+")
+
+def _repeated_block_mask(page_blocks: List[List[tuple]], page, xy, np):
+    """
+    Flag short blocks that repeat (same text up to digits, same height) on at
+    least LAYOUT_REPEAT_SHARE of the pages, lie within the header or footer
+    band, and have only such blocks between them and the top or bottom of
+    their page.
+    
+    page and xy are the page number and bbox of every block, flattened over
+    the document. The first page is never flagged, so its banner stays
+    available to extract_meta_from_pages.
+    
+    Returns:
+        Boolean array over the flattened blocks
+    """
+    n_pages = len(page_blocks)
+    drop = np.zeros(len(page), dtype=bool)
+    if n_pages < LAYOUT_MIN_PAGES:
+        return drop
+    
+    # Text key (digits masked) of each short text block, -1 for the rest
+    keys: dict = {}
+    key = np.full(len(page), -1, dtype=np.int64)
+    has_text = np.zeros(len(page), dtype=bool)
+    j = 0
+    for blocks in page_blocks:
+        for b in blocks:
+            text = (b[4] or "").strip()
+            if b[6] == 0 and text:
+                has_text[j] = True
+                if text.count("\n") < LAYOUT_MAX_LINES:
+                    key[j] = keys.setdefault(_DIGIT_RUN_RE.sub("#", " ".join(text.split())), len(keys))
+            j += 1
+    short = key >= 0
+    if not short.any():
+        return drop
+    
+    x0, y0, x1, y1 = xy.T
+    top, bottom = y0[has_text].min(), y1[has_text].max()
+    band = (bottom - top) * LAYOUT_BAND_SHARE
+    in_band = (y0 <= top + band) | (y1 >= bottom - band)
+    
+    # Count the distinct pages each (text, height) group appears on
+    ybin = np.round((y0 - top) / LAYOUT_Y_TOLERANCE).astype(np.int64)
+    group = np.where(short, key * (int(ybin[short].max()) + 1) + ybin, -1)
+    pairs = np.unique(np.stack([group[short], page[short]]), axis=1)
+    groups, counts = np.unique(pairs[0], return_counts=True)
+    repeated = groups[counts >= max(LAYOUT_MIN_PAGES, LAYOUT_REPEAT_SHARE * n_pages)]
+    candidate = short & in_band & np.isin(group, repeated) & (page > 0)
+    
+    # Only peel candidates off the page edges: no other text may come
+    # before them (headers) or after them (footers) in reading order
+    rank = np.empty(len(page), dtype=np.int64)
+    rank[np.lexsort((np.round(x0, 1), np.round(y0, 1), page))] = np.arange(len(page))
+    stops = has_text & ~candidate
+    first_stop = np.full(n_pages, len(page), dtype=np.int64)
+    last_stop = np.full(n_pages, -1, dtype=np.int64)
+    np.minimum.at(first_stop, page[stops], rank[stops])
+    np.maximum.at(last_stop, page[stops], rank[stops])
+    return candidate & ((rank < first_stop[page]) | (rank > last_stop[page]))
+
+def _two_column_pages(page, xy, keep, n_pages: int, np):
+    """
+    Find two-column pages: wide blocks sit entirely left and right of the
+    page's centre, with overlapping heights.
+    
+    Returns:
+        Tuple of (is_two_column, centre_x) arrays, one entry per page
+    """
+    x0, y0, x1, y1 = xy.T
+
+    def per_page(mask, values, ufunc, fill):
+        out = np.full(n_pages, fill)
+        ufunc.at(out, page[mask], values[mask])
+        return out
+    
+    left_edge = per_page(keep, x0, np.minimum, np.inf)
+    right_edge = per_page(keep, x1, np.maximum, -np.inf)
+    mid = (left_edge + right_edge) / 2
+    wide = keep & ((x1 - x0) >= LAYOUT_COLUMN_WIDTH * (right_edge - left_edge)[page])
+    left = wide & (x1 <= mid[page])
+    right = wide & (x0 >= mid[page])
+    left_top, left_bottom = per_page(left, y0, np.minimum, np.inf), per_page(left, y1, np.maximum, -np.inf)
+    right_top, right_bottom = per_page(right, y0, np.minimum, np.inf), per_page(right, y1, np.maximum, -np.inf)
+    return (left_top < right_bottom) & (right_top < left_bottom), mid
+
+def _column_order(blocks: List[tuple], mid: float) -> List[tuple]:
+    """
+    Reading order for a two-column page split at x = mid.
+    
+    Blocks spanning the centre split the page into sections; each section
+    is read left column, then right.
+    """
+    ordered: List[tuple] = []
+    section: List[tuple] = []
+    
+    def flush():
+        ordered.extend(sorted((b for b in section if b[0] + b[2] < 2 * mid), key=_reading_order_key))
+        ordered.extend(sorted((b for b in section if b[0] + b[2] >= 2 * mid), key=_reading_order_key))
+        section.clear()
+    
+    for b in sorted(blocks, key=_reading_order_key):
+        if b[0] < mid < b[2]:
+            flush()
+            ordered.append(b)
+        else:
+            section.append(b)
+    flush()
+    return ordered
+
+def analyze_page_layout(
+    page_blocks: List[List[tuple]],
+    stats: Optional[ConversionStats] = None
+) -> List[List[tuple]]:
+    """
+    Drop repeated header/footer blocks and put each page's blocks in reading order.
+    
+    The geometry is computed with NumPy over the whole document's blocks at
+    once; only two-column pages are reordered in Python.
+    
+    Args:
+        page_blocks: Per-page PyMuPDF block tuples for the whole document
+        stats: Optional ConversionStats; records layout_dropped and two_column_pages
+    
+    Returns:
+        Per-page block lists in reading order, for _join_block_texts
+    """
+    import numpy as np
+    
+    n_pages = len(page_blocks)
+    counts = [len(blocks) for blocks in page_blocks]
+    if not sum(counts):
+        return [[] for _ in page_blocks]
+    page = np.repeat(np.arange(n_pages), counts)
+    xy = np.array([b[:4] for blocks in page_blocks for b in blocks], dtype=np.float64)
+    
+    drop = _repeated_block_mask(page_blocks, page, xy, np)
+    two_column, mid = _two_column_pages(page, xy, ~drop, n_pages, np)
+    if stats is not None:
+        stats.layout_dropped += int(drop.sum())
+        stats.two_column_pages += int(two_column.sum())
+    
+    ordered_pages = []
+    start = 0
+    for page_no, blocks in enumerate(page_blocks):
+        page_drop = drop[start:start + len(blocks)]
+        start += len(blocks)
+        kept = [b for b, d in zip(blocks, page_drop) if not d] if page_drop.any() else blocks
+        if two_column[page_no]:
+            ordered_pages.append(_column_order(kept, mid[page_no]))
+        else:
+            ordered_pages.append(sorted(kept, key=_reading_order_key))
+    return ordered_pages
+
+def _layout_page_texts(
+    page_blocks: List[List[tuple]],
+    page_refs: List[list],
+    footnote_refs: bool = False,
+    stats: Optional[ConversionStats] = None
+) -> List[str]:
+    """Page texts built from the blocks analyze_page_layout keeps, in its order."""
+    if stats is not None:
+        t = time.perf_counter()
+    pages = []
+    for blocks, refs in zip(analyze_page_layout(page_blocks, stats), page_refs):
+        if footnote_refs:
+            blocks = _mark_footnote_refs(blocks, refs)
+        pages.append(_join_block_texts(blocks))
+    if stats is not None:
+        stats.lap("layout", t)
+    return pages
+
+# ===============================================
+# EXTRACTION SNAPSHOTS
+# ===============================================
+# A snapshot holds a document's raw PyMuPDF blocks and footnote reference
+# locations so the rule stages can be re-run after a rules change without
+# parsing the PDF again. Binary layout (little-endian), read through mmap:
+#
+#   header     magic, info_len, page_count, block_count, ref_count
+#   info       JSON: source name, source sha256, PyMuPDF version, triage
+#   page index page_count + 1 block indexes (page i = blocks [idx[i], idx[i+1]))
+#   ref index  page_count + 1 footnote reference indexes, likewise
+#   blocks     x0, y0, x1, y1 (float64), block_no, block_type, text offset, text length
+#   refs       block_no, line_no, start, length (see _footnote_ref_spans)
+#   text       UTF-8 block texts
+#
+# Version 1 snapshots (no ref_count, ref index or refs) are still readable.
+
+SNAPSHOT_SUFFIX = ".blocks"
+SNAPSHOT_MAGIC = b"P2MDBLK2"
+SNAPSHOT_MAGIC_V1 = b"P2MDBLK1"
+_SNAPSHOT_HEADER = struct.Struct("<8sIIII")
+_SNAPSHOT_HEADER_V1 = struct.Struct("<8sIII")
+_SNAPSHOT_BLOCK = struct.Struct("<4dIIII")
+_SNAPSHOT_REF = struct.Struct("<IIII")
+
+def write_extraction_snapshot(
+    snapshot_path: Path,
+    page_blocks: List[List[tuple]],
+    source: str = "",
+    source_hash: str = "",
+    page_refs: Optional[List[list]] = None,
+    triage: Optional[dict] = None
+) -> Path:
+    """
+    Save per-page PyMuPDF block tuples as an extraction snapshot.
+    
+    page_refs holds each page's footnote reference locations, as collected
+    by iter_pdf_pages(keep_refs=...). triage (Triage.to_dict()) is kept in
+    the info so a replay reports it too. The file is written atomically
+    (temp file, then rename).
+    
+    Returns:
+        snapshot_path
+    """
+    index = [0]
+    records = []
+    texts = []
+    text_size = 0
+    for blocks in page_blocks:
+        for b in blocks:
+            data = (b[4] or "").encode("utf-8", "surrogatepass")
+            records.append(_SNAPSHOT_BLOCK.pack(b[0], b[1], b[2], b[3], b[5], b[6], text_size, len(data)))
+            texts.append(data)
+            text_size += len(data)
+        index.append(len(records))
+    
+    ref_index = [0]
+    ref_records = []
+    for refs in (page_refs or [[] for _ in page_blocks]):
+        ref_records.extend(_SNAPSHOT_REF.pack(*ref) for ref in refs)
+        ref_index.append(len(ref_records))
+    
+    info = {"source": source, "sha256": source_hash, "pymupdf": _load_fitz().VersionBind}
+    if triage is not None:
+        info["triage"] = triage
+    info = json.dumps(info).encode("utf-8")
+    
+    snapshot_path = Path(snapshot_path)
+    snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = snapshot_path.with_name(f".{snapshot_path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(info), len(page_blocks), len(records), len(ref_records)))
+        f.write(info)
+        f.write(struct.pack(f"<{len(index)}I", *index))
+        f.write(struct.pack(f"<{len(ref_index)}I", *ref_index))
+        f.write(b"".join(records))
+        f.write(b"".join(ref_records))
+        f.write(b"".join(texts))
+    os.replace(tmp, snapshot_path)
+    return snapshot_path
+
+class ExtractionSnapshot:
+    """
+    Read-only, memory-mapped view of an extraction snapshot.
+    
+    Use as a context manager, or call close().
+    """
+
+    def __init__(self, snapshot_path: Path):
+        self.path = Path(snapshot_path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic = self._mm[:8]
+            if magic == SNAPSHOT_MAGIC:
+                _, info_len, self.page_count, block_count, ref_count = _SNAPSHOT_HEADER.unpack_from(self._mm, 0)
+                offset = _SNAPSHOT_HEADER.size
+            elif magic == SNAPSHOT_MAGIC_V1:
+                _, info_len, self.page_count, block_count = _SNAPSHOT_HEADER_V1.unpack_from(self._mm, 0)
+                ref_count = 0
+                offset = _SNAPSHOT_HEADER_V1.size
+            else:
+                raise ValueError(f"Not an extraction snapshot: {self.path}")
+            self.info = json.loads(self._mm[offset:offset + info_len])
+            offset += info_len
+            index_size = 4 * (self.page_count + 1)
+            self._index = struct.unpack_from(f"<{self.page_count + 1}I", self._mm, offset)
+            offset += index_size
+            if magic == SNAPSHOT_MAGIC:
+                self._ref_index = struct.unpack_from(f"<{self.page_count + 1}I", self._mm, offset)
+                offset += index_size
+            else:
+                self._ref_index = (0,) * (self.page_count + 1)
+            self._records = offset
+            self._refs = self._records + block_count * _SNAPSHOT_BLOCK.size
+            self._texts = self._refs + ref_count * _SNAPSHOT_REF.size
+        except Exception:
+            self._mm.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+
+    @property
+    def source_hash(self) -> str:
+        """SHA-256 of the PDF the snapshot was taken from."""
+        return self.info.get("sha256", "")
+
+    @property
+    def triage(self) -> Optional[dict]:
+        """Triage of the source PDF (Triage.to_dict()), if it was recorded."""
+        return self.info.get("triage")
+
+    def page_blocks(self, page_no: int) -> List[tuple]:
+        """Block tuples of one page, as page.get_text("blocks") returned them."""
+        mm, size = self._mm, _SNAPSHOT_BLOCK.size
+        first, last = self._index[page_no], self._index[page_no + 1]
+        blocks = []
+        for x0, y0, x1, y1, block_no, block_type, start, length in _SNAPSHOT_BLOCK.iter_unpack(
+                mm[self._records + first * size:self._records + last * size]):
+            start += self._texts
+            text = mm[start:start + length].decode("utf-8", "surrogatepass")
+            blocks.append((x0, y0, x1, y1, text, block_no, block_type))
+        return blocks
+
+    def page_refs(self, page_no: int) -> List[Tuple[int, int, int, int]]:
+        """Footnote reference locations of one page (empty for version 1 snapshots)."""
+        size = _SNAPSHOT_REF.size
+        first, last = self._ref_index[page_no], self._ref_index[page_no + 1]
+        return list(_SNAPSHOT_REF.iter_unpack(self._mm[self._refs + first * size:self._refs + last * size]))
+
+    def iter_pages(self, stats: Optional[ConversionStats] = None, footnote_refs: bool = False) -> Iterator[str]:
+        """Yield page texts exactly as extract_pdf_text_with_blocks produced them."""
+        for page_no in range(self.page_count):
+            if stats is not None:
+                start = time.perf_counter()
+            blocks = self.page_blocks(page_no)
+            if stats is not None:
+                stats.blocks += len(blocks)
+            if footnote_refs:
+                blocks = _mark_footnote_refs(blocks, self.page_refs(page_no))
+            text = _text_from_blocks(blocks)
+            if stats is not None:
+                stats.pages += 1
+                stats.lap("replay", start)
+            yield text
+
+def is_snapshot_path(path) -> bool:
+    """True for extraction snapshot files (by suffix)."""
+    return isinstance(path, (str, Path)) and Path(path).suffix == SNAPSHOT_SUFFIX
+
+def convert_snapshot(
+    snapshot_path: Path,
+    inline_footnotes: bool = False,
+    stats: Optional[ConversionStats] = None,
+    layout_analysis: bool = False,
+    blocks: Optional[List["Block"]] = None
+) -> Tuple[str, dict]:
+    """
+    Replay the rule stages over an extraction snapshot; the PDF is not opened.
+    
+    With a blocks list, the document's Blocks are appended to it (see
+    convert_pages_to_markdown).
+    
+    Returns:
+        Tuple of (markdown_text, metadata_dict), identical to converting the
+        original PDF with the current rules
+    """
+    with ExtractionSnapshot(snapshot_path) as snap:
+        if layout_analysis:
+            if stats is not None:
+                t = time.perf_counter()
+            page_blocks = [snap.page_blocks(i) for i in range(snap.page_count)]
+            page_refs = [snap.page_refs(i) for i in range(snap.page_count)]
+            if stats is not None:
+                stats.pages += snap.page_count
+                stats.blocks += sum(len(blocks) for blocks in page_blocks)
+                stats.lap("replay", t)
+            pages = _layout_page_texts(page_blocks, page_refs, inline_footnotes, stats)
+        else:
+            pages = list(snap.iter_pages(stats, footnote_refs=inline_footnotes))
+        triage = snap.triage
+    md, meta = convert_pages_to_markdown(pages, inline_footnotes, stats, blocks)
+    if triage is not None:
+        meta["triage"] = triage
+    return md, meta
+
+# ===============================================
+# CLEANING AND BOILERPLATE REMOVAL
+# ===============================================
+
+def strip_boilerplate(line: str) -> bool:
+    """Check if a line matches boilerplate patterns that should be removed."""
+    return bool(BOILERPLATE_RE.search(line))
+
+def clean_page(page_text: str) -> str:
+    """Remove boilerplate lines from one page's text."""
+    return "\n".join(ln.text for ln in get_line_classifier().classify_page(page_text))
+
+# Sentinel line placed between pages when they are joined
+PAGE_SEPARATOR = "---PAGE---"
+
+# Patterns that indicate the start of the actual opinion body
+CAPTION_END_HINTS = [
+    LazyPattern(r"^PER\s+CURIAM\.\s*$", regex.IGNORECASE),
+    LazyPattern(r"^OPINION\b", regex.IGNORECASE),
+]
+
+def find_body_start(lines: List[str]) -> int:
+    """
+    Find where the actual opinion body starts (after caption/metadata).
+    
+    Returns:
+        Index of the first line of the opinion body
+    """
+    clf = get_line_classifier()
+    fallback = None
+    for i, ln in enumerate(lines):
+        rank = clf.body_start_rank(ln.strip())
+        # Explicit markers like "PER CURIAM." or "OPINION" win outright
+        if rank == BODY_START_MARKER:
+            return i
+        # Otherwise remember the first heading-like line
+        if rank == BODY_START_HEADING and fallback is None:
+            fallback = i
+    
+    return fallback or 0
+
+# ===============================================
+# HEADING MAPPING
+# ===============================================
+
+def map_headings(lines: List[str]) -> List[str]:
+    """
+    Convert court outline headings to Markdown format.
+    
+    Examples:
+        "I. BACKGROUND" -> "# I. BACKGROUND"
+        "A. The Trial" -> "## A. The Trial"
+        "1. Evidence" -> "### 1. Evidence"
+        "i. Testimony" -> "#### i. Testimony"
+    """
+    clf = get_line_classifier()
+    return [clf.map_heading(ln.rstrip()) for ln in lines]
+
+def map_heading_line(line: str) -> str:
+    """Convert a single line with map_headings' rules."""
+    return get_line_classifier().map_heading(line.rstrip())
+
+# ===============================================
+# LINE CLASSIFICATION
+# ===============================================
+
+# Line tags assigned by LineClassifier
+LINE_PLAIN = "plain"
+LINE_BOILERPLATE = "boilerplate"
+LINE_BODY_START = "body_start"
+LINE_HEADING = "heading"
+LINE_FOOTNOTE = "footnote"
+
+# Body start ranks (see find_body_start)
+BODY_START_NONE = 0
+BODY_START_HEADING = 1  # Fallback: first line that looks like an outline heading
+BODY_START_MARKER = 2   # Explicit marker such as "PER CURIAM."
+
+# Fallback body start pattern used by find_body_start
+BODY_HEADING_RE = LazyPattern(r"^(I{1,6}|[A-Z]|\d+|[ivxlcdm]+)\.\s.*$")
+
+class ClassifiedLine(NamedTuple):
+    """One page line after boilerplate removal, tagged by LineClassifier."""
+    text: str       # Line as it appears in the cleaned page text
+    tag: str        # One of the LINE_* tags
+    level: int      # Markdown heading level for LINE_HEADING, else 0
+    body_rank: int  # One of the BODY_START_* ranks
+    markdown: str   # Line after heading mapping (rstripped)
+
+# The only non-ASCII characters the regex module matches to ASCII letters
+# under IGNORECASE
+_ASCII_CASE_FOLD = {0x130: "i", 0x17F: "s", 0x212A: "k"}
+
+def _fold_ascii(line: str) -> str:
+    """Lowercase a line so that IGNORECASE matches of ASCII literals become substrings."""
+    if line.isascii():
+        return line.lower()
+    return line.translate(_ASCII_CASE_FOLD).lower()
+
+# Characters with special meaning in a regex; anything else is a literal
+_REGEX_SPECIALS = set("\\.^$*+?{}[]()|")
+
+def _is_optional_quantifier(rest: str) -> bool:
+    """True if the text following an atom is a quantifier that allows zero."""
+    return rest.startswith(("*", "?", "{0", "{,"))
+
+def _class_end(p: str, i: int) -> int:
+    """Index of the ']' closing the character class that opens at p[i], or -1."""
+    j = i + 1
+    if p[j:j + 1] == "^":
+        j += 1
+    if p[j:j + 1] == "]":
+        j += 1  # A leading ']' is a literal
+    while j < len(p):
+        if p[j] == "\\":
+            j += 2
+            continue
+        if p[j] == "]":
+            return j
+        j += 1
+    return -1
+
+def _scan_top_level(p: str) -> Optional[Tuple[List[str], int]]:
+    """
+    Split a regex fragment on its top-level '|'.
+    
+    Returns:
+        (alternatives, end) where end is the index of the ')' that closes the
+        group opening at p[0] (or -1 if p doesn't start with a group), or None
+        if the fragment can't be parsed
+    """
+    alts, depth, start, i, group_end = [], 0, 0, 0, -1
+    while i < len(p):
+        c = p[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            end = _class_end(p, i)
+            if end < 0:
+                return None
+            i = end + 1
+            continue
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0 and group_end < 0 and p.startswith("("):
+                group_end = i
+        elif c == "|" and depth == 0:
+            alts.append(p[start:i])
+            start = i + 1
+        i += 1
+    if depth:
+        return None
+    alts.append(p[start:])
+    return alts, group_end
+
+def _split_alternatives(p: str) -> Optional[List[str]]:
+    """Split a regex fragment on its top-level '|', or None if it can't be parsed."""
+    scanned = _scan_top_level(p)
+    return scanned[0] if scanned else None
+
+def _first_atom(p: str) -> Optional[Tuple[FrozenSet[str], bool]]:
+    """
+    Characters that can start a match of a regex fragment.
+    
+    Returns:
+        (chars, any_decimal) where any_decimal means any Unicode digit can
+        start a match, or None if the fragment is too complex to analyze
+    """
+    if p.startswith("("):
+        scanned = _scan_top_level(p)
+        if scanned is None or len(scanned[0]) != 1:
+            return None
+        end = scanned[1]
+        inner, rest = p[1:end], p[end + 1:]
+        if inner.startswith("?:"):
+            inner = inner[2:]
+        elif inner.startswith("?"):
+            return None  # Lookarounds, named groups, inline flags
+        result = _first_char_set(inner)
+    elif p.startswith("\\d"):
+        result, rest = (frozenset(), True), p[2:]
+    elif p.startswith("\\"):
+        if len(p) < 2 or p[1].isalnum():
+            return None
+        result, rest = (frozenset(p[1]), False), p[2:]
+    elif p.startswith("["):
+        end = _class_end(p, 0)
+        cls = p[1:end]
+        if end < 0 or cls.startswith("^") or "\\" in cls or "[" in cls:
+            return None
+        chars, i = set(), 0
+        while i < len(cls):
+            if i + 2 < len(cls) and cls[i + 1] == "-":
+                chars.update(chr(c) for c in range(ord(cls[i]), ord(cls[i + 2]) + 1))
+                i += 3
+            else:
+                chars.add(cls[i])
+                i += 1
+        result, rest = (frozenset(chars), False), p[end + 1:]
+    elif p and p[0] not in _REGEX_SPECIALS:
+        result, rest = (frozenset(p[0]), False), p[1:]
+    else:
+        return None
+    
+    if result is None or _is_optional_quantifier(rest):
+        return None
+    return result
+
+def _first_char_set(p: str) -> Optional[Tuple[FrozenSet[str], bool]]:
+    """Union of _first_atom over the top-level alternatives of a fragment."""
+    alts = _split_alternatives(p)
+    if alts is None:
+        return None
+    chars: set = set()
+    any_decimal = False
+    for alt in alts:
+        atom = _first_atom(alt)
+        if atom is None:
+            return None
+        chars |= atom[0]
+        any_decimal = any_decimal or atom[1]
+    return frozenset(chars), any_decimal
+
+def _literal_run(p: str) -> str:
+    """Leading run of literal characters that every match must contain."""
+    run = []
+    for i, c in enumerate(p):
+        if c in _REGEX_SPECIALS:
+            break
+        if _is_optional_quantifier(p[i + 1:]):
+            break
+        run.append(c)
+    return "".join(run)
+
+def _pattern_spec(rx) -> Tuple[str, int]:
+    """(pattern, flags) of a LazyPattern or compiled regex, without compiling it."""
+    if isinstance(rx, LazyPattern):
+        return rx.pattern, rx._flags
+    return rx.pattern, rx.flags
+
+class _PrefixFilter:
+    """
+    Cheap necessary condition for a pattern to match, derived from its source.
+    
+    Anchored patterns are filtered on the first character of the line (after
+    leading whitespace when the pattern starts with \\s*). Unanchored patterns
+    are filtered on a required literal substring. Patterns that can't be
+    analyzed get no filter and always run, so filtering never changes results.
+    """
+
+    def __init__(self, pattern: str, flags: int):
+        self.kind = "always"
+        self.skip_space = False
+        self.first_char_re: Optional[LazyPattern] = None
+        self.literal = ""
+        self.literal_len = 0
+        self.ignore_case = bool(flags & regex.IGNORECASE)
+        if flags & (regex.MULTILINE | regex.VERBOSE):
+            return
+        
+        if not pattern.startswith("^"):
+            lit = _literal_run(pattern)
+            alts = _split_alternatives(pattern)
+            if len(lit) >= 3 and lit.isascii() and alts is not None and len(alts) == 1:
+                self.kind = "contains"
+                self.literal = lit.lower() if self.ignore_case else lit
+                self.literal_len = len(lit)
+            return
+        
+        p = pattern[1:]
+        while p.startswith("\\s*"):
+            p = p[3:]
+            self.skip_space = True
+        alts = _split_alternatives(p)
+        first = _first_char_set(p) if alts is not None and len(alts) == 1 else None
+        if first is None:
+            return
+        chars, any_decimal = first
+        # Let the regex engine itself decide which characters match, so case
+        # folding follows exactly the same rules as the full pattern
+        cls = "".join(regex.escape(c) for c in sorted(chars)) + ("\\d" if any_decimal else "")
+        self.first_char_re = LazyPattern(f"[{cls}]", regex.IGNORECASE if self.ignore_case else 0)
+        self.kind = "first"
+
+class _FilteredPatterns:
+    """An ordered list of patterns with a _PrefixFilter for each."""
+
+    def __init__(self, patterns: List[Tuple[str, int]]):
+        self.count = len(patterns)
+        self._first: List[Tuple[int, bool, LazyPattern]] = []
+        self.contains: List[Tuple[int, str, bool]] = []
+        self.min_contains = 0
+        self.always: List[int] = []
+        
+        for i, (pattern, flags) in enumerate(patterns):
+            f = _PrefixFilter(pattern, flags)
+            if f.kind == "first":
+                self._first.append((i, f.skip_space, f.first_char_re))
+            elif f.kind == "contains":
+                self.contains.append((i, f.literal, f.ignore_case))
+                # A line shorter than every required literal can't contain one
+                if not self.min_contains or f.literal_len < self.min_contains:
+                    self.min_contains = f.literal_len
+            else:
+                self.always.append(i)
+        self.has_lstrip = any(skip for _, skip, _ in self._first)
+        self._memo: Dict[Tuple[str, str], Tuple[int, ...]] = {}
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form, as kept in the court profile cache."""
+        return {
+            "count": self.count,
+            "first": [[i, skip, rx.pattern, rx._flags] for i, skip, rx in self._first],
+            "contains": [list(c) for c in self.contains],
+            "min_contains": self.min_contains,
+            "always": self.always,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "_FilteredPatterns":
+        """Rebuild filters saved with to_dict, without analyzing the patterns again."""
+        self = cls([])
+        self.count = data["count"]
+        self._first = [(i, skip, LazyPattern(p, flags)) for i, skip, p, flags in data["first"]]
+        self.contains = [tuple(c) for c in data["contains"]]
+        self.min_contains = data["min_contains"]
+        self.always = list(data["always"])
+        self.has_lstrip = any(skip for _, skip, _ in self._first)
+        return self
+
+    def _first_char_candidates(self, key: Tuple[str, str]) -> Tuple[int, ...]:
+        first, first_lstrip = key
+        out = list(self.always)
+        for i, skip_space, first_char_re in self._first:
+            c = first_lstrip if skip_space else first
+            if c and first_char_re.match(c):
+                out.append(i)
+        return tuple(sorted(out))
+
+    def candidates(self, line: str) -> Tuple[int, ...]:
+        """Indexes of patterns that might match line, in pattern order."""
+        # Results for the first-character filters only depend on the first
+        # character (with and without leading whitespace), so memoize them
+        key = (line[:1], line.lstrip()[:1] if self.has_lstrip else "")
+        out = self._memo.get(key)
+        if out is None:
+            out = self._memo[key] = self._first_char_candidates(key)
+        
+        if self.contains and len(line) >= self.min_contains:
+            folded = None
+            extra = []
+            for i, lit, ignore_case in self.contains:
+                if ignore_case:
+                    if folded is None:
+                        folded = _fold_ascii(line)
+                    if lit in folded:
+                        extra.append(i)
+                elif lit in line:
+                    extra.append(i)
+            if extra:
+                out = tuple(sorted(set(out).union(extra)))
+        return out
+
+class LineClassifier:
+    """
+    Single-pass line tagger built from the active rule tables.
+    
+    Every line is checked once against each rule family (boilerplate, body
+    start markers, heading replacers, footnote definitions), but a cheap
+    first-character / literal pre-filter derived from the patterns decides
+    which regexes actually run. Results are identical to running every
+    pattern; most body lines run no regex at all.
+    """
+
+    def __init__(
+        self,
+        boilerplate_patterns: List[str],
+        heading_replacers: List[Tuple[regex.Pattern, str]],
+        caption_end_hints: List[regex.Pattern],
+        filters: Optional[Dict[str, _FilteredPatterns]] = None,
+    ):
+        """
+        Patterns are compiled the first time a line gets past their filter.
+        filters holds the "boilerplate" and "body" filters of an identical
+        classifier (see filters()), to skip analyzing those patterns again.
+        """
+        filters = filters or {}
+        self._boilerplate = [LazyPattern(p, regex.IGNORECASE) for p in boilerplate_patterns]
+        self._boilerplate_filter = filters.get("boilerplate") or _FilteredPatterns(
+            [(p, regex.IGNORECASE) for p in boilerplate_patterns]
+        )
+        self._headings = list(heading_replacers)
+        self._heading_filter = _FilteredPatterns(
+            [_pattern_spec(rx) for rx, _ in heading_replacers]
+        )
+        self._body_hints = list(caption_end_hints) + [BODY_HEADING_RE]
+        self._body_filter = filters.get("body") or _FilteredPatterns(
+            [_pattern_spec(rx) for rx in self._body_hints]
+        )
+        self._footnote_filter = _FilteredPatterns(
+            [_pattern_spec(FOOTNOTE_DEF_RE)]
+        )
+
+    def filters(self) -> Dict[str, _FilteredPatterns]:
+        """The per-profile pattern filters, for reuse by an identical classifier."""
+        return {"boilerplate": self._boilerplate_filter, "body": self._body_filter}
+
+    def is_boilerplate(self, stripped: str) -> bool:
+        """Same result as strip_boilerplate for an already stripped line."""
+        for i in self._boilerplate_filter.candidates(stripped):
+            if self._boilerplate[i].search(stripped):
+                return True
+        return False
+
+    def body_start_rank(self, stripped: str) -> int:
+        """BODY_START_* rank of an already stripped line."""
+        n_hints = len(self._body_hints) - 1
+        for i in self._body_filter.candidates(stripped):
+            if i < n_hints:
+                if self._body_hints[i].search(stripped):
+                    return BODY_START_MARKER
+            elif BODY_HEADING_RE.match(stripped):
+                return BODY_START_HEADING
+        return BODY_START_NONE
+
+    def heading(self, line: str) -> Optional[str]:
+        """Markdown for an rstripped line if a heading replacer matches, else None."""
+        for i in self._heading_filter.candidates(line):
+            rx, repl = self._headings[i]
+            m = rx.match(line)
+            if m:
+                # The usual ^...$ rules match the whole line: expand the match
+                # instead of running the pattern a second time via sub()
+                if m.start() == 0 and m.end() == len(line):
+                    return m.expand(repl)
+                return rx.sub(repl, line)
+        return None
+
+    def map_heading(self, line: str) -> str:
+        """Apply the first matching heading replacer to an rstripped line."""
+        md = self.heading(line)
+        return line if md is None else md
+
+    def is_footnote_def(self, stripped: str) -> bool:
+        """True if a stripped line starts like a footnote definition."""
+        if stripped.startswith(FOOTNOTE_REF_OPEN):
+            return bool(FOOTNOTE_MARKED_DEF_RE.match(stripped))
+        return bool(self._footnote_filter.candidates(stripped)) and bool(FOOTNOTE_DEF_RE.match(stripped))
+
+    def classify(self, text: str) -> ClassifiedLine:
+        """Tag a single line that survived boilerplate removal."""
+        stripped = text.strip()
+        body_rank = self.body_start_rank(stripped)
+        rstripped = text.rstrip()
+        heading = self.heading(rstripped)
+        md = rstripped if heading is None else heading
+        if body_rank == BODY_START_MARKER:
+            return ClassifiedLine(text, LINE_BODY_START, 0, body_rank, md)
+        if heading is not None:
+            level = len(md) - len(md.lstrip("#"))
+            return ClassifiedLine(text, LINE_HEADING, level, body_rank, md)
+        if self.is_footnote_def(stripped):
+            return ClassifiedLine(text, LINE_FOOTNOTE, 0, body_rank, md)
+        return ClassifiedLine(text, LINE_PLAIN, 0, body_rank, md)
+
+    def classify_page(self, page_text: str) -> List[ClassifiedLine]:
+        """
+        Remove boilerplate from a page and tag the remaining lines in one pass.
+        
+        The texts of the returned lines, joined with newlines, equal the
+        cleaned page text (boilerplate removed, then the page stripped).
+        """
+        out: List[ClassifiedLine] = []
+        for ln in page_text.splitlines():
+            stripped = ln.strip()
+            if self.is_boilerplate(stripped):
+                continue
+            if not out:
+                # The cleaned page is stripped: drop leading blank lines and
+                # leading whitespace of the first kept line
+                if not stripped:
+                    continue
+                ln = ln.lstrip()
+            out.append(self.classify(ln))
+        
+        # Likewise drop trailing blank lines and trailing whitespace
+        while out and not out[-1].text.strip():
+            out.pop()
+        if out and out[-1].text != out[-1].text.rstrip():
+            out[-1] = self.classify(out[-1].text.rstrip())
+        return out
+
+# Profile name -> (rule key, classifier); see get_line_classifier
+_LINE_CLASSIFIERS: Dict[str, Tuple[tuple, LineClassifier]] = {}
+
+def get_line_classifier(profile: Optional[CourtProfile] = None) -> LineClassifier:
+    """
+    Return the classifier for a court profile (default: DEFAULT_COURT_PROFILE).
+    
+    A profile's classifier is rebuilt only when its boilerplate or body
+    markers, HEADING_REPLACERS or CAPTION_END_HINTS have changed since the
+    last call. Its pattern filters come from the court profile cache when
+    the patterns match the cached ones.
+    """
+    if profile is None:
+        profile = COURT_PROFILES[DEFAULT_COURT_PROFILE]
+    hints = list(CAPTION_END_HINTS) + profile.body_markers
+    key = (tuple(profile.boilerplate), tuple(HEADING_REPLACERS), tuple(hints))
+    cached = _LINE_CLASSIFIERS.get(profile.name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    
+    sources = {"boilerplate": list(profile.boilerplate), "body": [list(_pattern_spec(rx)) for rx in hints]}
+    filters = _cached_profile_filters(profile.name, sources)
+    clf = LineClassifier(profile.boilerplate, HEADING_REPLACERS, hints, filters)
+    if filters is None:
+        _save_profile_filters(profile.name, sources, clf.filters())
+    _LINE_CLASSIFIERS[profile.name] = (key, clf)
+    return clf
+
+def _find_body_start_tagged(lines: List[ClassifiedLine]) -> int:
+    """find_body_start over lines already tagged by LineClassifier."""
+    fallback = None
+    for i, ln in enumerate(lines):
+        if ln.body_rank == BODY_START_MARKER:
+            return i
+        if ln.body_rank == BODY_START_HEADING and fallback is None:
+            fallback = i
+    return fallback or 0
+
+def _page_separator_lines(clf: LineClassifier) -> List[ClassifiedLine]:
+    """Tagged lines placed between two joined pages."""
+    return [clf.classify(""), clf.classify(PAGE_SEPARATOR), clf.classify("")]
+
+# ===============================================
+# COURT PROFILES
+# ===============================================
+# Dispatch: the fingerprint patterns of all profiles are merged into one
+# regex, searched once over the head of the first page; the profile whose
+# pattern matches earliest wins. The analyzed pattern filters of each
+# profile's classifier are cached on disk (see profile_cache_path), so a new
+# process skips that analysis. (Compiled regexes themselves can't be stored;
+# they are compiled on first use.)
+
+FINGERPRINT_CHARS = 2000  # Characters of the first page searched for a fingerprint
+COURT_PROFILE_CACHE: Optional[Path] = None  # Set to pin the profile cache file
+PROFILE_CACHE_NAME = "court_profiles.json"
+PROFILE_CACHE_VERSION = 1
+
+_FINGERPRINT: Optional[Tuple[tuple, LazyPattern, Dict[str, str]]] = None
+_PROFILE_CACHE: Optional[dict] = None
+_PROFILE_CACHE_DIR: Optional[Path] = None   # Directory of the ConversionCache in use
+
+def _fingerprint_regex() -> Tuple[LazyPattern, Dict[str, str]]:
+    """The merged fingerprint regex and its group name -> profile name map."""
+    global _FINGERPRINT
+    key = tuple((p.name, tuple(p.fingerprint)) for p in COURT_PROFILES.values())
+    if _FINGERPRINT is None or _FINGERPRINT[0] != key:
+        groups = {}
+        alternatives = []
+        for i, profile in enumerate(COURT_PROFILES.values()):
+            if profile.fingerprint:
+                groups[f"p{i}"] = profile.name
+                alternatives.append(f"(?P<p{i}>{'|'.join(f'(?:{p})' for p in profile.fingerprint)})")
+        rx = LazyPattern("|".join(alternatives) or "(?!)", regex.IGNORECASE | regex.MULTILINE)
+        _FINGERPRINT = (key, rx, groups)
+    return _FINGERPRINT[1], _FINGERPRINT[2]
+
+def select_court_profile(first_page: str) -> CourtProfile:
+    """
+    Pick the court profile for a document from its first page's text.
+    
+    Only the first FINGERPRINT_CHARS characters are searched, with a single
+    regex, so the cost is independent of the document.
+    
+    Returns:
+        The profile whose fingerprint matches earliest, else the
+        DEFAULT_COURT_PROFILE
+    """
+    rx, groups = _fingerprint_regex()
+    m = rx.search(first_page, 0, FINGERPRINT_CHARS)
+    if m is not None:
+        for group, name in groups.items():
+            if m.group(group) is not None:
+                return COURT_PROFILES[name]
+    return COURT_PROFILES[DEFAULT_COURT_PROFILE]
+
+def profile_cache_path() -> Path:
+    """
+    Where the court profile cache is kept.
+    
+    COURT_PROFILE_CACHE if set; else PROFILE_CACHE_NAME in the directory of
+    the ConversionCache last used by convert_pdf; else in the user's cache
+    directory ($XDG_CACHE_HOME/pdf2md, by default ~/.cache/pdf2md). Never
+    inside the source tree, so installs and checkouts stay unmodified.
+    """
+    if COURT_PROFILE_CACHE is not None:
+        return Path(COURT_PROFILE_CACHE)
+    if _PROFILE_CACHE_DIR is not None:
+        return _PROFILE_CACHE_DIR / PROFILE_CACHE_NAME
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(base) / "pdf2md" / PROFILE_CACHE_NAME
+
+def _use_profile_cache_dir(cache_dir: Path) -> None:
+    """Keep the court profile cache next to a ConversionCache from now on."""
+    global _PROFILE_CACHE_DIR, _PROFILE_CACHE
+    if cache_dir != _PROFILE_CACHE_DIR:
+        _PROFILE_CACHE_DIR = cache_dir
+        _PROFILE_CACHE = None
+
+def _read_profile_cache(path: Path) -> dict:
+    """A court profile cache file's contents (empty if absent or stale)."""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        data = {}
+    if not isinstance(data, dict) or data.get("version") != PROFILE_CACHE_VERSION:
+        data = {"version": PROFILE_CACHE_VERSION, "profiles": {}}
+    return data
+
+def _profile_cache() -> dict:
+    """The court profile cache, read from disk on first use."""
+    global _PROFILE_CACHE
+    if _PROFILE_CACHE is None:
+        _PROFILE_CACHE = _read_profile_cache(profile_cache_path())
+    return _PROFILE_CACHE
+
+def _cached_profile_filters(name: str, sources: dict) -> Optional[Dict[str, _FilteredPatterns]]:
+    """A profile's cached classifier filters, if cached for exactly these patterns."""
+    entry = _profile_cache()["profiles"].get(name)
+    if entry is None or entry["sources"] != sources:
+        return None
+    return {kind: _FilteredPatterns.from_dict(entry[kind]) for kind in ("boilerplate", "body")}
+
+def _save_profile_filters(name: str, sources: dict, filters: Dict[str, _FilteredPatterns]) -> None:
+    """Store a profile's classifier filters in the cache (best effort, written atomically)."""
+    entry = {"sources": sources, **{kind: f.to_dict() for kind, f in filters.items()}}
+    _profile_cache()["profiles"][name] = entry
+    path = profile_cache_path()
+    # Re-read the file so profiles other workers saved since this process
+    # loaded it are kept
+    data = _read_profile_cache(path)
+    data["profiles"][name] = entry
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass  # Read-only cache directory: filters are rebuilt in each process
+
+# ===============================================
+# PARAGRAPH JOINING
+# ===============================================
+
+def join_lines_to_paragraphs(lines: List[str]) -> List[str]:
+    """
+    Join wrapped lines into proper paragraphs while preserving structure.
+    
+    This is the "smart" part that handles:
+    - Hyphenated words broken across lines
+    - Legal abbreviations that shouldn't end sentences
+    - Proper paragraph breaks
+    """
+    return list(iter_paragraphs(lines))
+
+def iter_paragraphs(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Generator form of join_lines_to_paragraphs.
+    
+    Paragraphs are yielded as soon as they are complete, so lines can be fed
+    in page by page with the open paragraph carried across page boundaries.
+    """
+    for _, para in iter_paragraph_spans(lines):
+        yield para
+
+def iter_paragraph_spans(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """
+    Like iter_paragraphs, but also yield where each paragraph starts.
+    
+    Yields:
+        (index of the paragraph's first line in lines, paragraph text)
+    """
+    buf: List[str] = []
+    buf_start = 0
+
+    def flush() -> Optional[str]:
+        """Flush current buffer to a paragraph."""
+        if not buf:
+            return None
+        text = " ".join(x.strip() for x in buf)
+        
+        # Fix hyphenated words broken across lines
+        text = regex.sub(r"(\w)-\s+(\w)", r"\1\2", text)
+        
+        buf.clear()
+        return text
+
+    for i, ln in enumerate(lines):
+        st = ln.rstrip()
+        
+        # Empty line = paragraph break
+        if not st.strip():
+            para = flush()
+            if para is not None:
+                yield buf_start, para
+            continue
+        
+        # Markdown heading = paragraph break
+        if st.startswith("# "):
+            para = flush()
+            if para is not None:
+                yield buf_start, para
+            yield i, st
+            continue
+        
+        # First line in buffer
+        if not buf:
+            buf.append(st)
+            buf_start = i
+            continue
+        
+        # Check if previous line ended a sentence (but not with abbreviation)
+        if SENT_END_RE.search(buf[-1]) and not ABBR_RE.search(buf[-1]):
+            para = flush()
+            if para is not None:
+                yield buf_start, para
+            buf.append(st)
+            buf_start = i
+        else:
+            buf.append(st)
+
+    para = flush()
+    if para is not None:
+        yield buf_start, para
+
+# ===============================================
+# FOOTNOTE PROCESSING
+# ===============================================
+
+def split_body_and_footnotes(paras: List[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Separate main body from footnote definitions.
+    
+    Returns:
+        Tuple of (body_paragraphs, footnotes_list)
+        footnotes_list contains (number, text) tuples
+    """
+    body, fns = [], []
+    
+    for p in paras:
+        fn = parse_footnote_def(p)
+        if fn:
+            fns.append(fn)
+        else:
+            body.append(p)
+    
+    # Remove duplicates while preserving order
+    seen = {}
+    ordered = []
+    for n, t in fns:
+        if n not in seen:
+            seen[n] = t
+            ordered.append((n, t))
+    
+    return body, ordered
+
+def parse_footnote_def(para: str) -> Optional[Tuple[str, str]]:
+    """
+    Return (number, text) if a paragraph is a footnote definition, else None.
+    
+    Definitions are "1) text" / "1. text", or led by a marked superscript
+    number when footnote references were extracted.
+    """
+    stripped = para.strip()
+    if stripped.startswith(FOOTNOTE_REF_OPEN):
+        m = FOOTNOTE_MARKED_DEF_RE.match(stripped)
+    else:
+        m = FOOTNOTE_DEF_RE.match(stripped)
+    if m and len(para.split()) > 3:  # Must have substantial content
+        return m.group(1), m.group(2).strip()
+    return None
+
+def _link_marked_refs(text: str, defined: Optional[set] = None) -> Tuple[str, int]:
+    """
+    Replace marked footnote references in text with [^n] links.
+    
+    Only numbers in defined are linked (all of them when defined is None);
+    the others are put back as plain digits.
+    
+    Returns:
+        Tuple of (text, links_made)
+    """
+    if FOOTNOTE_REF_OPEN not in text:
+        return text, 0
+    head, *refs = text.split(FOOTNOTE_REF_OPEN)
+    parts = [head]
+    linked = 0
+    for ref in refs:
+        num, _, rest = ref.partition(FOOTNOTE_REF_CLOSE)
+        if defined is None or num in defined:
+            parts.append(f"[^{num}]")
+            linked += 1
+        else:
+            parts.append(num)
+        parts.append(rest)
+    return "".join(parts), linked
+
+def link_footnote_refs(
+    paras: List[str],
+    footnotes: List[Tuple[str, str]],
+    stats: Optional[ConversionStats] = None
+) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Link marked footnote references to the footnote definitions.
+    
+    Takes the output of split_body_and_footnotes over marked text (see
+    extract_pdf_text_with_blocks(footnote_refs=True)). A reference whose
+    number has a definition becomes [^n]; any other is left as its digits.
+    
+    Returns:
+        Tuple of (body_paragraphs, footnotes_list) with no markers left
+    """
+    defined = {n for n, _ in footnotes}
+    linked = 0
+    out_paras = []
+    for p in paras:
+        p, n = _link_marked_refs(p, defined)
+        out_paras.append(p)
+        linked += n
+    out_notes = []
+    for num, t in footnotes:
+        t, n = _link_marked_refs(t, defined)
+        out_notes.append((num, t))
+        linked += n
+    if stats is not None:
+        stats.inline_footnotes += linked
+    return out_paras, out_notes
+
+# ===============================================
+# CONTENT BLOCKS
+# ===============================================
+
+# A document's content as canonical store blocks (canonical/{docId}/blocks.jsonl),
+# built in the same pass as the Markdown with each block's PDF page kept.
+
+BLOCKS_SUFFIX = ".blocks.jsonl"
+
+# Block types
+BLOCK_HEADING = "heading"
+BLOCK_PARAGRAPH = "paragraph"
+BLOCK_FOOTNOTE = "footnote"
+
+_HEADING_PARA_RE = LazyPattern(r"^(#{1,6})\s+(.*)$")
+
+class Block(NamedTuple):
+    """One heading, paragraph or footnote of a converted document."""
+    type: str                       # One of the BLOCK_* types
+    text: str                       # Markdown text (heading marks removed)
+    page: int                       # 1-based PDF page the block starts on
+    level: int = 0                  # Heading level for BLOCK_HEADING, else 0
+    footnote: Optional[str] = None  # Footnote number for BLOCK_FOOTNOTE
+
+def _paragraph_blocks(
+    spans: List[Tuple[int, str]],
+    pages: List[int],
+    inline_footnotes: bool = False
+) -> List[Block]:
+    """
+    Turn joined paragraphs into blocks, in the order of the Markdown output.
+    
+    Footnote definitions are split off, de-duplicated and linked exactly as
+    split_body_and_footnotes and link_footnote_refs do for the Markdown.
+    
+    Args:
+        spans: (start line, text) pairs from iter_paragraph_spans
+        pages: PDF page number of every line the spans index into
+        inline_footnotes: Whether references were marked for linking
+    """
+    body: List[Block] = []
+    notes: Dict[str, Block] = {}
+    for start, para in spans:
+        if para == PAGE_SEPARATOR:
+            continue
+        page = pages[start]
+        fn = parse_footnote_def(para)
+        if fn:
+            if fn[0] not in notes:
+                notes[fn[0]] = Block(BLOCK_FOOTNOTE, fn[1], page, footnote=fn[0])
+            continue
+        m = _HEADING_PARA_RE.match(para)
+        if m:
+            body.append(Block(BLOCK_HEADING, m.group(2), page, level=len(m.group(1))))
+        else:
+            body.append(Block(BLOCK_PARAGRAPH, para, page))
+    blocks = body + list(notes.values())
+    if inline_footnotes:
+        blocks = [b._replace(text=_link_marked_refs(b.text, set(notes))[0]) for b in blocks]
+    return blocks
+
+def block_records(blocks: Iterable[Block], doc_id: str, source_id: str) -> Iterator[dict]:
+    """
+    Yield blocks as canonical store Block records.
+    
+    Ids are "<doc_id>:<sequence>", so re-converting a document gives the same
+    records; the store sets createdAt/updatedAt when it ingests them.
+    """
+    for sequence, block in enumerate(blocks):
+        record = {
+            "id": f"{doc_id}:{sequence}",
+            "type": block.type,
+            "text": block.text,
+            "sourceRef": {"kind": "pdf", "sourceId": source_id, "page": block.page},
+            "sequence": sequence,
+        }
+        if block.level:
+            record["level"] = block.level
+        if block.footnote is not None:
+            record["footnote"] = block.footnote
+        yield record
+
+def write_blocks_jsonl(
+    blocks: List[Block],
+    output_dir: Path,
+    stem: str,
+    source_id: str,
+    stats: Optional[ConversionStats] = None
+) -> Path:
+    """
+    Write a document's blocks to <stem>.blocks.jsonl, one record per line.
+    
+    A file that already holds the same records is left untouched.
+    
+    Args:
+        source_id: Source file recorded in each block's sourceRef
+    """
+    path = Path(output_dir) / (stem + BLOCKS_SUFFIX)
+    text = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in block_records(blocks, stem, source_id))
+    if write_text_if_changed(path, text) and stats is not None:
+        stats.bytes_written += len(text.encode("utf-8"))
+    return path
+
+def read_blocks_jsonl(path: Path) -> Iterator[dict]:
+    """Yield the records of a .blocks.jsonl file."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def paragraph_pages(blocks: Iterable[Block]) -> List[int]:
+    """PDF page of each body paragraph, in order (see pdf2md_search.iter_markdown_paragraphs)."""
+    return [b.page for b in blocks if b.type == BLOCK_PARAGRAPH]
+
+# ===============================================
+# METADATA EXTRACTION
+# ===============================================
+
+# Month names for date extraction
+MONTHS = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+)
+MONTH_PATTERN = r"(?:%s)\s+\d{1,2},\s+\d{4}" % "|".join(MONTHS)
+
+# Metadata extraction patterns (a court profile's "meta" patterns replace these)
+META_PATTERNS = {
+    "case_no": LazyPattern(r"\bNo\.\s*(\d{3,})\b", regex.IGNORECASE),
+    "lc_no":   LazyPattern(r"\bLC\s*No\.\s*([A-Za-z0-9\-]+)", regex.IGNORECASE),
+    "judges":  LazyPattern(r"^Before:\s*(.+)$", regex.IGNORECASE|regex.MULTILINE),
+    "date":    LazyPattern(MONTH_PATTERN),
+    "pub":     LazyPattern(r"\b(UNPUBLISHED|FOR\s+PUBLICATION)\b", regex.IGNORECASE),
+    "lower_court": LazyPattern(r"\b([A-Z][a-z]+ County Circuit Court)\b"),
+}
+
+def _normalize_spaces(s: str) -> str:
+    """Normalize whitespace in a string."""
+    return regex.sub(r"\s+", " ", s).strip()
+
+def extract_case_name_from_banner(first_page: str, profile: Optional[CourtProfile] = None) -> Optional[str]:
+    """
+    Extract case name from PDF banner (common in MCOA PDFs).
+    
+    Example banner:
+    'COA 369250 CORE VALUES CONSTRUCTION LLC V SHEEHAN'S ON THE GREEN INC Opinion - Authored - Published 7/9/2025'
+    
+    The banner pattern is the profile's (default: DEFAULT_COURT_PROFILE).
+    """
+    banner = (profile or COURT_PROFILES[DEFAULT_COURT_PROFILE]).banner
+    m = banner.search(first_page) if banner is not None else None
+    if not m:
+        return None
+    
+    chunk = m.group(1)
+    # Normalize ' V ' to ' v '
+    chunk = regex.sub(r"\s+V\s+", " v ", chunk, flags=regex.IGNORECASE)
+    return _normalize_spaces(chunk)
+
+def extract_meta_from_pages(pages: List[str], profile: Optional[CourtProfile] = None) -> dict:
+    """
+    Extract metadata from the first page of the PDF.
+    
+    Args:
+        pages: Page texts; only the first is read
+        profile: Court profile to apply (default: select_court_profile)
+    
+    Returns:
+        Dictionary with case metadata
+    """
+    meta: dict = {
+        "case_name": None,
+        "case_no": None,
+        "lc_no": None,
+        "judges": None,
+        "date": None,
+        "publication": None,
+        "lower_court": None,
+        "source": "pdf2md_core.py",
+    }
+    
+    if not pages:
+        return meta
+
+    first = pages[0]
+    flat = _normalize_spaces(first)
+    if profile is None:
+        profile = select_court_profile(first)
+
+    # Extract case name from banner first
+    case_name = extract_case_name_from_banner(first, profile)
+    if not case_name:
+        # Try from caption: look for plaintiff v defendant pattern
+        cap = "\n".join(first.splitlines()[:120])
+        cap_norm = _normalize_spaces(cap)
+        mcap = regex.search(r"([A-Z0-9\.''\-,& ]+\s+v\s+[A-Z0-9\.''\-,& ]+)", cap_norm)
+        if mcap:
+            case_name = _normalize_spaces(mcap.group(1))
+    
+    meta["case_name"] = case_name
+
+    # Extract other metadata fields
+    for key, rx in {**META_PATTERNS, **profile.meta_patterns}.items():
+        m = rx.search(first) or rx.search(flat)
+        if m:
             val = m.group(1) if m.lastindex else m.group(0)
             if key == "pub":
                 val = "PUBLISHED" if "PUBLICATION" in val.upper() else "UNPUBLISHED"
@@ -350,104 +2335,678 @@ def extract_meta_from_pages(pages: List[str]) -> dict:
             else:
                 meta[key if key != "pub" else "publication"] = _normalize_spaces(val)
 
-    # Set court type
-    meta.setdefault("court", "Michigan Court of Appeals")
-    return meta
+    # Set court type
+    meta.setdefault("court", profile.court)
+    return meta
+
+def write_text_if_changed(path: Path, text: str) -> bool:
+    """
+    Write text to a file unless it already holds exactly that text.
+    
+    Returns:
+        True if the file was written, False if it was left untouched
+    """
+    data = text.encode("utf-8")
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    path.write_bytes(data)
+    return True
+
+def write_meta_json(meta: dict, md_path: Path, stats: Optional[ConversionStats] = None) -> Optional[Path]:
+    """Write metadata to a .meta.json file alongside the markdown."""
+    try:
+        out = md_path.with_suffix("")  # Remove .md extension
+        meta_path = out.with_name(out.name + ".meta.json")
+        text = json.dumps(meta, ensure_ascii=False, indent=2)
+        if write_text_if_changed(meta_path, text) and stats is not None:
+            stats.bytes_written += len(text.encode("utf-8"))
+        return meta_path
+    except Exception:
+        return None
+
+# ===============================================
+# CONVERSION CACHE
+# ===============================================
+
+# Bump when pipeline code changes the output without touching the rule tables
+# above, so that stale cache entries are not served.
+RULESET_VERSION = 3
+
+def ruleset_fingerprint(
+    inline_footnotes: bool = False,
+    layout_analysis: bool = False,
+    ocr_engine: Optional[str] = None
+) -> str:
+    """
+    Fingerprint the active conversion rules.
+    
+    Computed from the current contents of the court profiles (including
+    COA_BOILERPLATE_PATTERNS), HEADING_REPLACERS, ABBR_TOKENS,
+    SUPERSCRIPT_SIZE_RATIO, (with layout_analysis) the LAYOUT_* settings and
+    the OCR engine name, so edits made at runtime are picked up. The engine
+    decides what a scanned PDF converts to, and whether it converts at all.
+    """
+    rules = {
+        "version": RULESET_VERSION,
+        "boilerplate": list(COA_BOILERPLATE_PATTERNS),
+        "profiles": [[p.name, p.court, p.fingerprint, p.boilerplate, p.banner and p.banner.pattern,
+                      [rx.pattern for rx in p.body_markers],
+                      {key: rx.pattern for key, rx in p.meta_patterns.items()}]
+                     for p in COURT_PROFILES.values()],
+        "headings": [(rx.pattern, rx.flags, repl) for rx, repl in HEADING_REPLACERS],
+        "abbr": sorted(ABBR_TOKENS),
+        "inline_footnotes": bool(inline_footnotes),
+        "superscript_ratio": SUPERSCRIPT_SIZE_RATIO,
+        "layout": [LAYOUT_MIN_PAGES, LAYOUT_REPEAT_SHARE, LAYOUT_BAND_SHARE, LAYOUT_Y_TOLERANCE,
+                   LAYOUT_MAX_LINES, LAYOUT_COLUMN_WIDTH] if layout_analysis else None,
+        "ocr_engine": ocr_engine,
+    }
+    blob = json.dumps(rules, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+def pdf_content_hash(pdf_path: Union[Path, bytes], chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of the PDF contents, given a file path or the raw bytes."""
+    if _is_bytes_like(pdf_path):
+        return hashlib.sha256(pdf_path).hexdigest()
+    h = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+class ConversionCache:
+    """
+    On-disk cache of conversion results keyed by PDF content and ruleset.
+    
+    Each entry is a small JSON file holding the Markdown and metadata. Entry
+    modification times record last use; when the cache grows past max_bytes
+    the least recently used entries are evicted. Writes are atomic, so several
+    batch workers can share one cache directory.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 1 << 30):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+
+    def key_for(
+        self,
+        pdf_path: Union[Path, bytes],
+        inline_footnotes: bool = False,
+        layout_analysis: bool = False,
+        ocr_engine: Optional[str] = None
+    ) -> str:
+        """Cache key for a PDF (path or bytes) under the currently active rules."""
+        fingerprint = ruleset_fingerprint(inline_footnotes, layout_analysis, ocr_engine)
+        key = f"{pdf_content_hash(pdf_path)}:{fingerprint}"
+        return hashlib.sha256(key.encode("ascii")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / (key + ".json")
+
+    def get(self, key: str) -> Optional[Tuple[str, dict]]:
+        """Return (markdown, meta) for a key, or None on a miss."""
+        path = self._entry_path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None
+        return entry["markdown"], entry["meta"]
+
+    def get_with_blocks(self, key: str) -> Optional[Tuple[str, dict, List[Block]]]:
+        """Return (markdown, meta, blocks) for a key, or None unless stored with blocks."""
+        path = self._entry_path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            if "blocks" not in entry:
+                return None
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry["markdown"], entry["meta"], [Block(*b) for b in entry["blocks"]]
+
+    def put(self, key: str, md: str, meta: dict, blocks: Optional[List[Block]] = None) -> None:
+        """Store a conversion result, evicting old entries if over the size cap."""
+        path = self._entry_path(key)
+        entry = {"markdown": md, "meta": meta}
+        if blocks is not None:
+            entry["blocks"] = [list(b) for b in blocks]
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+        if self._size is None:
+            self._size = self._disk_usage()
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _disk_usage(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        
+        Returns:
+            Number of entries removed
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._size = total
+        return removed
+
+# ===============================================
+# MAIN CONVERSION FUNCTION
+# ===============================================
+
+def convert_pages_to_markdown(
+    pages: List[str],
+    inline_footnotes: bool = False,
+    stats: Optional[ConversionStats] = None,
+    blocks: Optional[List[Block]] = None
+) -> Tuple[str, dict]:
+    """
+    Run the rule-based stages over extracted page texts.
+    
+    Args:
+        pages: Page texts as returned by extract_pdf_text_with_blocks; for
+            inline footnotes, extracted with footnote_refs=True
+        inline_footnotes: Whether to convert footnotes inline (default: False)
+        stats: Optional ConversionStats to record stage times and counters in
+        blocks: Optional list; the document's Blocks, each with the PDF page
+            it starts on, are appended to it
+        
+    Returns:
+        Tuple of (markdown_text, metadata_dict)
+    """
+    timed = stats is not None
+    if timed:
+        t0 = time.perf_counter()
+    
+    # Pick the court profile and extract metadata before cleaning (from the
+    # first page, which is all they read)
+    first_page = [strip_footnote_refs(pages[0])] if pages else []
+    profile = select_court_profile(first_page[0]) if pages else None
+    meta = extract_meta_from_pages(first_page, profile)
+    if timed:
+        t0 = stats.lap("meta", t0)
+    
+    # Clean boilerplate and tag the remaining lines of each page in one pass,
+    # joining non-empty pages with PAGE_SEPARATOR
+    clf = get_line_classifier(profile)
+    separator = _page_separator_lines(clf)
+    all_lines: List[ClassifiedLine] = []
+    line_pages: List[int] = []  # PDF page of each line, kept for blocks
+    for page_no, pg in enumerate(pages, 1):
+        tagged = clf.classify_page(pg)
+        if timed:
+            # Boilerplate is never blank, so the non-blank lines not kept were boilerplate
+            stats.boilerplate_lines += (sum(1 for ln in pg.splitlines() if ln.strip())
+                                        - sum(1 for ln in tagged if ln.text.strip()))
+        if not tagged:
+            continue
+        if all_lines:
+            all_lines.extend(separator)
+        all_lines.extend(tagged)
+        if blocks is not None:
+            line_pages.extend([page_no] * (len(all_lines) - len(line_pages)))
+    
+    # Find opinion body (skip caption/metadata)
+    body_start = _find_body_start_tagged(all_lines)
+    if timed:
+        stats.headings += sum(1 for ln in all_lines[body_start:] if ln.tag == LINE_HEADING)
+        t0 = stats.lap("line_classifier", t0)
+    
+    # Apply rule-based formatting (headings were mapped during tagging)
+    body_lines = [ln.markdown for ln in all_lines[body_start:]]
+    spans = list(iter_paragraph_spans(body_lines))
+    paras = [p for _, p in spans]
+    if timed:
+        t0 = stats.lap("join_paragraphs", t0)
+    if blocks is not None:
+        blocks.extend(_paragraph_blocks(spans, line_pages[body_start:], inline_footnotes))
+        if timed:
+            t0 = stats.lap("content_blocks", t0)
+    paras, footnotes = split_body_and_footnotes(paras)
+    if timed:
+        stats.paragraphs += len(paras)
+        stats.footnotes += len(footnotes)
+        t0 = stats.lap("split_footnotes", t0)
+    
+    # Optional inline footnote links from the marked references
+    if inline_footnotes:
+        paras, footnotes = link_footnote_refs(paras, footnotes, stats)
+        if timed:
+            stats.lap("link_footnotes", t0)
+    
+    # Build final markdown
+    parts: List[str] = []
+    for p in paras:
+        parts.append(p)
+        parts.append("")  # Add blank line after each paragraph
+    
+    # Add footnotes section if any found
+    if footnotes:
+        parts.append("---")
+        parts.append("")
+        parts.append("## Footnotes")
+        parts.append("")
+        for n, t in footnotes:
+            parts.append(f"[^{n}]: {t}")
+    
+    md = "\n".join(parts).rstrip() + "\n"
+    
+    return md, meta
+
+def convert_pdf(
+    source: PdfSource,
+    inline_footnotes: bool = False,
+    cache: Optional[ConversionCache] = None,
+    stats: Optional[ConversionStats] = None,
+    snapshot_path: Optional[Path] = None,
+    layout_analysis: bool = False,
+    page_workers: Optional[int] = None,
+    blocks: Optional[List[Block]] = None,
+    ocr_engine: Optional[str] = None
+) -> Tuple[str, dict]:
+    """
+    Convert a PDF to Markdown entirely in memory.
+    
+    Nothing is written to disk; use write_markdown_files to save the result.
+    Errors are raised to the caller.
+    
+    Args:
+        source: PDF file path, PDF bytes, or a binary file-like object
+            (e.g. an uploaded file's stream)
+        inline_footnotes: Whether to convert footnotes inline (default: False)
+        cache: Optional ConversionCache; a hit skips PDF extraction entirely.
+            The court profile cache is kept in its directory too.
+        stats: Optional ConversionStats to record stage times and counters in
+        snapshot_path: Also save an extraction snapshot here (not on a cache hit)
+        layout_analysis: Drop repeated headers/footers and read two-column
+            pages by column before the text rules run (needs NumPy)
+        page_workers: Extract long documents (PARALLEL_PAGE_THRESHOLD pages
+            or more) with this many worker processes
+        blocks: Optional list; the document's Blocks are appended to it.
+            Cache entries stored without blocks count as a miss.
+        ocr_engine: OCR engine name for documents triage_pdf finds to be
+            scanned (their pages are OCRed with page_workers processes, and
+            no snapshot is saved). Without one, those raise ScannedPdfError.
+        
+    The triage result is stored under "triage" in the metadata. A PDF with
+    neither text nor page images raises ValueError.
+        
+    Returns:
+        Tuple of (markdown_text, metadata_dict)
+    """
+    if hasattr(source, "read"):
+        source = source.read()
+    
+    cached = None
+    if cache is not None:
+        _use_profile_cache_dir(cache.cache_dir)
+        if stats is not None:
+            t = time.perf_counter()
+        # The key includes the OCR engine: the PDF is not triaged before the
+        # lookup, and a scanned one converts differently (or not at all)
+        # depending on the engine
+        key = cache.key_for(source if _is_bytes_like(source) else Path(source), inline_footnotes,
+                            layout_analysis, ocr_engine)
+        cached = cache.get(key) if blocks is None else cache.get_with_blocks(key)
+        if stats is not None:
+            stats.lap("cache", t)
+            stats.cache_hit = cached is not None
+    
+    if cached is not None:
+        # Cache hit: the PDF is never opened
+        if blocks is not None:
+            blocks.extend(cached[2])
+        return cached[0], cached[1]
+    
+    # Triage first: a scanned PDF has no text for the normal path to extract
+    if stats is not None:
+        t = time.perf_counter()
+    triage = triage_pdf(source)
+    if stats is not None:
+        stats.lap("triage", t)
+    if ocr_engine is None or triage.kind != TRIAGE_SCANNED:
+        _require_text_layer(triage)
+    if triage.kind == TRIAGE_SCANNED:
+        pages = ocr_pdf_pages(source, ocr_engine, page_workers, stats)
+    else:
+        # Extract text from PDF
+        pages = extract_pdf_text_with_blocks(source, stats, snapshot_path, inline_footnotes, layout_analysis,
+                                             page_workers, triage)
+    
+    # Run the rule stages
+    new_blocks = None if blocks is None else []
+    md, meta = convert_pages_to_markdown(pages, inline_footnotes, stats, new_blocks)
+    meta["triage"] = triage.to_dict()
+    if triage.kind == TRIAGE_SCANNED:
+        meta["triage"]["ocr_engine"] = ocr_engine
+    if cache is not None:
+        cache.put(key, md, meta, new_blocks)
+    if blocks is not None:
+        blocks.extend(new_blocks)
+    return md, meta
+
+def write_markdown_files(
+    md: str,
+    meta: dict,
+    output_dir: Path,
+    stem: str,
+    stats: Optional[ConversionStats] = None,
+    stats_in_meta: bool = False
+) -> Tuple[Path, Optional[Path]]:
+    """
+    Write a conversion result as <stem>.md plus a <stem>.meta.json sidecar.
+    
+    Files that already hold the same content are left untouched.
+    
+    Args:
+        stats: Optional ConversionStats; records write time and bytes written
+        stats_in_meta: Also store the stats under "stats" in the sidecar.
+            That copy is taken after the Markdown is written, so its write
+            time and bytes_written do not include the sidecar itself.
+    
+    Returns:
+        Tuple of (markdown_path, metadata_path)
+    """
+    timed = stats is not None
+    if timed:
+        t = time.perf_counter()
+    
+    output_dir.mkdir(parents=True, exist_ok=True)
+    out_path = output_dir / (stem + ".md")
+    if write_text_if_changed(out_path, md) and timed:
+        stats.bytes_written += len(md.encode("utf-8"))
+    
+    if timed and stats_in_meta:
+        t = stats.lap("write", t)
+        meta = {**meta, "stats": stats.to_dict()}
+    
+    # Write metadata sidecar
+    meta_path = write_meta_json(meta, out_path, stats)
+    if timed:
+        stats.lap("write", t)
+    
+    return out_path, meta_path
+
+def _convert_pdf_to_markdown(
+    pdf_path: Path,
+    output_dir: Path,
+    inline_footnotes: bool = False,
+    cache: Optional[ConversionCache] = None,
+    stats: Optional[ConversionStats] = None,
+    stats_in_meta: bool = False,
+    snapshot_dir: Optional[Path] = None,
+    layout_analysis: bool = False,
+    page_workers: Optional[int] = None,
+    index: Optional["SearchIndex"] = None,
+    blocks: bool = False,
+    paragraph_index: bool = False,
+    ocr_engine: Optional[str] = None,
+    pages: Optional[List[int]] = None
+) -> Tuple[Path, Optional[Path]]:
+    """
+    Run the full conversion pipeline and write the output files.
 
-def write_meta_json(meta: dict, md_path: Path) -> Optional[Path]:
-    """Write metadata to a .meta.json file alongside the markdown."""
-    try:
-        out = md_path.with_suffix("")  # Remove .md extension
-        meta_path = out.with_name(out.name + ".meta.json")
-        meta_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
-        return meta_path
-    except Exception:
-        return None
+    Unlike convert_pdf_to_markdown, errors are raised to the caller so that
+    batch runs can record them per file. An extraction snapshot (.blocks)
+    given as pdf_path is replayed instead. pages is an optional list that
+    the PDF page of each body paragraph is appended to (paragraph_pages),
+    for indexing the result elsewhere.
 
-# ===============================================
-# MAIN CONVERSION FUNCTION
-# ===============================================
+    Returns:
+        Tuple of (markdown_path, metadata_path)
+    """
+    pdf_path = Path(pdf_path)
+    want_blocks = blocks or paragraph_index or index is not None or pages is not None
+    doc_blocks: Optional[List[Block]] = [] if want_blocks else None
+    if is_snapshot_path(pdf_path):
+        md, meta = convert_snapshot(pdf_path, inline_footnotes, stats, layout_analysis, doc_blocks)
+    else:
+        snapshot_path = Path(snapshot_dir) / (pdf_path.stem + SNAPSHOT_SUFFIX) if snapshot_dir else None
+        md, meta = convert_pdf(pdf_path, inline_footnotes, cache, stats, snapshot_path, layout_analysis,
+                               page_workers, doc_blocks, ocr_engine)
+    paths = write_markdown_files(md, meta, output_dir, pdf_path.stem, stats, stats_in_meta)
+    if pages is not None:
+        pages.extend(paragraph_pages(doc_blocks))
+    if blocks or paragraph_index:
+        if stats is not None:
+            t = time.perf_counter()
+        if blocks:
+            write_blocks_jsonl(doc_blocks, output_dir, pdf_path.stem, pdf_path.with_suffix(".pdf").name, stats)
+        if paragraph_index:
+            from pdf2md_paraidx import write_paragraph_index
+            write_paragraph_index(md, doc_blocks, paths[0])
+        if stats is not None:
+            stats.lap("write", t)
+    if index is not None:
+        if stats is not None:
+            t = time.perf_counter()
+        index.add_document(pdf_path.stem, md, meta, paragraph_pages(doc_blocks))
+        if stats is not None:
+            stats.lap("index", t)
+    return paths
 
 def convert_pdf_to_markdown(
     pdf_path: Path,
     output_dir: Path,
-    inline_footnotes: bool = False
+    inline_footnotes: bool = False,
+    cache: Optional[ConversionCache] = None,
+    stats: Optional[ConversionStats] = None,
+    stats_in_meta: bool = False,
+    snapshot_dir: Optional[Path] = None,
+    layout_analysis: bool = False,
+    page_workers: Optional[int] = None,
+    index: Optional["SearchIndex"] = None,
+    blocks: bool = False,
+    paragraph_index: bool = False,
+    ocr_engine: Optional[str] = None
 ) -> Tuple[bool, Optional[Path], Optional[Path]]:
     """
     Convert a Michigan Court of Appeals PDF to Markdown using rule-based patterns.
     
     Args:
-        pdf_path: Path to input PDF file
+        pdf_path: Path to input PDF file, or to an extraction snapshot
+            (.blocks) to replay the rule stages without the PDF
         output_dir: Directory to write output files
         inline_footnotes: Whether to convert footnotes inline (default: False)
+        cache: Optional ConversionCache; a hit skips PDF extraction entirely
+        stats: Optional ConversionStats, filled in with per-stage wall time
+            and counters (pages, blocks, boilerplate lines, headings, ...)
+        stats_in_meta: Also store the stats under "stats" in the .meta.json
+        snapshot_dir: Also save an extraction snapshot <stem>.blocks here
+        layout_analysis: Drop repeated headers/footers and read two-column
+            pages by column before the text rules run (needs NumPy)
+        page_workers: Extract long documents (PARALLEL_PAGE_THRESHOLD pages
+            or more) with this many worker processes
+        index: Optional SearchIndex to add (or update) the document in
+        blocks: Also write <stem>.blocks.jsonl, the document's headings,
+            paragraphs and footnotes as canonical Block records with the PDF
+            page each starts on
+        paragraph_index: Also write <stem>.paraidx, the byte offset, page
+            and heading path of every paragraph (read it with
+            pdf2md_paraidx.ParagraphIndex)
+        ocr_engine: OCR engine for scanned PDFs (see triage_pdf); without
+            one they fail instead of producing an empty .md
         
     Returns:
         Tuple of (success: bool, markdown_path: Optional[Path], metadata_path: Optional[Path])
     """
     try:
-        # Extract text from PDF
-        pages = extract_pdf_text_with_blocks(pdf_path)
-        
-        # Extract metadata before cleaning
-        meta = extract_meta_from_pages(pages)
-        
-        # Clean boilerplate from each page
-        cleaned_pages: List[str] = []
-        for pg in pages:
-            lines = [ln for ln in pg.splitlines() if not strip_boilerplate(ln.strip())]
-            cleaned_pages.append("\n".join(lines).strip())
-        
-        # Join all pages
-        raw_joined = ("\n\n---PAGE---\n\n").join([p for p in cleaned_pages if p])
-        
-        # Find opinion body (skip caption/metadata)
-        all_lines = raw_joined.splitlines()
-        while all_lines and not all_lines[0].strip():
-            all_lines.pop(0)
-        
-        body_start = find_body_start(all_lines)
-        body_lines = all_lines[body_start:]
-        
-        # Apply rule-based formatting
-        body_lines = map_headings(body_lines)
-        paras = join_lines_to_paragraphs(body_lines)
-        paras, footnotes = split_body_and_footnotes(paras)
-        
-        # Build final markdown
-        parts: List[str] = []
-        for p in paras:
-            parts.append(p)
-            parts.append("")  # Add blank line after each paragraph
-        
-        # Add footnotes section if any found
-        if footnotes:
-            parts.append("---")
-            parts.append("")
-            parts.append("## Footnotes")
-            parts.append("")
-            for n, t in footnotes:
-                parts.append(f"[^{n}]: {t}")
-        
-        md = "\n".join(parts).rstrip() + "\n"
-        
-        # Optional inline footnote conversion
-        if inline_footnotes and md is not None:
-            def repl(m: regex.Match) -> str:
-                word = m.group(1)
-                num = m.group(2)
-                prev = word.split()[-1]
-                # Skip if previous word is likely not a footnote reference
-                if prev in {"No.", "MCL", "US", "U.S.", "NW2d", "N\u2019d", "Mich", "WL"}:
-                    return m.group(0)
-                return f"{word}[^{num}]"
-            md = regex.sub(r"(\w)(\d{1,3})(?![\d\w])", repl, md)
-        
-        # Write output files
+        out_path, meta_path = _convert_pdf_to_markdown(
+            pdf_path, output_dir, inline_footnotes, cache, stats, stats_in_meta, snapshot_dir,
+            layout_analysis, page_workers, index, blocks, paragraph_index, ocr_engine
+        )
+        return True, out_path, meta_path
+        
+    except Exception as e:
+        print(f"ERROR: PDF conversion failed: {e}")
+        return False, None, None
+
+# ===============================================
+# STREAMING CONVERSION
+# ===============================================
+
+def _iter_body_lines(tagged_pages: Iterable[List[ClassifiedLine]], body_search_pages: int = 5) -> Iterator[str]:
+    """
+    Yield the heading-mapped opinion body lines from a stream of tagged pages.
+    
+    Pages are joined with the same PAGE_SEPARATOR lines as the in-memory
+    pipeline. Lines are only buffered until the body start is known: as soon
+    as a "PER CURIAM." / "OPINION" marker is seen, or otherwise after
+    body_search_pages pages, when find_body_start's heading fallback decides.
+    """
+    separator = _page_separator_lines(get_line_classifier())
+    pending: List[ClassifiedLine] = []
+    started = False
+    pages_seen = 0
+    
+    for lines in tagged_pages:
+        if not lines:
+            continue
+        if pages_seen:
+            lines = separator + lines
+        pages_seen += 1
+        
+        if started:
+            for ln in lines:
+                yield ln.markdown
+            continue
+        
+        for i, ln in enumerate(lines):
+            if ln.body_rank == BODY_START_MARKER:
+                started = True
+                pending = []
+                for body_ln in lines[i:]:
+                    yield body_ln.markdown
+                break
+            pending.append(ln)
+        
+        if not started and pages_seen >= body_search_pages:
+            started = True
+            for ln in pending[_find_body_start_tagged(pending):]:
+                yield ln.markdown
+            pending = []
+    
+    if not started:
+        for ln in pending[_find_body_start_tagged(pending):]:
+            yield ln.markdown
+
+def convert_pdf_to_markdown_streaming(
+    pdf_path: Path,
+    output_dir: Path,
+    inline_footnotes: bool = False,
+    body_search_pages: int = 5
+) -> Tuple[bool, Optional[Path], Optional[Path]]:
+    """
+    Convert a PDF page by page, writing Markdown straight to the output file.
+    
+    Extraction, boilerplate removal, heading mapping and paragraph joining all
+    run on the fly, with the open paragraph carried across page boundaries.
+    Only the current page, the paragraph being built and the footnote
+    definitions are held in memory, so peak memory stays roughly flat
+    regardless of page count. Use this for very large records.
+    
+    The output matches convert_pdf_to_markdown, except that an explicit body
+    marker ("PER CURIAM." / "OPINION") is only looked for in the first
+    body_search_pages pages. With inline_footnotes the body is first written
+    with its references still marked, then copied line by line into the
+    output, linking only references whose definition was found (they are
+    not known until they are reached).
+    Scanned PDFs (see triage_pdf) are not OCRed here; they fail.
+    
+    Returns:
+        Tuple of (success: bool, markdown_path: Optional[Path], metadata_path: Optional[Path])
+    """
+    try:
+        triage = _require_text_layer(triage_pdf(pdf_path))
+        meta: Optional[dict] = None
+        clf: Optional[LineClassifier] = None
+        
+        def tagged_pages() -> Iterator[List[ClassifiedLine]]:
+            nonlocal meta, clf
+            for page_text in iter_pdf_pages(pdf_path, footnote_refs=inline_footnotes):
+                # The court profile and metadata only ever look at the first page
+                if meta is None:
+                    first = strip_footnote_refs(page_text)
+                    profile = select_court_profile(first)
+                    meta = extract_meta_from_pages([first], profile)
+                    clf = get_line_classifier(profile)
+                yield clf.classify_page(page_text)
+        
+        heading_lines = _iter_body_lines(tagged_pages(), body_search_pages)
+        
         output_dir.mkdir(parents=True, exist_ok=True)
         out_path = output_dir / (pdf_path.stem + ".md")
-        out_path.write_text(md, encoding="utf-8")
+        body_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp") if inline_footnotes else out_path
+        footnotes: dict = {}
+        wrote_para = False
         
-        # Write metadata sidecar
+        try:
+            with open(body_path, "w", encoding="utf-8") as out:
+                for para in iter_paragraphs(heading_lines):
+                    fn = parse_footnote_def(para)
+                    if fn:
+                        footnotes.setdefault(fn[0], fn[1])
+                        continue
+                    out.write("\n\n" + para if wrote_para else para)
+                    wrote_para = True
+            
+            defined = set(footnotes)
+            if body_path != out_path:
+                with open(body_path, "r", encoding="utf-8") as body, open(out_path, "w", encoding="utf-8") as out:
+                    for line in body:
+                        out.write(_link_marked_refs(line, defined)[0])
+        finally:
+            if body_path != out_path:
+                try:
+                    os.remove(body_path)
+                except OSError:
+                    pass
+        
+        with open(out_path, "a", encoding="utf-8") as out:
+            # Add footnotes section if any found
+            if footnotes:
+                section = "---\n\n## Footnotes\n\n" + "\n".join(
+                    f"[^{n}]: {_link_marked_refs(t, defined)[0]}" for n, t in footnotes.items()
+                )
+                out.write(("\n\n" if wrote_para else "") + section.rstrip())
+            out.write("\n")
+        
+        if meta is None:
+            meta = extract_meta_from_pages([])
+        meta["triage"] = triage.to_dict()
         meta_path = write_meta_json(meta, out_path)
         
         return True, out_path, meta_path
@@ -456,35 +3015,1205 @@ def convert_pdf_to_markdown(
         print(f"ERROR: PDF conversion failed: {e}")
         return False, None, None
 
+# ===============================================
+# METADATA-ONLY EXTRACTION
+# ===============================================
+
+def read_first_page(
+    source: PdfSource,
+    stats: Optional[ConversionStats] = None,
+    triage: Optional[list] = None
+) -> Tuple[str, int]:
+    """
+    Extract the text of the first page only.
+    
+    PyMuPDF opens documents lazily, so the other pages are never loaded or
+    laid out; the cost is independent of the document's length.
+    
+    Args:
+        triage: Optional list; a Triage of the first page alone (sampled=1)
+            is appended to it, from the same open document
+    
+    Returns:
+        Tuple of (first_page_text, page_count); the text is "" for an empty PDF
+    """
+    timed = stats is not None
+    if timed:
+        start = time.perf_counter()
+    doc = open_pdf(source)
+    try:
+        page_count = doc.page_count
+        text = _page_text_from_blocks(doc[0], stats) if page_count else ""
+        if timed:
+            stats.pages += min(page_count, 1)
+            start = stats.lap("extract", start)
+        if triage is not None:
+            triage.append(_triage_document(doc, 1, text))
+            if timed:
+                stats.lap("triage", start)
+    finally:
+        doc.close()
+    return text, page_count
+
+def extract_pdf_meta(source: PdfSource, stats: Optional[ConversionStats] = None) -> dict:
+    """
+    Extract case metadata from a PDF without converting it.
+    
+    The result equals the metadata convert_pdf returns, since
+    extract_meta_from_pages only reads the first page (banner and caption),
+    except for "triage": only the first page is triaged (sampled=1), so the
+    other pages are never laid out. The triage is recorded even for scanned
+    or empty PDFs, so a metadata-only run finds the documents that need OCR.
+    
+    Args:
+        source: PDF file path, PDF bytes, or a binary file-like object
+        stats: Optional ConversionStats to record extraction in
+        
+    Returns:
+        Dictionary with case metadata
+    """
+    if hasattr(source, "read"):
+        source = source.read()
+    triage: List[Triage] = []
+    text, page_count = read_first_page(source, stats, triage)
+    if stats is not None:
+        t = time.perf_counter()
+    meta = extract_meta_from_pages([text] if page_count else [])
+    meta["triage"] = triage[0].to_dict()
+    if stats is not None:
+        stats.lap("meta", t)
+    return meta
+
+def write_pdf_meta(
+    pdf_path: Path,
+    output_dir: Path,
+    stats: Optional[ConversionStats] = None
+) -> Path:
+    """
+    Write only the .meta.json sidecar for a PDF, reading just its first page.
+    
+    The file is the one convert_pdf_to_markdown would write
+    (<output_dir>/<stem>.meta.json). Errors are raised to the caller.
+    
+    Returns:
+        Path of the metadata file
+    """
+    pdf_path = Path(pdf_path)
+    meta = extract_pdf_meta(pdf_path, stats)
+    if stats is not None:
+        t = time.perf_counter()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    meta_path = write_meta_json(meta, output_dir / (pdf_path.stem + ".md"), stats)
+    if meta_path is None:
+        raise OSError(f"Could not write metadata for {pdf_path.name} to {output_dir}")
+    if stats is not None:
+        stats.lap("write", t)
+    return meta_path
+
+# ===============================================
+# BATCH CONVERSION
+# ===============================================
+
+# Batch failure kinds (BatchResult.failure)
+FAILURE_ERROR = "error"        # The conversion raised an exception
+FAILURE_TIMEOUT = "timeout"    # Killed after the per-document timeout
+FAILURE_MEMORY = "oom"         # Went over the memory limit
+FAILURE_CRASH = "crash"        # The worker process died
+FAILURE_SCANNED = "scanned"    # Scanned PDF and no OCR engine (see triage_pdf)
+
+@dataclass
+class BatchResult:
+    """Outcome of converting one PDF in a batch run."""
+    pdf_path: Path
+    success: bool
+    md_path: Optional[Path] = None
+    meta_path: Optional[Path] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+    stats: Optional[ConversionStats] = None
+    duplicate_of: Optional[str] = None  # Set when skipped as a near-duplicate of this doc_id
+    failure: Optional[str] = None       # One of the FAILURE_* kinds when not successful
+    pages: Optional[List[int]] = None   # Paragraph pages for the search index (see _BatchJob)
+
+@dataclass
+class BatchSummary:
+    """Totals for a finished batch run."""
+    results: List[BatchResult] = field(default_factory=list)
+    elapsed: float = 0.0
+    skipped: int = 0  # Inputs a resumed run left alone (see JobLedger.remaining)
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for r in self.results if r.success)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for r in self.results if not r.success)
+
+    @property
+    def duplicates(self) -> int:
+        return sum(1 for r in self.results if r.duplicate_of is not None)
+
+    @property
+    def files_per_second(self) -> float:
+        return len(self.results) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def slowest(self, n: int = 10) -> List[BatchResult]:
+        """The n slowest files, e.g. to find pathological PDFs in a large run."""
+        return sorted(self.results, key=lambda r: r.seconds, reverse=True)[:n]
+
+class _BatchJob(NamedTuple):
+    """One file of a batch run, as handed to a worker."""
+    pdf_path: Path
+    output_dir: Path
+    inline_footnotes: bool
+    cache: Optional[ConversionCache]
+    collect_stats: bool
+    snapshot_dir: Optional[Path]
+    meta_only: bool
+    layout_analysis: bool
+    page_workers: Optional[int]
+    blocks: bool
+    paragraph_index: bool
+    ocr_engine: Optional[str] = None
+    index_pages: bool = False  # Return paragraph pages on the result, for run_batch's index
+
+def _batch_convert_one(job: _BatchJob) -> BatchResult:
+    """
+    Convert a single PDF inside a batch worker.
+
+    Pool workers import this module once and stay alive for many files, so the
+    module-level compiled patterns are reused across the whole batch. In a
+    pool, the worker holds one of the batch's slots while it converts.
+    """
+    if _BATCH_SLOTS is None:
+        return _convert_batch_job(job)
+    _BATCH_SLOTS.acquire()
+    try:
+        return _convert_batch_job(job)
+    finally:
+        _BATCH_SLOTS.release()
+
+def _convert_batch_job(job: _BatchJob) -> BatchResult:
+    """Body of _batch_convert_one: convert, and turn errors into a failed result."""
+    stats = ConversionStats() if job.collect_stats else None
+    start = time.perf_counter()
+    try:
+        if job.meta_only:
+            meta_path = write_pdf_meta(job.pdf_path, job.output_dir, stats)
+            return BatchResult(job.pdf_path, True, None, meta_path,
+                               seconds=time.perf_counter() - start, stats=stats)
+        pages = [] if job.index_pages else None
+        md_path, meta_path = _convert_pdf_to_markdown(
+            job.pdf_path, job.output_dir, job.inline_footnotes, job.cache, stats, job.collect_stats,
+            job.snapshot_dir, job.layout_analysis, job.page_workers, blocks=job.blocks,
+            paragraph_index=job.paragraph_index, ocr_engine=job.ocr_engine, pages=pages
+        )
+        return BatchResult(job.pdf_path, True, md_path, meta_path,
+                           seconds=time.perf_counter() - start, stats=stats, pages=pages)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if isinstance(e, MemoryError):
+            failure = FAILURE_MEMORY
+        elif isinstance(e, ScannedPdfError):
+            failure = FAILURE_SCANNED
+        else:
+            failure = FAILURE_ERROR
+        return BatchResult(job.pdf_path, False, error=error,
+                           seconds=time.perf_counter() - start, stats=stats, failure=failure)
+
+# Supervised workers: each job runs in a worker process with a wall-clock
+# deadline and a memory ceiling. A worker that goes over is killed and
+# replaced, and only its job fails. memory_limit is always the memory a job
+# may add on top of its worker's startup size: the address-space cap and the
+# resident-memory watchdog both count from there. Batch runs, the watch
+# daemon and the service all convert through SupervisedPool.
+
+WATCHDOG_POLL_INTERVAL = 0.25   # Seconds between memory checks of busy workers
+
+class SupervisedJobError(Exception):
+    """
+    A supervised job's worker was killed or died (see SupervisedPool).
+    
+    failure is the matching FAILURE_* kind; seconds is how long the job ran.
+    """
+    failure = FAILURE_CRASH
+
+    def __init__(self, message: str, seconds: float = 0.0):
+        super().__init__(message)
+        self.seconds = seconds
+
+class WorkerTimeout(SupervisedJobError):
+    """The job was still running at its deadline."""
+    failure = FAILURE_TIMEOUT
+
+class WorkerMemoryLimit(SupervisedJobError, MemoryError):
+    """The job's worker grew more than memory_limit past its startup size."""
+    failure = FAILURE_MEMORY
+
+class WorkerDied(SupervisedJobError):
+    """The job's worker exited on its own, or the pool was shut down under it."""
+
+def _process_rss(pid: int) -> Optional[int]:
+    """Resident set size of a process in bytes (Linux; None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+def limit_worker_memory(memory_limit: Optional[int]) -> None:
+    """
+    Cap this process's address space at its current size plus memory_limit.
+    
+    Allocations past the cap fail (MemoryError in Python, an error inside
+    MuPDF) instead of growing until the OOM killer steps in. A no-op where
+    the resource module or RLIMIT_AS is unavailable.
+    """
+    if not memory_limit:
+        return
+    try:
+        import resource
+        with open("/proc/self/statm", "rb") as f:
+            current = int(f.read().split()[0]) * mmap.PAGESIZE
+        resource.setrlimit(resource.RLIMIT_AS, (current + memory_limit, resource.RLIM_INFINITY))
+    except (ImportError, OSError, ValueError, AttributeError):
+        pass
+
+def _supervised_worker(conn, memory_limit: Optional[int]) -> None:
+    """Worker process loop: run (fn, args) jobs from conn until it sends None."""
+    limit_worker_memory(memory_limit)
+    # The watchdog's baseline, taken before the first job
+    conn.send(_process_rss(os.getpid()))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        fn, args = job
+        try:
+            ok, value = True, fn(*args)
+        except Exception as e:
+            ok, value = False, e
+        # After running out of memory the heap may be left fragmented near
+        # the cap, so the worker retires and the pool starts a fresh one
+        retire = isinstance(value, MemoryError) or getattr(value, "failure", None) == FAILURE_MEMORY
+        try:
+            conn.send((ok, value, retire))
+        except Exception as e:  # An unpicklable result or exception
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}"), retire))
+        if retire:
+            return
+
+class _SupervisedJob(NamedTuple):
+    future: concurrent.futures.Future
+    fn: Callable
+    args: tuple
+    timeout: Optional[float]
+
+class _SupervisedWorker:
+    """A worker process of SupervisedPool and the job it is running."""
+
+    def __init__(self, ctx, memory_limit: Optional[int]):
+        self.conn, child_conn = ctx.Pipe()
+        # Daemonic, so a long document never starts page workers of its own
+        # that would escape the limits
+        self.process = ctx.Process(target=_supervised_worker, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.job: Optional[_SupervisedJob] = None
+        self.started = 0.0
+        self.baseline: Optional[int] = None   # Resident bytes at startup
+
+    def submit(self, job: _SupervisedJob) -> None:
+        """Send job to the worker; an unpicklable job raises with the worker still idle."""
+        try:
+            if self.baseline is None:
+                self.baseline = self.conn.recv() or 0
+            self.conn.send((job.fn, job.args))
+        except (EOFError, OSError):
+            pass  # The worker died; reported once its sentinel is ready
+        self.job = job
+        self.started = time.monotonic()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+class SupervisedPool:
+    """
+    Worker processes that run one job at a time under a deadline and a memory limit.
+    
+    submit() is thread-safe and returns a concurrent.futures.Future. A job
+    still running after its timeout, or whose worker's resident memory grows
+    more than memory_limit bytes past its startup size, has its worker
+    killed and replaced: its future fails with WorkerTimeout or
+    WorkerMemoryLimit, and its slot is free at once, even if the job was
+    stuck inside MuPDF. A worker that dies on its own fails its job with
+    WorkerDied. Other jobs are unaffected.
+    
+    There is no background thread: the owner drives the pool by calling
+    poll() (from one thread at a time), or run() in a thread of its own.
+    Workers are started from the polling thread, with mp_context or the
+    default start method.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        timeout: Optional[float] = None,
+        memory_limit: Optional[int] = None,
+        mp_context=None
+    ):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._ctx = mp_context or multiprocessing.get_context()
+        self._lock = threading.Lock()
+        self._queue: List[_SupervisedJob] = []
+        self._pool: List[_SupervisedWorker] = []
+        self._closed = False
+        self._kill = False
+        # Wakes a poll() blocked in wait() when a job is submitted
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+
+    def submit(self, fn: Callable, *args, timeout: Optional[float] = None) -> concurrent.futures.Future:
+        """Queue fn(*args); timeout overrides the pool's deadline for this job."""
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot submit to a closed SupervisedPool")
+            self._queue.append(_SupervisedJob(future, fn, args, self.timeout if timeout is None else timeout))
+        self._wake()
+        return future
+
+    @property
+    def finished(self) -> bool:
+        """True once the pool is closed and every worker has stopped."""
+        return self._closed and not self._pool
+
+    def close(self, kill: bool = False) -> None:
+        """
+        Stop accepting jobs and cancel queued ones (thread-safe).
+        
+        Running jobs finish unless kill is set, in which case they fail with
+        WorkerDied. Workers stop during the following poll() calls.
+        """
+        with self._lock:
+            self._closed = True
+            self._kill = self._kill or kill
+            queued, self._queue = self._queue, []
+        for job in queued:
+            job.future.cancel()
+        self._wake()
+
+    def run(self) -> None:
+        """Poll until the pool is closed and its workers have stopped."""
+        while not self.finished:
+            self.poll()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    def shutdown(self, kill: bool = False) -> None:
+        """close(kill), then run() until every worker has stopped."""
+        self.close(kill)
+        self.run()
+
+    def poll(self, timeout: Optional[float] = None, also: Iterable = ()) -> list:
+        """
+        Start queued jobs, wait for workers, and settle finished or overdue jobs.
+        
+        Waits at most timeout seconds (None: until something happens), less
+        when a deadline or memory check is due.
+        
+        Args:
+            timeout: Longest wait in seconds
+            also: Extra file descriptors or connections to wait on
+        
+        Returns:
+            The objects in also that are ready
+        """
+        from multiprocessing.connection import wait as wait_for_ready
+        self._dispatch()
+        busy = [w for w in self._pool if w.job is not None]
+        
+        now = time.monotonic()
+        waits = [w.started + w.job.timeout - now for w in busy if w.job.timeout is not None]
+        if self.memory_limit and busy:
+            waits.append(WATCHDOG_POLL_INTERVAL)
+        if timeout is not None:
+            waits.append(timeout)
+        wait = max(0.0, min(waits)) if waits else None
+        handles = [self._wake_r] + [w.conn for w in busy] + [w.process.sentinel for w in busy] + list(also)
+        ready = set(wait_for_ready(handles, wait))
+        if self._wake_r in ready:
+            try:
+                os.read(self._wake_r, 4096)
+            except BlockingIOError:
+                pass
+        
+        now = time.monotonic()
+        for worker in busy:
+            job = worker.job
+            seconds = now - worker.started
+            if worker.conn in ready:
+                try:
+                    ok, value, retire = worker.conn.recv()
+                except (EOFError, OSError):
+                    pass
+                else:
+                    worker.job = None
+                    if retire:
+                        worker.stop()
+                        self._pool.remove(worker)
+                    if ok:
+                        job.future.set_result(value)
+                    else:
+                        job.future.set_exception(value)
+                    continue
+            if worker.conn in ready or worker.process.sentinel in ready:
+                worker.process.join()
+                code = worker.process.exitcode
+                error = WorkerDied(f"Worker died ({'killed, likely out of memory' if code == -9 else f'exit code {code}'})",
+                                   seconds)
+                if code == -9:  # On Linux usually the OOM killer
+                    error.failure = FAILURE_MEMORY
+                self._fail(worker, error)
+            elif job.timeout is not None and seconds >= job.timeout:
+                self._fail(worker, WorkerTimeout(f"Timeout: still converting after {job.timeout:g}s", seconds))
+            elif self.memory_limit:
+                rss = _process_rss(worker.process.pid)
+                baseline = worker.baseline or 0
+                if rss is not None and rss - baseline > self.memory_limit:
+                    self._fail(worker, WorkerMemoryLimit(
+                        f"MemoryLimit: document used {(rss - baseline) >> 20} MB over the worker's "
+                        f"{baseline >> 20} MB at startup (limit {self.memory_limit >> 20} MB)", seconds))
+        
+        if self._closed:
+            for worker in list(self._pool):
+                if worker.job is None:
+                    worker.stop()
+                    self._pool.remove(worker)
+                elif self._kill:
+                    self._fail(worker, WorkerDied("Worker stopped: the pool was shut down", now - worker.started))
+        return [handle for handle in also if handle in ready]
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass  # Already awake, or closed
+
+    def _fail(self, worker: _SupervisedWorker, error: SupervisedJobError) -> None:
+        """Kill worker and fail its job; _dispatch starts a replacement when needed."""
+        worker.kill()
+        self._pool.remove(worker)
+        worker.job.future.set_exception(error)
+        worker.job = None
+
+    def _dispatch(self) -> None:
+        """Hand queued jobs to idle workers, starting workers up to the pool size."""
+        while True:
+            with self._lock:
+                if not self._queue:
+                    return
+                worker = next((w for w in self._pool if w.job is None), None)
+                if worker is None and len(self._pool) >= self.workers:
+                    return
+                job = self._queue.pop(0)
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            if worker is None:
+                worker = _SupervisedWorker(self._ctx, self.memory_limit)
+                self._pool.append(worker)
+            try:
+                worker.submit(job)
+            except Exception as e:  # fn or args could not be pickled
+                job.future.set_exception(e)
+
+def _supervised_result(job: _BatchJob, future: concurrent.futures.Future) -> BatchResult:
+    """The BatchResult of a batch job run in a SupervisedPool."""
+    try:
+        return future.result()
+    except SupervisedJobError as e:
+        return BatchResult(job.pdf_path, False, error=str(e), seconds=e.seconds, failure=e.failure)
+
+def _isolated_convert(
+    jobs: List[_BatchJob],
+    workers: int,
+    timeout: Optional[float],
+    memory_limit: Optional[int],
+    ordered: bool
+) -> Iterator[BatchResult]:
+    """
+    Run batch jobs in a SupervisedPool, one document at a time per worker.
+    
+    A document whose worker is killed at the deadline or the memory limit
+    fails as FAILURE_TIMEOUT or FAILURE_MEMORY; one whose worker dies on its
+    own fails as FAILURE_CRASH (FAILURE_MEMORY if it was SIGKILLed, which on
+    Linux is usually the OOM killer).
+    """
+    pool = SupervisedPool(min(workers, len(jobs)), timeout, memory_limit)
+    futures = [pool.submit(_batch_convert_one, job) for job in jobs]
+    try:
+        if ordered:
+            for job, future in zip(jobs, futures):
+                while not future.done():
+                    pool.poll()
+                yield _supervised_result(job, future)
+        else:
+            pending = dict(zip(futures, jobs))
+            while pending:
+                pool.poll()
+                for future in [f for f in pending if f.done()]:
+                    yield _supervised_result(pending.pop(future), future)
+    finally:
+        pool.shutdown(kill=True)
+
+def _isolated_convert_one(job: _BatchJob, timeout: Optional[float], memory_limit: Optional[int]) -> BatchResult:
+    """Convert one document in its own supervised worker (see _isolated_convert)."""
+    return list(_isolated_convert([job], 1, timeout, memory_limit, True))[0]
+
+def _ocr_stage(
+    results: Iterator[BatchResult],
+    jobs: List[_BatchJob],
+    ocr_engine: str,
+    ocr_workers: int,
+    ordered: bool,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None
+) -> Iterator[BatchResult]:
+    """
+    Pass batch results through, converting scanned PDFs with OCR on the side.
+    
+    Documents the text path failed as FAILURE_SCANNED are handed to a pool of
+    their own (ocr_workers processes), so the text path keeps going while
+    they are OCRed. In ordered runs, results after a scanned document are
+    held back until it is done. With a timeout or memory_limit, each OCR job
+    runs in its own supervised worker.
+    """
+    by_path = {job.pdf_path: job for job in jobs}
+    if timeout is not None or memory_limit:
+        # Threads only wait on the supervised worker processes
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=ocr_workers)
+        convert, limits = _isolated_convert_one, (timeout, memory_limit)
+    else:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=ocr_workers)
+        convert, limits = _batch_convert_one, ()
+    pending: list = []  # BatchResults and OCR futures, in arrival order
+
+    def ready() -> Iterator[BatchResult]:
+        while pending:
+            if ordered:
+                item = pending[0]
+                if isinstance(item, concurrent.futures.Future) and not item.done():
+                    return
+                pending.pop(0)
+            else:
+                item = next((x for x in pending if not isinstance(x, concurrent.futures.Future) or x.done()), None)
+                if item is None:
+                    return
+                pending.remove(item)
+            yield item.result() if isinstance(item, concurrent.futures.Future) else item
+
+    try:
+        for result in results:
+            if result.failure == FAILURE_SCANNED:
+                # OCR jobs parallelize across documents, not pages
+                job = by_path[result.pdf_path]._replace(ocr_engine=ocr_engine, page_workers=1)
+                pending.append(pool.submit(convert, job, *limits))
+            else:
+                pending.append(result)
+            yield from ready()
+        while pending:
+            concurrent.futures.wait([x for x in pending if isinstance(x, concurrent.futures.Future)],
+                                    return_when=concurrent.futures.FIRST_COMPLETED)
+            yield from ready()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def batch_convert(
+    pdf_paths: Iterable[Path],
+    output_dir: Path,
+    inline_footnotes: bool = False,
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    chunksize: int = 1,
+    cache: Optional[ConversionCache] = None,
+    collect_stats: bool = False,
+    snapshot_dir: Optional[Path] = None,
+    meta_only: bool = False,
+    layout_analysis: bool = False,
+    page_workers: Optional[int] = None,
+    blocks: bool = False,
+    paragraph_index: bool = False,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    ocr_engine: Optional[str] = None,
+    ocr_workers: Optional[int] = None,
+    index_pages: bool = False,
+) -> Iterator[BatchResult]:
+    """
+    Convert many PDFs with a pool of worker processes.
+
+    Args:
+        pdf_paths: PDF files to convert
+        output_dir: Directory to write output files
+        inline_footnotes: Whether to convert footnotes inline (default: False)
+        workers: Number of worker processes (default: CPU count; 1 runs in-process)
+        ordered: Yield results in input order (True) or as they complete (False)
+        chunksize: Number of files handed to a worker at a time (ordered runs)
+        cache: Optional ConversionCache shared by all workers
+        collect_stats: Record ConversionStats for every file, returned on each
+            BatchResult and stored in its .meta.json sidecar
+        snapshot_dir: Also save an extraction snapshot per PDF here. Inputs
+            that are snapshots (.blocks) are replayed instead of extracted.
+        meta_only: Only write each PDF's .meta.json, from its first page
+            (see write_pdf_meta); md_path is None on the results
+        layout_analysis: Run analyze_page_layout before the text rules
+        page_workers: Processes used to extract a single document of
+            PARALLEL_PAGE_THRESHOLD pages or more (default: workers), so one
+            huge record does not hold up the end of the batch. Batch and
+            page workers share `workers` slots: a long document only gets
+            the slots other workers leave free, so a batch never runs more
+            than `workers` converting processes at once.
+        blocks: Also write each document's <stem>.blocks.jsonl
+        paragraph_index: Also write each document's <stem>.paraidx
+        timeout: Per-document wall-clock limit in seconds
+        memory_limit: Memory in bytes one document may use on top of its
+            worker's startup size. Resident memory is checked against it
+            while the document converts, and the worker's address space is
+            capped at its startup size plus this, so a sudden huge
+            allocation fails at once.
+            With a timeout or memory_limit, every document runs in a
+            supervised worker (even with workers=1) that is killed and
+            replaced when it goes over; the document fails with failure
+            FAILURE_TIMEOUT or FAILURE_MEMORY and the batch carries on.
+            Long documents are then extracted without page workers.
+        ocr_engine: OCR engine name (see register_ocr_engine). PDFs that
+            triage finds to be scanned fail with FAILURE_SCANNED on the text
+            path; with an engine they are then converted from OCR text in a
+            separate pool, while the text path carries on.
+        ocr_workers: Processes in the OCR pool (default: workers)
+        index_pages: Return the PDF page of each body paragraph on the
+            results (BatchResult.pages), for SearchIndex.add_files
+
+    Yields:
+        One BatchResult per input file
+    """
+    pdf_paths = list(pdf_paths)
+    if not pdf_paths:
+        return
+    workers = min(workers or os.cpu_count() or 1, len(pdf_paths))
+    if page_workers is None:
+        page_workers = workers
+    jobs = [_BatchJob(Path(p), Path(output_dir), inline_footnotes, cache, collect_stats, snapshot_dir,
+                      meta_only, layout_analysis, page_workers, blocks, paragraph_index,
+                      index_pages=index_pages)
+            for p in pdf_paths]
+    results = _batch_results(jobs, workers, ordered, chunksize, timeout, memory_limit)
+    if ocr_engine is not None and not meta_only:
+        results = _ocr_stage(results, jobs, ocr_engine, ocr_workers or workers, ordered, timeout, memory_limit)
+    yield from results
+
+def _batch_results(
+    jobs: List[_BatchJob],
+    workers: int,
+    ordered: bool,
+    chunksize: int,
+    timeout: Optional[float],
+    memory_limit: Optional[int]
+) -> Iterator[BatchResult]:
+    """Run batch jobs on the text path (see batch_convert)."""
+    if timeout is not None or memory_limit:
+        yield from _isolated_convert(jobs, workers, timeout, memory_limit, ordered)
+        return
+
+    if workers <= 1:
+        for job in jobs:
+            yield _batch_convert_one(job)
+        return
+
+    # Unlike multiprocessing.Pool's daemonic workers, these may start the
+    # page workers of a long document, out of the slots the batch shares
+    ctx = multiprocessing.get_context()
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                                  initializer=_init_batch_worker,
+                                                  initargs=(ctx.BoundedSemaphore(workers),))
+    try:
+        if ordered:
+            results = pool.map(_batch_convert_one, jobs, chunksize=chunksize)
+        else:
+            futures = [pool.submit(_batch_convert_one, job) for job in jobs]
+            results = (f.result() for f in concurrent.futures.as_completed(futures))
+        for result in results:
+            yield result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _fingerprint_one(pdf_path: Path) -> Tuple[Tuple[int, ...], dict]:
+    """Fingerprint one PDF in a batch worker; errors are left to the conversion."""
+    if is_snapshot_path(pdf_path):
+        return (), {}
+    from pdf2md_dedup import pdf_fingerprint
+    try:
+        return pdf_fingerprint(pdf_path)
+    except Exception:
+        return (), {}
+
+class _PendingDuplicate(NamedTuple):
+    """A near-duplicate set aside by _set_aside_duplicates."""
+    pdf_path: Path
+    meta: dict                # First-page metadata from pdf_fingerprint
+    match: "DuplicateMatch"
+    seconds: float            # Its share of the fingerprinting time
+
+def _set_aside_duplicates(
+    pdf_paths: List[Path],
+    dedup: "DuplicateIndex",
+    workers: Optional[int]
+) -> Tuple[List[Path], List[_PendingDuplicate]]:
+    """
+    Fingerprint a batch's PDFs in parallel and set aside near-duplicates.
+
+    Each PDF is checked against the store and the PDFs before it in the
+    batch; the others are added to the store. A duplicate is only final
+    once its original has converted (see _duplicate_result).
+
+    Returns:
+        Tuple of (PDFs still to convert, the duplicates set aside)
+    """
+    start = time.perf_counter()
+    workers = min(workers or os.cpu_count() or 1, len(pdf_paths))
+    if workers <= 1:
+        prints = [_fingerprint_one(p) for p in pdf_paths]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            prints = list(pool.map(_fingerprint_one, pdf_paths, chunksize=16))
+    seconds = (time.perf_counter() - start) / len(pdf_paths)
+
+    keep: List[Path] = []
+    duplicates: List[_PendingDuplicate] = []
+    for pdf_path, (signature, meta) in zip(pdf_paths, prints):
+        match = dedup.find(signature, exclude=pdf_path.stem)
+        if match is None:
+            dedup.add(pdf_path.stem, signature)
+            keep.append(pdf_path)
+        else:
+            duplicates.append(_PendingDuplicate(pdf_path, meta, match, seconds))
+    return keep, duplicates
+
+def _duplicate_result(duplicate: _PendingDuplicate, output_dir: Path, link_duplicates: bool) -> BatchResult:
+    """
+    The final result for a duplicate whose original has converted.
+    
+    With link_duplicates, the duplicate gets a .meta.json sidecar naming
+    the document it duplicates.
+    """
+    meta_path = None
+    if link_duplicates:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        meta_path = write_meta_json({**duplicate.meta, "duplicate_of": duplicate.match.doc_id,
+                                     "similarity": round(duplicate.match.similarity, 3)},
+                                    Path(output_dir) / (duplicate.pdf_path.stem + ".md"))
+    return BatchResult(duplicate.pdf_path, True, None, meta_path, seconds=duplicate.seconds,
+                       duplicate_of=duplicate.match.doc_id)
+
+def _print_batch_progress(done: int, total: int, result: BatchResult, elapsed: float) -> None:
+    """Default progress reporter: one line per finished file."""
+    rate = done / elapsed if elapsed > 0 else 0.0
+    if result.duplicate_of is not None:
+        status = f"DUPLICATE of {result.duplicate_of}"
+    else:
+        status = "OK" if result.success else f"FAILED ({result.error})"
+    print(f"[{done}/{total}] {result.pdf_path.name}: {status} "
+          f"{result.seconds:.2f}s, {rate:.1f} files/s")
+
+def run_batch(
+    pdf_paths: Iterable[Path],
+    output_dir: Path,
+    inline_footnotes: bool = False,
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    progress: Optional[Callable[[int, int, BatchResult, float], None]] = _print_batch_progress,
+    cache: Optional[ConversionCache] = None,
+    collect_stats: bool = False,
+    snapshot_dir: Optional[Path] = None,
+    meta_only: bool = False,
+    chunksize: int = 1,
+    layout_analysis: bool = False,
+    page_workers: Optional[int] = None,
+    index: Optional["SearchIndex"] = None,
+    dedup: Optional["DuplicateIndex"] = None,
+    link_duplicates: bool = False,
+    blocks: bool = False,
+    paragraph_index: bool = False,
+    ledger: Optional["JobLedger"] = None,
+    resume: bool = False,
+    retry_failed: bool = False,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    ocr_engine: Optional[str] = None,
+    ocr_workers: Optional[int] = None,
+) -> BatchSummary:
+    """
+    Run a batch conversion to completion, reporting progress and throughput.
+
+    Args:
+        progress: Called as progress(done, total, result, elapsed) after each
+            file; pass None to run silently
+        index: Optional SearchIndex; each converted file is added to it from
+            this process as its result comes in
+        dedup: Optional DuplicateIndex. All PDFs are fingerprinted first
+            (pdf_fingerprint, in parallel); near-duplicates of a stored or
+            earlier PDF are not converted. They are reported, with
+            duplicate_of set, once their original has converted; if it
+            fails, they are fingerprinted and converted in another round
+            instead. Converted PDFs stay in the store for later batches;
+            failed ones are removed again.
+        link_duplicates: With dedup, write a .meta.json for each duplicate
+            with "duplicate_of" and "similarity" added
+        ledger: Optional JobLedger; every result is recorded in it as it
+            comes in, so an interrupted run loses at most the files in flight
+        resume: With a ledger, skip files already done (and unchanged), and
+            failed files whose retry backoff has not passed
+        retry_failed: With a ledger, convert only failed files that are due
+            for a retry
+        
+    Other arguments are as for batch_convert.
+
+    Returns:
+        BatchSummary with per-file results and overall throughput
+    """
+    pdf_paths = [Path(p) for p in pdf_paths]
+    summary = BatchSummary()
+    if ledger is not None and (resume or retry_failed):
+        todo = ledger.remaining(pdf_paths, failed_only=retry_failed)
+        summary.skipped = len(pdf_paths) - len(todo)
+        pdf_paths = todo
+    total = len(pdf_paths)
+    start = time.perf_counter()
+
+    def report(result: BatchResult) -> None:
+        summary.results.append(result)
+        if ledger is not None:
+            ledger.record(result)
+        if progress:
+            progress(len(summary.results), total, result, time.perf_counter() - start)
+
+    # Rounds: duplicates wait for their original's result. Those of a failed
+    # original go through dedup and conversion again in the next round,
+    # where the first of them becomes the new original.
+    while pdf_paths:
+        waiting: Dict[str, List[_PendingDuplicate]] = {}
+        if dedup is not None:
+            pdf_paths, duplicates = _set_aside_duplicates(pdf_paths, dedup, workers)
+            originals = {p.stem for p in pdf_paths}
+            for duplicate in duplicates:
+                if duplicate.match.doc_id in originals:
+                    waiting.setdefault(duplicate.match.doc_id, []).append(duplicate)
+                else:
+                    report(_duplicate_result(duplicate, output_dir, link_duplicates))
+        requeue: List[Path] = []
+        for result in batch_convert(pdf_paths, output_dir, inline_footnotes, workers, ordered, chunksize,
+                                    cache=cache, collect_stats=collect_stats, snapshot_dir=snapshot_dir,
+                                    meta_only=meta_only, layout_analysis=layout_analysis,
+                                    page_workers=page_workers, blocks=blocks,
+                                    paragraph_index=paragraph_index, timeout=timeout,
+                                    memory_limit=memory_limit, ocr_engine=ocr_engine,
+                                    ocr_workers=ocr_workers, index_pages=index is not None):
+            if index is not None and result.success and result.md_path is not None:
+                index.add_files(result.md_path, result.meta_path, result.pages)
+            if dedup is not None and not result.success:
+                dedup.remove(result.pdf_path.stem)
+            report(result)
+            duplicates = waiting.pop(result.pdf_path.stem, [])
+            if result.success:
+                for duplicate in duplicates:
+                    report(_duplicate_result(duplicate, output_dir, link_duplicates))
+            else:
+                requeue += [d.pdf_path for d in duplicates]
+        pdf_paths = requeue
+    summary.elapsed = time.perf_counter() - start
+    return summary
+
+def batch_exit_code(summary: BatchSummary) -> int:
+    """Process exit code for a batch run: the number of failed files, capped at 255."""
+    return min(summary.failed, 255)
+
 # ===============================================
 # COMMAND LINE INTERFACE
 # ===============================================
 
-def main():
-    """Simple command line interface for testing."""
-    import sys
+CLI_COMMANDS = ("convert", "search", "cited-by", "cites", "reindex", "ledger-report", "paragraphs")
+
+def _build_arg_parser():
+    """
+    The command line parser: convert (the default command) and the index/ledger lookups.
     
-    if len(sys.argv) < 3:
-        print("Usage: python pdf2md_core.py <pdf_path> <output_dir>")
-        print("       Convert a Michigan Court of Appeals PDF to Markdown")
-        sys.exit(1)
+    Returns:
+        Tuple of (parser, convert subparser)
+    """
+    import argparse
+    
+    def count(text: str) -> int:
+        try:
+            value = int(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"not a whole number: {text!r}")
+        if value < 1:
+            raise argparse.ArgumentTypeError(f"must be at least 1: {text}")
+        return value
     
-    pdf_path = Path(sys.argv[1])
-    output_dir = Path(sys.argv[2])
+    def amount(text: str) -> float:
+        try:
+            value = float(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"not a number: {text!r}")
+        if value <= 0:
+            raise argparse.ArgumentTypeError(f"must be positive: {text}")
+        return value
     
+    parser = argparse.ArgumentParser(
+        prog="pdf2md_core.py",
+        description="Convert Michigan Court of Appeals PDFs to Markdown",
+        epilog="Without a command, the arguments are those of convert: "
+               "python pdf2md_core.py <pdf_or_dir> <output_dir> [options]"
+    )
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    
+    convert = subparsers.add_parser('convert', help='Convert a PDF (or a directory of PDFs) to Markdown (default)',
+                                    epilog='In directory mode the exit code is the number of failed files')
+    convert.add_argument('input', help='PDF file, .blocks snapshot, or directory of PDFs')
+    convert.add_argument('output_dir', help='Output directory for Markdown files')
+    convert.add_argument('--workers', type=count, default=None,
+                         help='Worker processes in directory mode (default: one per CPU)')
+    convert.add_argument('--cache', default=None, metavar='DIR', help='Conversion cache directory')
+    convert.add_argument('--stream', action='store_true',
+                         help='Convert page by page with bounded memory (large records)')
+    convert.add_argument('--stats', action='store_true', help='Record stage timings and counters in each .meta.json')
+    convert.add_argument('--snapshots', default=None, metavar='DIR',
+                         help="Also save each PDF's extracted blocks to DIR/<name>.blocks")
+    convert.add_argument('--replay', action='store_true',
+                         help='Convert a directory of .blocks snapshots instead of PDFs '
+                              '(a single .blocks file is always replayed)')
+    convert.add_argument('--meta-only', action='store_true',
+                         help='Write only <name>.meta.json, reading just the first page')
+    convert.add_argument('--page-workers', type=count, default=None, metavar='N',
+                         help=f'Extract PDFs of {PARALLEL_PAGE_THRESHOLD}+ pages with N processes '
+                              '(default: one per CPU, or --workers in directory mode; 1 disables)')
+    convert.add_argument('--layout', action='store_true',
+                         help='Drop repeated headers/footers and read two-column pages by column '
+                              '(needs NumPy; overrides --stream)')
+    convert.add_argument('--blocks', action='store_true',
+                         help='Also write <name>.blocks.jsonl, the canonical Block records (overrides --stream)')
+    convert.add_argument('--para-index', action='store_true',
+                         help='Also write <name>.paraidx, an offset index of paragraphs and pages '
+                              '(overrides --stream)')
+    convert.add_argument('--index', default=None, metavar='DB',
+                         help='Add each converted file to the SQLite full-text index DB')
+    convert.add_argument('--dedup', default=None, metavar='DB',
+                         help='Skip near-duplicates of PDFs already in the signature store DB (directory mode)')
+    convert.add_argument('--link-duplicates', action='store_true',
+                         help='With --dedup, write a .meta.json naming the original for each duplicate')
+    convert.add_argument('--ledger', default=None, metavar='DB',
+                         help="Record each file's outcome in the SQLite job ledger DB (directory mode)")
+    convert.add_argument('--resume', action='store_true', help='With --ledger, skip files already done')
+    convert.add_argument('--retry-failed', action='store_true',
+                         help='With --ledger, rerun only failures whose retry backoff has passed')
+    convert.add_argument('--timeout', type=amount, default=None, metavar='SECONDS',
+                         help='Kill and fail a PDF still converting after SECONDS (directory mode)')
+    convert.add_argument('--memory-limit', type=amount, default=None, metavar='MB',
+                         help="Kill and fail a PDF using more than MB on top of its worker's startup "
+                              "size (directory mode)")
+    convert.add_argument('--ocr', default=None, metavar='ENGINE',
+                         help='OCR engine for scanned PDFs, e.g. tesseract or module:function '
+                              '(without it they fail)')
+    convert.add_argument('--ocr-workers', type=count, default=None, metavar='N',
+                         help='Processes OCRing scanned PDFs in directory mode (default: --workers)')
+    
+    search = subparsers.add_parser('search', help='Search the full-text index (FTS5 syntax)')
+    search.add_argument('db', help='SQLite full-text index')
+    search.add_argument('query', nargs='+', help='FTS5 query')
+    cited_by = subparsers.add_parser('cited-by', help='List opinions citing e.g. MCL 750.316')
+    cited_by.add_argument('db', help='SQLite full-text index')
+    cited_by.add_argument('citation', nargs='+', help='Citation')
+    cites = subparsers.add_parser('cites', help='List what an opinion cites')
+    cites.add_argument('db', help='SQLite full-text index')
+    cites.add_argument('opinion', nargs='+', help='Opinion file stem or case number')
+    reindex = subparsers.add_parser('reindex', help='Index converted output (.md and .meta.json files)')
+    reindex.add_argument('db', help='SQLite full-text index (created if missing)')
+    reindex.add_argument('output_dir', help='Directory of converted Markdown')
+    reindex.add_argument('--workers', type=count, default=None, help='Worker processes (default: one per CPU)')
+    
+    ledger_report = subparsers.add_parser('ledger-report', help='Show the slowest and all failed files of a job ledger')
+    ledger_report.add_argument('db', help='SQLite job ledger')
+    ledger_report.add_argument('slowest', nargs='?', type=count, default=10, help='Slowest files to show (default: 10)')
+    
+    paragraphs = subparsers.add_parser('paragraphs', help="Print pages' paragraphs using a .paraidx index")
+    paragraphs.add_argument('md_path', help='Converted Markdown file with a .paraidx sidecar')
+    paragraphs.add_argument('first', type=count, help='First page')
+    paragraphs.add_argument('last', type=count, nargs='?', default=None, help='Last page (default: first)')
+    return parser, convert
+
+def _cli_convert(args) -> None:
+    """The convert command: one file, or a directory through run_batch."""
+    from pdf2md_dedup import DuplicateIndex
+    from pdf2md_ledger import JobLedger
+    from pdf2md_search import SearchIndex
+    pdf_path = Path(args.input)
+    output_dir = Path(args.output_dir)
     if not pdf_path.exists():
         print(f"ERROR: PDF file not found: {pdf_path}")
         sys.exit(1)
     
-    success, md_path, meta_path = convert_pdf_to_markdown(pdf_path, output_dir)
+    cache = ConversionCache(Path(args.cache)) if args.cache else None
+    snapshot_dir = Path(args.snapshots) if args.snapshots else None
+    search_index = SearchIndex(Path(args.index)) if args.index else None
+    memory_limit = int(args.memory_limit * (1 << 20)) if args.memory_limit else None
+    
+    if pdf_path.is_dir():
+        dedup = DuplicateIndex(Path(args.dedup)) if args.dedup else None
+        ledger = JobLedger(Path(args.ledger)) if args.ledger else None
+        pdf_files = sorted(pdf_path.glob("*" + SNAPSHOT_SUFFIX if args.replay else "*.pdf"))
+        # Metadata-only jobs are short, so hand them to workers in chunks
+        summary = run_batch(pdf_files, output_dir, workers=args.workers, cache=cache,
+                            collect_stats=args.stats, snapshot_dir=snapshot_dir,
+                            meta_only=args.meta_only, chunksize=16 if args.meta_only else 1,
+                            layout_analysis=args.layout, page_workers=args.page_workers, index=search_index,
+                            dedup=dedup, link_duplicates=args.link_duplicates, blocks=args.blocks,
+                            paragraph_index=args.para_index, ledger=ledger, resume=args.resume,
+                            retry_failed=args.retry_failed, timeout=args.timeout, memory_limit=memory_limit,
+                            ocr_engine=args.ocr, ocr_workers=args.ocr_workers)
+        skipped = f" ({summary.duplicates} near-duplicates skipped)" if dedup is not None else ""
+        if args.resume or args.retry_failed:
+            skipped += f", {summary.skipped} left as recorded in the ledger"
+        print(f"DONE: {summary.succeeded} succeeded{skipped}, {summary.failed} failed "
+              f"in {summary.elapsed:.1f}s ({summary.files_per_second:.1f} files/s)")
+        if args.stats:
+            for r in summary.slowest(10):
+                if r.success and r.stats is not None:
+                    print(f"SLOWEST: {r.pdf_path.name}: {r.stats.summary()}")
+        for r in summary.results:
+            if not r.success:
+                print(f"FAILED: {r.pdf_path}: {r.error}")
+        sys.exit(batch_exit_code(summary))
+    
+    stats = ConversionStats() if args.stats else None
+    if args.meta_only:
+        try:
+            meta_path = write_pdf_meta(pdf_path, output_dir, stats)
+        except Exception as e:
+            print(f"FAILED: Metadata extraction failed: {e}")
+            sys.exit(1)
+        print(f"SUCCESS: Metadata written to {meta_path}")
+        if stats is not None:
+            print(f"Stats: {stats.summary()}")
+        return
+    
+    stream = (args.stream and not is_snapshot_path(pdf_path) and not args.layout and not args.blocks
+              and not args.para_index and args.ocr is None)
+    if stream:
+        success, md_path, meta_path = convert_pdf_to_markdown_streaming(pdf_path, output_dir)
+        if success and search_index is not None:
+            search_index.add_files(md_path, meta_path)
+    else:
+        success, md_path, meta_path = convert_pdf_to_markdown(
+            pdf_path, output_dir, cache=cache, stats=stats, stats_in_meta=args.stats,
+            snapshot_dir=snapshot_dir, layout_analysis=args.layout,
+            page_workers=args.page_workers or os.cpu_count(), index=search_index, blocks=args.blocks,
+            paragraph_index=args.para_index, ocr_engine=args.ocr
+        )
     
     if success:
         print(f"SUCCESS: Converted to {md_path}")
         if meta_path:
             print(f"Metadata: {meta_path}")
+        if stats is not None and not stream:
+            print(f"Stats: {stats.summary()}")
     else:
         print("FAILED: Conversion failed")
         sys.exit(1)
 
+def _cli_lookup(args) -> None:
+    """The search, cited-by, cites and reindex commands."""
+    from pdf2md_search import SearchIndex
+    if args.command != "reindex" and not Path(args.db).exists():
+        print(f"ERROR: Index not found: {args.db}")
+        sys.exit(1)
+    with SearchIndex(Path(args.db)) as search_index:
+        if args.command == "search":
+            for hit in search_index.search(" ".join(args.query)):
+                page = f"p. {hit.page}" if hit.page is not None else "footnote"
+                print(f"{hit.doc_id} ({hit.case_no or '-'}, {hit.date or '-'}) {page} "
+                      f"[{hit.heading or '-'}]: {hit.snippet}")
+        elif args.command == "cited-by":
+            for doc_id, case_no, case_name, count in search_index.cited_by(" ".join(args.citation)):
+                print(f"{doc_id} ({case_no or '-'}) {case_name or '-'}: {count}x")
+        elif args.command == "cites":
+            for kind, cite, count in search_index.citations_of(" ".join(args.opinion)):
+                print(f"{kind}: {cite} ({count}x)")
+        else:
+            if not Path(args.output_dir).is_dir():
+                print(f"ERROR: Not a directory: {args.output_dir}")
+                sys.exit(1)
+            updated, unchanged = search_index.add_directory(Path(args.output_dir), args.workers)
+            print(f"DONE: {updated} indexed, {unchanged} unchanged")
+
+def main(argv: Optional[List[str]] = None):
+    """Command line interface: convert by default, or look things up in an index or ledger."""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser, convert_parser = _build_arg_parser()
+    if not argv:
+        parser.print_help()
+        sys.exit(1)
+    # convert is the default command, so "<pdf_or_dir> <output_dir>" keeps working
+    if argv[0] not in CLI_COMMANDS and argv[0] not in ("-h", "--help"):
+        argv.insert(0, "convert")
+    args = parser.parse_args(argv)
+    
+    if args.command == "convert":
+        if args.link_duplicates and not args.dedup:
+            convert_parser.error("--link-duplicates needs --dedup")
+        if (args.resume or args.retry_failed) and not args.ledger:
+            convert_parser.error("--resume and --retry-failed need --ledger")
+        _cli_convert(args)
+    elif args.command == "ledger-report":
+        from pdf2md_ledger import JobLedger
+        if not Path(args.db).exists():
+            print(f"ERROR: Ledger not found: {args.db}")
+            sys.exit(1)
+        with JobLedger(Path(args.db)) as ledger:
+            print(ledger.report(args.slowest))
+    elif args.command == "paragraphs":
+        from pdf2md_paraidx import ParagraphIndex
+        try:
+            paragraphs = ParagraphIndex(Path(args.md_path))
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        with paragraphs:
+            for para in paragraphs.pages(args.first, args.last or args.first, footnotes=True):
+                print(f"[{para.number}] p. {para.page} [{para.heading or '-'}]: {para.text}")
+    else:
+        _cli_lookup(args)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
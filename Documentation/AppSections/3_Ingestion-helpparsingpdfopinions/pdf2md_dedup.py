@@ -0,0 +1,180 @@
+"""
+Near-duplicate detection for the Michigan Court PDF to Markdown converter.
+
+DuplicateIndex is a SQLite store of MinHash signatures of each PDF's
+opening pages; run_batch(..., dedup=...) converts only one copy of an
+opinion that arrives several times.
+"""
+
+import struct
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+from pdf2md_core import LazyPattern, PdfSource, clean_page, extract_meta_from_pages, iter_pdf_pages
+
+# ===============================================
+# NEAR-DUPLICATE DETECTION
+# ===============================================
+
+# The same opinion often arrives several times (unpublished, published,
+# amended, re-bannered). Documents are compared by MinHash signatures of
+# their opening pages; locality-sensitive hashing (bands of the signature)
+# finds candidates with a few indexed lookups, however large the store.
+DUPLICATE_PAGES = 3          # Opening pages fingerprinted
+DUPLICATE_SHINGLE = 5        # Words per shingle
+DUPLICATE_NUM_PERM = 64      # MinHash signature length
+DUPLICATE_BANDS = 16         # LSH bands (DUPLICATE_NUM_PERM / bands rows each)
+DUPLICATE_THRESHOLD = 0.8    # Estimated Jaccard similarity to count as a duplicate
+
+_MINHASH_PRIME = (1 << 61) - 1
+_MINHASH_PARAMS = [(int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "little")
+                    % (_MINHASH_PRIME - 1) + 1,
+                    int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "little")
+                    % _MINHASH_PRIME)
+                   for i in range(DUPLICATE_NUM_PERM)]
+
+_WORD_RE = LazyPattern(r"[^\W_]+")
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+def minhash_signature(text: str) -> Tuple[int, ...]:
+    """
+    MinHash signature of the word shingles of a text.
+    
+    Words are lowercased and punctuation is ignored, so reflowed or
+    re-punctuated copies shingle the same. Returns () for a text with no
+    words (e.g. a scanned PDF without a text layer).
+    """
+    words = _WORD_RE.findall(text.lower())
+    n = DUPLICATE_SHINGLE
+    shingles = {_hash64(" ".join(words[i:i + n]).encode("utf-8"))
+                for i in range(max(len(words) - n + 1, 1 if words else 0))}
+    if not shingles:
+        return ()
+    p = _MINHASH_PRIME
+    return tuple(min((a * h + b) % p for h in shingles) for a, b in _MINHASH_PARAMS)
+
+def signature_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures' texts."""
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+def pdf_fingerprint(source: PdfSource) -> Tuple[Tuple[int, ...], dict]:
+    """
+    Fingerprint a PDF from its first DUPLICATE_PAGES pages.
+    
+    Boilerplate lines (banners, timestamps, publication notices, page
+    numbers) are removed first, so versions that differ only in those
+    match. The first page's metadata comes for free.
+    
+    Returns:
+        Tuple of (minhash_signature, metadata_dict)
+    """
+    pages = iter_pdf_pages(source)
+    try:
+        head = [text for _, text in zip(range(DUPLICATE_PAGES), pages)]
+    finally:
+        pages.close()
+    meta = extract_meta_from_pages(head[:1])
+    return minhash_signature("\n".join(clean_page(pg) for pg in head)), meta
+
+class DuplicateMatch(NamedTuple):
+    """A stored document found similar to a new one."""
+    doc_id: str
+    similarity: float
+
+class DuplicateIndex:
+    """
+    Persistent store of document signatures for near-duplicate lookups (SQLite).
+    
+    Each signature is split into DUPLICATE_BANDS bands; documents sharing a
+    band are candidates, and a candidate whose estimated similarity reaches
+    the threshold is a duplicate. A lookup is one indexed query per band.
+    Changing the DUPLICATE_* settings needs a new database.
+    """
+    
+    def __init__(self, db_path: Path, threshold: float = DUPLICATE_THRESHOLD):
+        self.db_path = Path(db_path)
+        self.threshold = threshold
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS signatures (doc_id TEXT PRIMARY KEY, signature BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL, bucket INTEGER NOT NULL, doc_id TEXT NOT NULL,
+                PRIMARY KEY (band, bucket, doc_id)
+            ) WITHOUT ROWID;
+        """)
+    
+    def close(self) -> None:
+        self.conn.close()
+    
+    def __enter__(self) -> "DuplicateIndex":
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+    
+    @staticmethod
+    def _buckets(signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        rows = len(signature) // DUPLICATE_BANDS
+        return [(band, _hash64(struct.pack(f"<{rows}Q", *signature[band * rows:(band + 1) * rows])) >> 1)
+                for band in range(DUPLICATE_BANDS)]
+    
+    def find(self, signature: Tuple[int, ...], exclude: Optional[str] = None) -> Optional[DuplicateMatch]:
+        """
+        Most similar stored document at or above the threshold, if any.
+        
+        Args:
+            signature: minhash_signature of the new document
+            exclude: doc_id to ignore (the document itself, when re-run)
+        """
+        if not signature:
+            return None
+        candidates = set()
+        for band, bucket in self._buckets(signature):
+            candidates.update(doc_id for (doc_id,) in self.conn.execute(
+                "SELECT doc_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)))
+        candidates.discard(exclude)
+        
+        best = None
+        for doc_id in sorted(candidates):
+            row = self.conn.execute("SELECT signature FROM signatures WHERE doc_id = ?", (doc_id,)).fetchone()
+            stored = struct.unpack(f"<{len(row[0]) // 8}Q", row[0])
+            similarity = signature_similarity(signature, stored)
+            if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                best = DuplicateMatch(doc_id, similarity)
+        return best
+    
+    def add(self, doc_id: str, signature: Tuple[int, ...]) -> None:
+        """Store (or replace) a document's signature. Empty signatures are not stored."""
+        with self.conn:
+            self._delete(doc_id)
+            if signature:
+                self.conn.execute("INSERT INTO signatures VALUES (?, ?)",
+                                  (doc_id, struct.pack(f"<{len(signature)}Q", *signature)))
+                self.conn.executemany("INSERT INTO bands VALUES (?, ?, ?)",
+                                      ((band, bucket, doc_id) for band, bucket in self._buckets(signature)))
+    
+    def _delete(self, doc_id: str) -> None:
+        row = self.conn.execute("SELECT signature FROM signatures WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return
+        old = struct.unpack(f"<{len(row[0]) // 8}Q", row[0])
+        self.conn.executemany("DELETE FROM bands WHERE band = ? AND bucket = ? AND doc_id = ?",
+                              ((band, bucket, doc_id) for band, bucket in self._buckets(old)))
+        self.conn.execute("DELETE FROM signatures WHERE doc_id = ?", (doc_id,))
+    
+    def remove(self, doc_id: str) -> None:
+        """Forget a document."""
+        with self.conn:
+            self._delete(doc_id)
+    
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
@@ -0,0 +1,210 @@
+"""
+Job ledger for the Michigan Court PDF to Markdown converter.
+
+JobLedger records every batch file's outcome in SQLite, so a run that
+dies part way can be resumed and failed files retried with backoff.
+
+Usage:
+    python pdf2md_core.py <pdf_dir> <output_dir> --ledger DB [--resume | --retry-failed]
+    python pdf2md_core.py ledger-report DB [N]
+"""
+
+import time
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pdf2md_core import FAILURE_ERROR, BatchResult, pdf_content_hash
+
+# ===============================================
+# JOB LEDGER
+# ===============================================
+
+# A batch run can record every file's outcome in a SQLite ledger, so that a
+# run that dies part way can be resumed and failed files retried later.
+
+LEDGER_MAX_ATTEMPTS = 5        # Failed files are not retried after this many attempts
+LEDGER_BACKOFF = 60.0          # Seconds before the first retry; doubles per attempt
+LEDGER_MAX_BACKOFF = 86400.0   # Longest wait between retries
+
+# Ledger statuses
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_DUPLICATE = "duplicate"
+
+class LedgerEntry(NamedTuple):
+    """One file's row in a JobLedger."""
+    path: str
+    status: str
+    attempts: int
+    error: Optional[str]
+    seconds: float
+    md_sha256: Optional[str]
+    meta_sha256: Optional[str]
+    duplicate_of: Optional[str]
+    finished: float           # Unix time of the last attempt
+    next_attempt: float       # Unix time a failed file may be retried
+    failure: Optional[str]    # FAILURE_* kind of a failed file
+
+# The jobs table's columns for a LedgerEntry, in field order (the field
+# names are the column names)
+_LEDGER_COLUMNS = ", ".join(LedgerEntry._fields)
+
+def _file_sha256(path: Optional[Path]) -> Optional[str]:
+    if path is None:
+        return None
+    try:
+        return pdf_content_hash(path)
+    except OSError:
+        return None
+
+class JobLedger:
+    """
+    Persistent record of batch conversions (SQLite), one row per input file.
+    
+    Rows hold the status, attempt count, error text, duration and SHA-256 of
+    the written outputs, keyed by the input's absolute path. The input's size
+    and mtime are stored too, so a file that changed since is converted again.
+    """
+    
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                path TEXT PRIMARY KEY, status TEXT NOT NULL, attempts INTEGER NOT NULL,
+                error TEXT, seconds REAL NOT NULL, md_sha256 TEXT, meta_sha256 TEXT,
+                duplicate_of TEXT, finished REAL NOT NULL, next_attempt REAL NOT NULL,
+                size INTEGER, mtime_ns INTEGER, failure TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seconds);
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "failure" not in columns:
+            with self.conn:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN failure TEXT")
+    
+    def close(self) -> None:
+        self.conn.close()
+    
+    def __enter__(self) -> "JobLedger":
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+    
+    @staticmethod
+    def _key(path: Path) -> str:
+        return str(Path(path).resolve())
+    
+    @staticmethod
+    def _stat(path: Path) -> Tuple[Optional[int], Optional[int]]:
+        try:
+            st = Path(path).stat()
+        except OSError:
+            return None, None
+        return st.st_size, st.st_mtime_ns
+    
+    def get(self, path: Path) -> Optional[LedgerEntry]:
+        """The ledger row for an input file, if it was ever run."""
+        row = self.conn.execute(
+            f"SELECT {_LEDGER_COLUMNS} FROM jobs WHERE path = ?", (self._key(path),)).fetchone()
+        return LedgerEntry(*row) if row else None
+    
+    def remaining(self, pdf_paths: Iterable[Path], failed_only: bool = False,
+                  now: Optional[float] = None) -> List[Path]:
+        """
+        The inputs a resumed run still has to convert, in the given order.
+        
+        That is files never run or changed since their last run, failed
+        files whose backoff has passed and that have attempts left, and
+        duplicates whose original has failed since (nothing was converted
+        for them). With failed_only, just the failed files that are due and
+        those duplicates.
+        """
+        now = time.time() if now is None else now
+        # Originals are named by output stem (DuplicateIndex doc_id)
+        failed_stems = {Path(path).stem for (path,) in self.conn.execute(
+            "SELECT path FROM jobs WHERE status = ?", (JOB_FAILED,))}
+        todo = []
+        for pdf_path in pdf_paths:
+            row = self.conn.execute(
+                "SELECT status, attempts, next_attempt, size, mtime_ns, duplicate_of FROM jobs WHERE path = ?",
+                (self._key(pdf_path),)).fetchone()
+            if row is None or self._stat(pdf_path) != (row[3], row[4]):
+                if not failed_only or (row is not None and row[0] == JOB_FAILED):
+                    todo.append(pdf_path)
+            elif row[0] == JOB_FAILED and row[1] < LEDGER_MAX_ATTEMPTS and row[2] <= now:
+                todo.append(pdf_path)
+            elif row[0] == JOB_DUPLICATE and row[5] in failed_stems:
+                todo.append(pdf_path)
+        return todo
+    
+    def record(self, result: BatchResult) -> None:
+        """
+        Store a batch result, hashing the files it wrote.
+        
+        Attempts are counted per file version: they restart at 1 when the
+        input changed since the last run. A failure schedules the next retry
+        LEDGER_BACKOFF * 2 ** (attempts - 1) seconds later.
+        """
+        key = self._key(result.pdf_path)
+        size, mtime_ns = self._stat(result.pdf_path)
+        row = self.conn.execute("SELECT attempts, size, mtime_ns FROM jobs WHERE path = ?", (key,)).fetchone()
+        attempts = row[0] + 1 if row is not None and (row[1], row[2]) == (size, mtime_ns) else 1
+        
+        now = time.time()
+        if result.duplicate_of is not None:
+            status = JOB_DUPLICATE
+        else:
+            status = JOB_DONE if result.success else JOB_FAILED
+        next_attempt = now
+        if status == JOB_FAILED:
+            next_attempt += min(LEDGER_BACKOFF * 2 ** (attempts - 1), LEDGER_MAX_BACKOFF)
+        
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, status, attempts, result.error, result.seconds,
+                 _file_sha256(result.md_path), _file_sha256(result.meta_path), result.duplicate_of,
+                 now, next_attempt, size, mtime_ns, result.failure))
+    
+    def counts(self) -> Dict[str, int]:
+        """Number of files per status."""
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+    
+    def slowest(self, n: int = 10) -> List[LedgerEntry]:
+        """The n slowest converted files."""
+        return [LedgerEntry(*row) for row in self.conn.execute(
+            f"SELECT {_LEDGER_COLUMNS} FROM jobs WHERE status = ? ORDER BY seconds DESC LIMIT ?",
+            (JOB_DONE, n))]
+    
+    def failures(self) -> List[LedgerEntry]:
+        """Failed files, most attempted first."""
+        return [LedgerEntry(*row) for row in self.conn.execute(
+            f"SELECT {_LEDGER_COLUMNS} FROM jobs WHERE status = ? ORDER BY attempts DESC, path",
+            (JOB_FAILED,))]
+    
+    def report(self, n: int = 10) -> str:
+        """Plain-text summary: counts, the n slowest files and every failure."""
+        counts = self.counts()
+        lines = [f"{sum(counts.values())} files: " + ", ".join(
+            f"{counts.get(s, 0)} {s}" for s in (JOB_DONE, JOB_FAILED, JOB_DUPLICATE))]
+        slowest = self.slowest(n)
+        if slowest:
+            lines.append(f"Slowest {len(slowest)}:")
+            lines += [f"  {e.seconds:8.2f}s  {e.path}" for e in slowest]
+        failures = self.failures()
+        if failures:
+            now = time.time()
+            lines.append(f"Failed {len(failures)}:")
+            for e in failures:
+                if e.attempts >= LEDGER_MAX_ATTEMPTS:
+                    retry = "gave up"
+                else:
+                    retry = "retry due" if e.next_attempt <= now else f"retry in {e.next_attempt - now:.0f}s"
+                lines.append(f"  {e.attempts}x {e.failure or FAILURE_ERROR} ({retry})  {e.path}: {e.error}")
+        return "\n".join(lines)
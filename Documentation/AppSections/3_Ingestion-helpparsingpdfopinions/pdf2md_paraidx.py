@@ -0,0 +1,214 @@
+"""
+Paragraph offset index for the Michigan Court PDF to Markdown converter.
+
+--para-index writes a <stem>.paraidx sidecar next to each converted .md
+(see write_paragraph_index); ParagraphIndex reads single paragraphs or
+page ranges from it without loading the Markdown.
+"""
+
+import os
+import mmap
+import bisect
+import struct
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pdf2md_core import BLOCK_FOOTNOTE, BLOCK_HEADING, BLOCK_PARAGRAPH, Block
+
+# ===============================================
+# PARAGRAPH OFFSET INDEX
+# ===============================================
+# A small binary sidecar (<stem>.paraidx) that locates every heading,
+# paragraph and footnote in the converted .md, so a viewer can read any of
+# them, or a page range, through mmap without loading the whole file.
+# Binary layout (little-endian):
+#
+#   header   magic, .md size in bytes, entry_count, body_count, path_count
+#   entries  .md byte offset, byte length, PDF page, heading path no, kind
+#            (body entries in document order, then the footnotes)
+#   paths    path_count + 1 offsets into the path text (path 0 is "")
+#   text     UTF-8 heading paths ("I. BACKGROUND > A. Procedural History")
+
+PARAGRAPH_INDEX_SUFFIX = ".paraidx"
+PARAGRAPH_INDEX_MAGIC = b"P2MDPAR1"
+_PARAGRAPH_INDEX_HEADER = struct.Struct("<8sQIII")
+_PARAGRAPH_INDEX_ENTRY = struct.Struct("<QIIIB3x")
+
+# Entry kinds, stored as their position in this tuple
+_PARAGRAPH_KINDS = (BLOCK_PARAGRAPH, BLOCK_HEADING, BLOCK_FOOTNOTE)
+
+class IndexedParagraph(NamedTuple):
+    """One entry of a paragraph offset index, with its Markdown text."""
+    number: int     # Position in the index (document order, footnotes last)
+    kind: str       # One of the BLOCK_* types
+    text: str       # The Markdown line, e.g. "# I. BACKGROUND" or "[^1]: ..."
+    page: int       # 1-based PDF page the paragraph starts on
+    heading: str    # Heading path, " > "-joined ("Footnotes > n" for footnotes)
+    offset: int     # Byte offset in the .md file
+    length: int     # Byte length in the .md file
+
+def paragraph_index_path(md_path: Path) -> Path:
+    """Sidecar path of the paragraph offset index for a .md file."""
+    md_path = Path(md_path)
+    return md_path.with_name(md_path.stem + PARAGRAPH_INDEX_SUFFIX)
+
+def _find_block_line(data: bytes, block: Block, pos: int) -> Tuple[int, int]:
+    """
+    Locate the Markdown line of a block at or after byte pos.
+    
+    Every paragraph is a single line of the Markdown, and blocks come in
+    the same order, so a forward search finds each one.
+    
+    Returns:
+        (start, end) byte offsets of the line, or (-1, -1)
+    """
+    text = block.text.encode("utf-8")
+    if block.type == BLOCK_FOOTNOTE:
+        text = f"[^{block.footnote}]: ".encode("utf-8") + text
+    while True:
+        found = data.find(text, pos)
+        if found < 0:
+            return -1, -1
+        start = data.rfind(b"\n", 0, found) + 1
+        end = found + len(text)
+        # The match must be the whole line, after the marks for a heading
+        if end == len(data) or data[end] == 0x0A:
+            prefix = data[start:found]
+            if block.type != BLOCK_HEADING:
+                if not prefix:
+                    return start, end
+            elif prefix.startswith(b"#") and prefix.endswith(b" ") and not prefix.strip(b"# "):
+                return start, end
+        pos = found + 1
+
+def write_paragraph_index(md: str, blocks: List[Block], md_path: Path) -> Path:
+    """
+    Write the paragraph offset index for a converted document.
+    
+    Args:
+        md: The Markdown exactly as written to md_path
+        blocks: The document's Blocks, from the same conversion
+        md_path: The .md file the offsets refer to
+    
+    Returns:
+        Path of the index file
+    """
+    data = md.encode("utf-8")
+    paths: Dict[str, int] = {"": 0}
+    headings: List[Tuple[int, str]] = []
+    entries = []
+    body_count = 0
+    pos = 0
+    for block in blocks:
+        start, end = _find_block_line(data, block, pos)
+        if start < 0:
+            raise ValueError(f"Block not found in {md_path}: {block.text[:60]!r}")
+        pos = end
+        
+        if block.type == BLOCK_FOOTNOTE:
+            path = f"Footnotes > {block.footnote}"
+        else:
+            body_count += 1
+            if block.type == BLOCK_HEADING:
+                while headings and headings[-1][0] >= block.level:
+                    headings.pop()
+                headings.append((block.level, block.text))
+            path = " > ".join(t for _, t in headings)
+        path_no = paths.setdefault(path, len(paths))
+        entries.append(_PARAGRAPH_INDEX_ENTRY.pack(start, end - start, block.page, path_no,
+                                                   _PARAGRAPH_KINDS.index(block.type)))
+    
+    path_texts = [p.encode("utf-8") for p in paths]
+    path_offsets = [0]
+    for t in path_texts:
+        path_offsets.append(path_offsets[-1] + len(t))
+    
+    index_path = paragraph_index_path(md_path)
+    tmp = index_path.with_name(f".{index_path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_PARAGRAPH_INDEX_HEADER.pack(PARAGRAPH_INDEX_MAGIC, len(data), len(entries), body_count,
+                                             len(path_texts)))
+        f.write(b"".join(entries))
+        f.write(struct.pack(f"<{len(path_offsets)}I", *path_offsets))
+        f.write(b"".join(path_texts))
+    os.replace(tmp, index_path)
+    return index_path
+
+class ParagraphIndex:
+    """
+    Random access to the paragraphs of a converted .md file.
+    
+    Both the .md file and its .paraidx sidecar are memory-mapped; reading a
+    paragraph touches only its index entry and its bytes in the Markdown.
+    Use as a context manager, or call close().
+    """
+
+    def __init__(self, md_path: Path):
+        self.md_path = Path(md_path)
+        self.index_path = paragraph_index_path(self.md_path)
+        with open(self.index_path, "rb") as f:
+            self._idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._md = None
+        try:
+            magic, md_size, self._count, self.body_count, path_count = \
+                _PARAGRAPH_INDEX_HEADER.unpack_from(self._idx, 0)
+            if magic != PARAGRAPH_INDEX_MAGIC:
+                raise ValueError(f"Not a paragraph index: {self.index_path}")
+            if self.md_path.stat().st_size != md_size:
+                raise ValueError(f"Paragraph index is stale: {self.index_path}")
+            self._entries = _PARAGRAPH_INDEX_HEADER.size
+            paths = self._entries + self._count * _PARAGRAPH_INDEX_ENTRY.size
+            self._path_offsets = struct.unpack_from(f"<{path_count + 1}I", self._idx, paths)
+            self._path_text = paths + 4 * (path_count + 1)
+            if md_size:
+                with open(self.md_path, "rb") as f:
+                    self._md = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._md is not None:
+            self._md.close()
+        self._idx.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, number: int) -> Tuple[int, int, int, int, int]:
+        return _PARAGRAPH_INDEX_ENTRY.unpack_from(self._idx, self._entries + number * _PARAGRAPH_INDEX_ENTRY.size)
+
+    def _page(self, number: int) -> int:
+        return self._entry(number)[2]
+
+    def __getitem__(self, number: int) -> IndexedParagraph:
+        if number < 0:
+            number += self._count
+        if not 0 <= number < self._count:
+            raise IndexError("paragraph number out of range")
+        offset, length, page, path_no, kind = self._entry(number)
+        start, end = self._path_offsets[path_no], self._path_offsets[path_no + 1]
+        heading = self._idx[self._path_text + start:self._path_text + end].decode("utf-8")
+        text = self._md[offset:offset + length].decode("utf-8")
+        return IndexedParagraph(number, _PARAGRAPH_KINDS[kind], text, page, heading, offset, length)
+
+    def pages(self, first: int, last: Optional[int] = None, footnotes: bool = False) -> List[IndexedParagraph]:
+        """
+        Paragraphs starting on PDF pages first..last (inclusive).
+        
+        Body entries are found by binary search on their page numbers; with
+        footnotes, the footnotes defined on those pages are added after them.
+        """
+        last = first if last is None else last
+        lo = bisect.bisect_left(range(self.body_count), first, key=self._page)
+        hi = bisect.bisect_right(range(self.body_count), last, key=self._page)
+        found = [self[i] for i in range(lo, hi)]
+        if footnotes:
+            found += [self[i] for i in range(self.body_count, self._count) if first <= self._page(i) <= last]
+        return found
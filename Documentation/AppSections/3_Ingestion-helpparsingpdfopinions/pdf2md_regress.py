@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Corpus regression gate for the Michigan Court PDF to Markdown converter.
+
+Runs two versions of the converter over the same PDFs and compares them:
+the Markdown and metadata of every document, and the p50/p95/max
+conversion time and peak memory of each version. The run fails when more
+documents changed, or the new version is slower or larger, than the
+configured thresholds allow.
+
+A version is a git revision (HEAD~1, main, a tag) or a directory holding
+a pdf2md_core.py and its court_profiles/ ("." is the working tree), so
+rule edits can be checked before they are committed. Each version runs in
+its own worker process and the two take turns on every document, so
+background load affects both alike.
+
+Usage:
+    python pdf2md_regress.py <base> <new> <corpus_dir> [--max-changed N|P%]
+                             [--max-slowdown RATIO] [--max-memory RATIO]
+                             [--repeat N] [--limit N] [--keep DIR] [--json FILE]
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import difflib
+import tarfile
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+# ===============================================
+# GATE SETTINGS
+# ===============================================
+
+DEFAULT_MAX_CHANGED = "0"       # Documents whose output may change (count or "P%")
+DEFAULT_MAX_SLOWDOWN = 1.25     # new / base p50 and p95 conversion time
+DEFAULT_MAX_MEMORY = 1.25       # new / base maximum peak RSS
+SLOWDOWN_MIN_SECONDS = 0.01     # Smaller p50/p95 increases are noise, never a regression
+MEMORY_MIN_BYTES = 8 << 20      # Smaller peak RSS increases are noise, never a regression
+IGNORED_META_KEYS = ("stats",)  # Per-run measurements, not output
+MAX_LISTED_CHANGES = 20         # Changed documents printed in the report
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+# ===============================================
+# CONVERTER VERSIONS
+# ===============================================
+
+def _git(*args: str) -> str:
+    result = subprocess.run(["git", "-C", str(SCRIPT_DIR), *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ValueError(result.stderr.strip() or f"git {' '.join(args)} failed")
+    return result.stdout.strip()
+
+def checkout_version(spec: str, dest: Path) -> Tuple[Path, str]:
+    """
+    Resolve a converter version to a directory holding its pdf2md_core.py.
+
+    Args:
+        spec: Directory with a pdf2md_core.py (used in place), or a git
+            revision of this repository (its converter directory is
+            exported to dest)
+        dest: Empty directory for the exported revision
+
+    Returns:
+        Tuple of (converter_directory, label for reports)
+    """
+    path = Path(spec)
+    if (path / "pdf2md_core.py").is_file():
+        return path.resolve(), str(path)
+
+    try:
+        commit = _git("rev-parse", "--short", "--verify", f"{spec}^{{commit}}")
+        prefix = _git("rev-parse", "--show-prefix")
+        top = _git("rev-parse", "--show-toplevel")
+        archive = subprocess.run(["git", "-C", top, "archive", "--format=tar", f"{commit}:{prefix}"],
+                                 capture_output=True, check=True).stdout
+    except (ValueError, OSError, subprocess.CalledProcessError):
+        raise ValueError(f"Not a converter directory or git revision: {spec}")
+
+    shutil.rmtree(dest, ignore_errors=True)
+    dest.mkdir(parents=True)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(dest)
+    if not (dest / "pdf2md_core.py").is_file():
+        raise ValueError(f"Revision {spec} has no pdf2md_core.py")
+    return dest, f"{spec} ({commit})" if spec != commit else commit
+
+# ===============================================
+# WORKER PROCESS
+# ===============================================
+# A worker imports one version's pdf2md_core and converts the PDF paths it
+# reads from stdin one at a time, answering each with a JSON line. Only
+# convert_pdf_to_markdown(pdf_path, output_dir) is used, which every
+# version of the converter has.
+
+def _reset_peak_rss() -> None:
+    """Restart this process's peak RSS count (Linux 4.0+; no-op elsewhere)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def _peak_rss() -> Optional[int]:
+    """Peak resident set size of this process in bytes since the last reset."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+def _worker_main(version_dir: str, output_dir: str) -> None:
+    """Worker loop: convert each PDF path read from stdin into output_dir."""
+    sys.path.insert(0, version_dir)
+    protocol = sys.stdout
+    sys.stdout = sys.stderr  # Keep the converter's own prints off the protocol stream
+    import pdf2md_core
+    # Versions that cache court profiles would otherwise write into their
+    # checkout or share the user's cache file with the other version
+    if hasattr(pdf2md_core, "COURT_PROFILE_CACHE"):
+        pdf2md_core.COURT_PROFILE_CACHE = Path(output_dir) / ".court_profiles.json"
+
+    for line in sys.stdin:
+        pdf_path, repeat = json.loads(line)
+        captured = io.StringIO()
+        seconds, peak, ok = float("inf"), 0, False
+        sys.stdout = captured
+        try:
+            for _ in range(repeat):
+                _reset_peak_rss()
+                start = time.perf_counter()
+                ok = pdf2md_core.convert_pdf_to_markdown(Path(pdf_path), Path(output_dir))[0]
+                seconds = min(seconds, time.perf_counter() - start)
+                peak = max(peak, _peak_rss() or 0)
+        except Exception as e:
+            print(f"ERROR: {e}")
+        finally:
+            sys.stdout = sys.stderr
+        error = None if ok else (captured.getvalue().strip() or "conversion failed")
+        seconds = None if seconds == float("inf") else seconds
+        protocol.write(json.dumps({"seconds": seconds, "peak_rss": peak or None, "error": error}) + "\n")
+        protocol.flush()
+
+class _Worker:
+    """Parent-side handle of a worker process for one converter version."""
+
+    def __init__(self, version_dir: Path, output_dir: Path):
+        self.version_dir = version_dir
+        self.output_dir = output_dir
+        self._proc: Optional[subprocess.Popen] = None
+
+    def _start(self) -> subprocess.Popen:
+        env = dict(os.environ, PYTHONWARNINGS="ignore")
+        return subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "--worker", str(self.version_dir), str(self.output_dir)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, cwd=str(self.version_dir), env=env,
+        )
+
+    def convert(self, pdf_path: Path, repeat: int = 1) -> dict:
+        """Convert one PDF; a worker that dies is restarted for the next one."""
+        if self._proc is None:
+            self._proc = self._start()
+        try:
+            self._proc.stdin.write(json.dumps([str(pdf_path.resolve()), repeat]) + "\n")
+            self._proc.stdin.flush()
+            reply = self._proc.stdout.readline()
+        except (BrokenPipeError, OSError):
+            reply = ""
+        if reply:
+            return json.loads(reply)
+        self._proc.kill()
+        code = self._proc.wait()
+        self._proc = None
+        return {"seconds": None, "peak_rss": None, "error": f"worker exited with code {code}"}
+
+    def close(self) -> None:
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.wait()
+            self._proc = None
+
+# ===============================================
+# OUTPUT COMPARISON
+# ===============================================
+
+class DocumentResult(NamedTuple):
+    """Comparison of one document between the base and new versions."""
+    name: str
+    base: dict                      # Worker reply: seconds, peak_rss, error
+    new: dict
+    md_lines_changed: int           # Added plus removed Markdown lines
+    meta_keys_changed: List[str]    # Metadata keys whose values differ
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.md_lines_changed or self.meta_keys_changed
+                    or (self.base["error"] is None) != (self.new["error"] is None))
+
+def _read_outputs(output_dir: Path, stem: str) -> Tuple[Optional[str], Optional[dict]]:
+    md_path = output_dir / (stem + ".md")
+    meta_path = output_dir / (stem + ".meta.json")
+    md = md_path.read_text(encoding="utf-8") if md_path.exists() else None
+    meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else None
+    return md, meta
+
+def diff_outputs(base_dir: Path, new_dir: Path, stem: str,
+                 diff_dir: Optional[Path] = None) -> Tuple[int, List[str]]:
+    """
+    Compare one document's .md and .meta.json between two output directories.
+
+    Args:
+        base_dir: Output directory of the base version
+        new_dir: Output directory of the new version
+        stem: Document name without extension
+        diff_dir: Also write a unified diff <stem>.diff here if anything changed
+
+    Returns:
+        Tuple of (Markdown lines added plus removed, sorted changed metadata keys)
+    """
+    base_md, base_meta = _read_outputs(base_dir, stem)
+    new_md, new_meta = _read_outputs(new_dir, stem)
+
+    lines_changed = 0
+    diff: List[str] = []
+    if base_md != new_md:
+        diff = list(difflib.unified_diff((base_md or "").splitlines(), (new_md or "").splitlines(),
+                                         f"base/{stem}.md", f"new/{stem}.md", lineterm=""))
+        lines_changed = sum(1 for ln in diff[2:] if ln[:1] in "+-")
+
+    base_meta, new_meta = base_meta or {}, new_meta or {}
+    keys = sorted(k for k in set(base_meta) | set(new_meta)
+                  if k not in IGNORED_META_KEYS and base_meta.get(k) != new_meta.get(k))
+    for k in keys:
+        diff.append(f"meta {k}: {json.dumps(base_meta.get(k))} -> {json.dumps(new_meta.get(k))}")
+
+    if diff and diff_dir is not None:
+        diff_dir.mkdir(parents=True, exist_ok=True)
+        (diff_dir / (stem + ".diff")).write_text("\n".join(diff) + "\n", encoding="utf-8")
+    return lines_changed, keys
+
+# ===============================================
+# REGRESSION RUN
+# ===============================================
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0-100) of values; None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+def _summarize(replies: List[dict]) -> dict:
+    seconds = [r["seconds"] for r in replies]
+    peaks = [r["peak_rss"] for r in replies if r["peak_rss"]]
+    return {
+        "documents": len(replies),
+        "total_seconds": sum(seconds),
+        "p50_seconds": percentile(seconds, 50),
+        "p95_seconds": percentile(seconds, 95),
+        "max_seconds": max(seconds, default=None),
+        "p50_peak_rss": percentile(peaks, 50),
+        "max_peak_rss": max(peaks, default=None),
+    }
+
+def run_regression(base: str, new: str, pdfs: List[Path], work_dir: Path,
+                   repeat: int = 1, progress: bool = False) -> dict:
+    """
+    Convert every PDF with both versions and compare outputs and timings.
+
+    Args:
+        base: Base version (git revision or converter directory)
+        new: New version (git revision or converter directory)
+        pdfs: Corpus to convert
+        work_dir: Directory for exported revisions, outputs and diffs
+        repeat: Convert each document this many times and keep the fastest
+        progress: Print one line per document
+
+    Returns:
+        Report dict with "base", "new", "documents" and per-version "summary"
+    """
+    work_dir = work_dir.resolve()
+    for stale in ("output", "diffs"):
+        shutil.rmtree(work_dir / stale, ignore_errors=True)
+    versions = {}
+    workers = {}
+    for side, spec in (("base", base), ("new", new)):
+        version_dir, label = checkout_version(spec, work_dir / "versions" / side)
+        versions[side] = label
+        workers[side] = _Worker(version_dir, work_dir / "output" / side)
+        workers[side].output_dir.mkdir(parents=True)
+
+    documents: List[DocumentResult] = []
+    try:
+        for i, pdf in enumerate(pdfs):
+            # Alternate which version goes first so neither always runs on a warm cache
+            order = ("base", "new") if i % 2 == 0 else ("new", "base")
+            replies = {side: workers[side].convert(pdf, repeat) for side in order}
+            lines, keys = diff_outputs(workers["base"].output_dir, workers["new"].output_dir,
+                                       pdf.stem, work_dir / "diffs")
+            doc = DocumentResult(pdf.name, replies["base"], replies["new"], lines, keys)
+            documents.append(doc)
+            if progress:
+                status = "CHANGED" if doc.changed else "same"
+                print(f"[{i + 1}/{len(pdfs)}] {pdf.name}: {status}"
+                      f" ({_fmt_seconds(doc.base['seconds'])} -> {_fmt_seconds(doc.new['seconds'])})")
+    finally:
+        for worker in workers.values():
+            worker.close()
+
+    # Timings compare only documents both versions converted
+    timed = [d for d in documents if d.base["error"] is None and d.new["error"] is None]
+    return {
+        "base": versions["base"],
+        "new": versions["new"],
+        "documents": [d._asdict() for d in documents],
+        "changed": [d.name for d in documents if d.changed],
+        "summary": {side: _summarize([getattr(d, side) for d in timed]) for side in ("base", "new")},
+    }
+
+def _parse_max_changed(limit: str, total: int) -> int:
+    if limit.endswith("%"):
+        return int(total * float(limit[:-1]) / 100)
+    return int(limit)
+
+def check_gate(report: dict, max_changed: str = DEFAULT_MAX_CHANGED,
+               max_slowdown: float = DEFAULT_MAX_SLOWDOWN,
+               max_memory: float = DEFAULT_MAX_MEMORY) -> List[str]:
+    """
+    Check a run_regression report against the thresholds.
+
+    Args:
+        report: Result of run_regression
+        max_changed: Documents allowed to change, as a count or "P%" of the corpus
+        max_slowdown: Largest allowed new/base ratio of p50 and p95 time
+        max_memory: Largest allowed new/base ratio of the maximum peak RSS
+
+    Returns:
+        List of failure descriptions (empty if the gate passes)
+    """
+    failures = []
+    allowed = _parse_max_changed(max_changed, len(report["documents"]))
+    changed = len(report["changed"])
+    if changed > allowed:
+        failures.append(f"{changed} document(s) changed output (allowed: {allowed})")
+
+    base, new = report["summary"]["base"], report["summary"]["new"]
+    for stat in ("p50_seconds", "p95_seconds"):
+        before, after = base[stat], new[stat]
+        if before and after and after / before > max_slowdown and after - before > SLOWDOWN_MIN_SECONDS:
+            failures.append(f"{stat[:3]} time {_fmt_seconds(before)} -> {_fmt_seconds(after)} "
+                            f"({after / before:.2f}x, allowed {max_slowdown:.2f}x)")
+    before, after = base["max_peak_rss"], new["max_peak_rss"]
+    if before and after and after / before > max_memory and after - before > MEMORY_MIN_BYTES:
+        failures.append(f"peak memory {_fmt_bytes(before)} -> {_fmt_bytes(after)} "
+                        f"({after / before:.2f}x, allowed {max_memory:.2f}x)")
+    return failures
+
+# ===============================================
+# REPORT
+# ===============================================
+
+def _fmt_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}ms"
+
+def _fmt_bytes(value: Optional[int]) -> str:
+    return "-" if value is None else f"{value / (1 << 20):.1f}MB"
+
+def print_report(report: dict) -> None:
+    """Print the per-version summary and the changed documents."""
+    base, new = report["summary"]["base"], report["summary"]["new"]
+    print(f"base: {report['base']}")
+    print(f"new:  {report['new']}")
+    print(f"\n{'':14s} {'base':>12s} {'new':>12s} {'ratio':>7s}")
+    for stat, fmt in (("p50_seconds", _fmt_seconds), ("p95_seconds", _fmt_seconds),
+                      ("max_seconds", _fmt_seconds), ("total_seconds", _fmt_seconds),
+                      ("p50_peak_rss", _fmt_bytes), ("max_peak_rss", _fmt_bytes)):
+        before, after = base[stat], new[stat]
+        ratio = f"{after / before:7.2f}" if before and after else f"{'-':>7s}"
+        print(f"{stat:14s} {fmt(before):>12s} {fmt(after):>12s} {ratio}")
+
+    changed = [d for d in report["documents"] if d["name"] in set(report["changed"])]
+    print(f"\n{len(changed)} of {len(report['documents'])} document(s) changed")
+    for d in changed[:MAX_LISTED_CHANGES]:
+        details = []
+        if d["md_lines_changed"]:
+            details.append(f"{d['md_lines_changed']} Markdown line(s)")
+        if d["meta_keys_changed"]:
+            details.append("meta " + ", ".join(d["meta_keys_changed"]))
+        for side in ("base", "new"):
+            if d[side]["error"]:
+                details.append(f"{side} failed: {d[side]['error'].splitlines()[0]}")
+        print(f"  {d['name']}: {'; '.join(details)}")
+    if len(changed) > MAX_LISTED_CHANGES:
+        print(f"  ... and {len(changed) - MAX_LISTED_CHANGES} more")
+
+# ===============================================
+# COMMAND LINE INTERFACE
+# ===============================================
+
+def main():
+    """Command line entry point."""
+    if len(sys.argv) == 4 and sys.argv[1] == "--worker":
+        _worker_main(sys.argv[2], sys.argv[3])
+        return
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare two converter versions over a corpus of PDFs")
+    parser.add_argument('base', help='Base version: git revision or directory with pdf2md_core.py')
+    parser.add_argument('new', help='New version: git revision or directory with pdf2md_core.py ("." for the working tree)')
+    parser.add_argument('corpus', help='Directory of PDFs')
+    parser.add_argument('--max-changed', default=DEFAULT_MAX_CHANGED,
+                        help='Documents allowed to change output, as a count or percentage such as 1%% (default: 0)')
+    parser.add_argument('--max-slowdown', type=float, default=DEFAULT_MAX_SLOWDOWN,
+                        help=f'Largest allowed new/base p50 and p95 time ratio (default: {DEFAULT_MAX_SLOWDOWN})')
+    parser.add_argument('--max-memory', type=float, default=DEFAULT_MAX_MEMORY,
+                        help=f'Largest allowed new/base peak memory ratio (default: {DEFAULT_MAX_MEMORY})')
+    parser.add_argument('--repeat', type=int, default=1, help='Conversions per document; the fastest is kept')
+    parser.add_argument('--limit', type=int, default=None, help='Only the first N PDFs (sorted by name)')
+    parser.add_argument('--keep', default=None, help='Keep outputs and diffs in this directory')
+    parser.add_argument('--json', default=None, help='Save the full report as JSON')
+    parser.add_argument('--quiet', action='store_true', help='No per-document progress lines')
+    args = parser.parse_args()
+
+    corpus = Path(args.corpus)
+    pdfs = sorted(corpus.glob("*.pdf"))[:args.limit]
+    if not pdfs:
+        print(f"ERROR: No PDF files found in: {corpus}")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = Path(args.keep) if args.keep else Path(temp_dir)
+        try:
+            report = run_regression(args.base, args.new, pdfs, work_dir, args.repeat, not args.quiet)
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+
+    print()
+    print_report(report)
+    failures = check_gate(report, args.max_changed, args.max_slowdown, args.max_memory)
+    report["failures"] = failures
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if args.keep:
+        print(f"\nOutputs in {Path(args.keep) / 'output'}, diffs in {Path(args.keep) / 'diffs'}")
+
+    print()
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"SUCCESS: {len(pdfs)} document(s) within thresholds")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+"""
+Full-text search and citation index for the Michigan Court PDF to Markdown converter.
+
+SearchIndex keeps converted opinions in a SQLite FTS5 index, one row per
+paragraph, with every statute, court rule and reporter citation they
+contain (see extract_citations).
+
+Usage:
+    python pdf2md_core.py search DB <query>
+    python pdf2md_core.py cited-by DB <citation>
+    python pdf2md_core.py cites DB <name or case no>
+    python pdf2md_core.py reindex DB <output_dir> [--workers N]
+"""
+
+import os
+import json
+import hashlib
+import sqlite3
+import concurrent.futures
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import regex
+
+from pdf2md_core import BLOCKS_SUFFIX, BLOCK_PARAGRAPH, PAGE_SEPARATOR, LazyPattern, read_blocks_jsonl
+
+# ===============================================
+# CITATION EXTRACTION
+# ===============================================
+
+# Case reporters: canonical (Michigan style) name -> pattern. Longer names
+# come before their prefixes ("Mich App" before "Mich").
+REPORTERS = {
+    "Mich App": r"Mich\.?\s*App\.?",
+    "Mich": r"Mich\.?",
+    "NW3d": r"N\.?\s?W\.?\s?3d",
+    "NW2d": r"N\.?\s?W\.?\s?2d",
+    "NW": r"N\.?\s?W\.?",
+    "US": r"U\.?\s?S\.?",
+    "S Ct": r"S\.?\s?Ct\.?",
+    "L Ed 2d": r"L\.?\s?Ed\.?\s?2d",
+    "F Supp 3d": r"F\.?\s?Supp\.?\s?3d",
+    "F Supp 2d": r"F\.?\s?Supp\.?\s?2d",
+    "F Supp": r"F\.?\s?Supp\.?",
+    "F4th": r"F\.?\s?4th",
+    "F3d": r"F\.?\s?3d",
+    "F2d": r"F\.?\s?2d",
+}
+
+# (kind, normalized form, pattern). The pattern's groups fill in the
+# normalized form; pinpoint subsections and pages are left out. Patterns
+# should start with a literal where possible (see extract_citations).
+CITATION_PATTERNS = [
+    ("statute", "MCL {0}", r"\bMCL\.?\s+(\d+\.\d+[a-z]?)"),
+    ("statute", "{0} USC {1}", r"(?<=\b(\d{1,2})\s{1,3})U\.?\s?S\.?\s?C\.?\s+(?:§+\s*)?(\d+[a-z]?)"),
+    ("rule", "MCR {0}", r"\bMCR\s+(\d\.\d{3})"),
+    ("rule", "MRE {0}", r"\bMRE\s+(\d{3,4})"),
+    ("reporter", "{0} WL {1}", r"\b((?:19|20)\d\d)\s+WL\s+(\d+)"),
+    ("reporter", "{0} {1} {2}", r"\b(\d{1,4})\s+(%s)\s+(\d{1,5})\b" % "|".join(REPORTERS.values())),
+]
+
+_CITATION_RULES = [(kind, form, LazyPattern(p)) for kind, form, p in CITATION_PATTERNS]
+
+_REPORTER_NAMES = {name.replace(" ", ""): name for name in REPORTERS}
+
+class Citation(NamedTuple):
+    """A citation found by extract_citations."""
+    kind: str       # "statute", "rule" or "reporter"
+    cite: str       # Normalized, e.g. "MCL 750.316", "MCR 2.116", "123 NW2d 45"
+    start: int
+    end: int
+
+def _citation_part(part: str) -> str:
+    """Reporter names to their canonical form; other groups unchanged."""
+    return _REPORTER_NAMES.get(regex.sub(r"[.\s]", "", part), part)
+
+def extract_citations(text: str) -> List[Citation]:
+    """
+    Find statute, court rule and reporter citations in text.
+    
+    Citations are normalized to Michigan style without periods or pinpoints,
+    so "MCL 750.316(1)(a)" gives "MCL 750.316" and "123 N.W.2d 45, 47"
+    gives "123 NW2d 45".
+    
+    Each pattern scans the text on its own and the matches are merged by
+    position. A pattern that starts with a literal ("MCL", "WL", ...) is
+    then found by a fast literal search. One alternation of all patterns
+    would try every pattern at every position, which is about twice as
+    slow on long opinions. Where two matches overlap, the earlier one is kept.
+    
+    Returns:
+        List of Citation in text order
+    """
+    matches = []
+    for kind, form, rx in _CITATION_RULES:
+        for m in rx.finditer(text):
+            # The first group may sit in a lookbehind, before the match itself
+            matches.append((min(m.start(), m.start(1)), m.end(), kind, form, m.groups()))
+    matches.sort(key=lambda x: x[0])
+    
+    found = []
+    end = 0
+    for start, stop, kind, form, parts in matches:
+        if start < end:
+            continue
+        found.append(Citation(kind, form.format(*map(_citation_part, parts)), start, stop))
+        end = stop
+    return found
+
+def count_citations(text: str) -> List[Tuple[str, str, int]]:
+    """
+    Count the distinct citations in text.
+    
+    Returns:
+        List of (cite, kind, count), in order of first appearance
+    """
+    counts: Dict[Tuple[str, str], int] = {}
+    for c in extract_citations(text):
+        counts[(c.cite, c.kind)] = counts.get((c.cite, c.kind), 0) + 1
+    return [(cite, kind, n) for (cite, kind), n in counts.items()]
+
+# ===============================================
+# FULL-TEXT SEARCH INDEX
+# ===============================================
+
+# Metadata stored with every indexed document
+INDEX_META_FIELDS = ("case_name", "case_no", "date", "judges", "publication", "lower_court")
+
+# Bump when the index gains tables or columns, or its rows are derived
+# differently; documents indexed by an older version are re-indexed on
+# their next update
+INDEX_SCHEMA_VERSION = 3
+
+_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    doc_hash TEXT NOT NULL,
+    case_name TEXT, case_no TEXT, date TEXT, judges TEXT, publication TEXT, lower_court TEXT
+);
+CREATE TABLE IF NOT EXISTS paragraphs (
+    id INTEGER PRIMARY KEY,
+    doc_id TEXT NOT NULL,
+    para_no INTEGER NOT NULL,
+    page INTEGER,
+    heading TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS paragraphs_doc ON paragraphs(doc_id);
+CREATE INDEX IF NOT EXISTS documents_case_no ON documents(case_no);
+CREATE VIRTUAL TABLE IF NOT EXISTS paragraphs_fts USING fts5(
+    text, heading, content='paragraphs', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS citations (
+    doc_id TEXT NOT NULL,
+    cite TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (doc_id, cite)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS citations_cite ON citations(cite);
+"""
+
+_FOOTNOTE_LINE_RE = LazyPattern(r"^\[\^(\d+)\]:\s*(.*)$")
+
+class SearchHit(NamedTuple):
+    """One paragraph matched by SearchIndex.search."""
+    doc_id: str
+    case_no: Optional[str]
+    case_name: Optional[str]
+    date: Optional[str]
+    judges: Optional[str]
+    heading: str            # Heading path, e.g. "I. BACKGROUND > A. Procedural History"
+    page: Optional[int]     # None for footnotes
+    text: str
+    snippet: str            # Matched terms marked with [ ]
+    score: float            # bm25 rank; lower is a better match
+
+def iter_markdown_paragraphs(md: str, pages: Optional[List[int]] = None) -> Iterator[Tuple[Optional[int], str, str]]:
+    """
+    Split converted Markdown into searchable paragraphs.
+
+    Footnote definitions get the heading "Footnotes > n" and no page.
+
+    Args:
+        md: Converted Markdown
+        pages: PDF page of each body paragraph, from the same conversion
+            (paragraph_pages). Without it, pages are counted from the
+            PAGE_SEPARATOR lines starting at 1, which is off wherever blank
+            pages or pages before the body start were dropped.
+
+    Yields:
+        (page, heading_path, text) for each body paragraph and footnote
+    """
+    page: Optional[int] = 1
+    body_count = 0
+    headings: List[Tuple[int, str]] = []
+    for line in md.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line == PAGE_SEPARATOR:
+            page += 1
+            continue
+        if line == "---":
+            # Start of the footnotes section
+            page = None
+            headings = []
+            continue
+        if line.startswith("#"):
+            marks, _, title = line.partition(" ")
+            if marks == "#" * len(marks) and title:
+                level = len(marks)
+                while headings and headings[-1][0] >= level:
+                    headings.pop()
+                headings.append((level, title))
+                continue
+        if page is None:
+            m = _FOOTNOTE_LINE_RE.match(line)
+            if m:
+                yield None, f"Footnotes > {m.group(1)}", m.group(2)
+                continue
+        if pages is not None and body_count < len(pages):
+            yield pages[body_count], " > ".join(t for _, t in headings), line
+        else:
+            yield page, " > ".join(t for _, t in headings), line
+        body_count += 1
+
+class _IndexEntry(NamedTuple):
+    """One document's rows, prepared for SearchIndex (possibly in a worker)."""
+    doc_id: str
+    doc_hash: str
+    meta: Tuple[Optional[str], ...]                     # INDEX_META_FIELDS values
+    paragraphs: List[Tuple[Optional[int], str, str]]    # (page, heading, text)
+    citations: List[Tuple[str, str, int]]               # (cite, kind, count)
+
+def document_hash(md: str, meta: dict) -> str:
+    """
+    SHA-256 of a conversion result, as used to key the search index.
+
+    Conversion stats are left out, so re-converting with --stats does not
+    count as a change.
+    """
+    meta = {k: v for k, v in meta.items() if k != "stats"}
+    h = hashlib.sha256(md.encode("utf-8"))
+    h.update(b"\0")
+    h.update(json.dumps(meta, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+def _prepare_index_entry(doc_id: str, md: str, meta: dict, known_hash: Optional[str] = None,
+                         pages: Optional[List[int]] = None) -> Optional[_IndexEntry]:
+    """Parse a document into index rows, or return None if its hash is known_hash."""
+    doc_hash = document_hash(md, meta)
+    if doc_hash == known_hash:
+        return None
+    return _IndexEntry(doc_id, doc_hash, tuple(meta.get(k) for k in INDEX_META_FIELDS),
+                       list(iter_markdown_paragraphs(md, pages)), count_citations(md))
+
+def _read_output_files(md_path: Path, meta_path: Optional[Path] = None) -> Tuple[str, dict]:
+    """Read a <stem>.md file and its .meta.json sidecar ({} if missing)."""
+    md_path = Path(md_path)
+    if meta_path is None:
+        meta_path = md_path.with_name(md_path.stem + ".meta.json")
+    try:
+        meta = json.loads(Path(meta_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        meta = {}
+    return md_path.read_text(encoding="utf-8"), meta
+
+def _sidecar_paragraph_pages(md_path: Path) -> Optional[List[int]]:
+    """Paragraph pages from the <stem>.blocks.jsonl next to a .md file, if there is one."""
+    blocks_path = Path(md_path).with_name(Path(md_path).stem + BLOCKS_SUFFIX)
+    try:
+        return [r["sourceRef"]["page"] for r in read_blocks_jsonl(blocks_path) if r["type"] == BLOCK_PARAGRAPH]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _prepare_index_file(job: Tuple[Path, Optional[str]]) -> Optional[_IndexEntry]:
+    """Worker side of SearchIndex.add_directory: (md_path, known_hash) -> entry."""
+    md_path, known_hash = job
+    md, meta = _read_output_files(md_path)
+    return _prepare_index_entry(md_path.stem, md, meta, known_hash, _sidecar_paragraph_pages(md_path))
+
+class SearchIndex:
+    """
+    Paragraph-level full-text and citation index of converted opinions (SQLite).
+
+    Each paragraph is stored with its heading path and page, and its
+    document's case number, name, date and judges, in an FTS5 table. The
+    citations each document makes (see extract_citations) are stored too,
+    and can be looked up from either side: cited_by and citations_of.
+    Documents are keyed by
+    their output stem and a hash of their Markdown and metadata: adding an
+    unchanged document is a no-op, and a changed one only rewrites its own
+    rows. Use a single SearchIndex (one writer) per database; run_batch
+    indexes results in the parent process for that reason.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_INDEX_SCHEMA)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < INDEX_SCHEMA_VERSION:
+            with self.conn:
+                self.conn.execute("UPDATE documents SET doc_hash = ''")
+                self.conn.execute(f"PRAGMA user_version = {INDEX_SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _delete_rows(self, doc_id: str) -> None:
+        # External-content FTS5 tables need the old values to delete a row
+        self.conn.execute(
+            "INSERT INTO paragraphs_fts(paragraphs_fts, rowid, text, heading) "
+            "SELECT 'delete', id, text, heading FROM paragraphs WHERE doc_id = ?", (doc_id,))
+        self.conn.execute("DELETE FROM paragraphs WHERE doc_id = ?", (doc_id,))
+        self.conn.execute("DELETE FROM citations WHERE doc_id = ?", (doc_id,))
+
+    def _known_hash(self, doc_id: str) -> Optional[str]:
+        row = self.conn.execute("SELECT doc_hash FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _write_entry(self, entry: _IndexEntry) -> None:
+        doc_id = entry.doc_id
+        with self.conn:
+            self._delete_rows(doc_id)
+            self.conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (doc_id, entry.doc_hash, *entry.meta))
+            self.conn.executemany(
+                "INSERT INTO paragraphs (doc_id, para_no, page, heading, text) VALUES (?, ?, ?, ?, ?)",
+                ((doc_id, i, page, heading, text) for i, (page, heading, text) in enumerate(entry.paragraphs)))
+            self.conn.execute(
+                "INSERT INTO paragraphs_fts(rowid, text, heading) "
+                "SELECT id, text, heading FROM paragraphs WHERE doc_id = ?", (doc_id,))
+            self.conn.executemany("INSERT INTO citations VALUES (?, ?, ?, ?)",
+                                  ((doc_id, *c) for c in entry.citations))
+
+    def add_document(self, doc_id: str, md: str, meta: dict, pages: Optional[List[int]] = None) -> bool:
+        """
+        Index (or re-index) one converted document.
+
+        Args:
+            doc_id: Document key, normally the output file stem
+            md: Markdown as written by write_markdown_files
+            meta: Metadata dictionary
+            pages: PDF page of each body paragraph (paragraph_pages of the
+                conversion's Blocks); see iter_markdown_paragraphs
+
+        Returns:
+            True if the index was updated, False if the document was unchanged
+        """
+        entry = _prepare_index_entry(doc_id, md, meta, self._known_hash(doc_id), pages)
+        if entry is None:
+            return False
+        self._write_entry(entry)
+        return True
+
+    def add_files(self, md_path: Path, meta_path: Optional[Path] = None,
+                  pages: Optional[List[int]] = None) -> bool:
+        """
+        Index a <stem>.md file and its .meta.json sidecar (if present).
+
+        Paragraph pages are taken from pages, else from a <stem>.blocks.jsonl
+        next to the .md, else counted from the page separators.
+
+        Returns:
+            True if the index was updated, False if the document was unchanged
+        """
+        md, meta = _read_output_files(md_path, meta_path)
+        if pages is None:
+            pages = _sidecar_paragraph_pages(md_path)
+        return self.add_document(Path(md_path).stem, md, meta, pages)
+
+    def add_directory(self, output_dir: Path, workers: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Bring the index up to date with every <stem>.md in a directory.
+
+        Files are read, hashed and parsed (paragraphs and citations) in a
+        pool of worker processes. Paragraph pages come from each file's
+        .blocks.jsonl where there is one. Only changed documents come back, and
+        they are written from this process.
+
+        Args:
+            output_dir: Directory of converted output
+            workers: Number of worker processes (default: CPU count; 1 runs in-process)
+
+        Returns:
+            Tuple of (documents updated, documents unchanged)
+        """
+        md_paths = sorted(Path(output_dir).glob("*.md"))
+        if not md_paths:
+            return 0, 0
+        known = dict(self.conn.execute("SELECT doc_id, doc_hash FROM documents"))
+        jobs = [(p, known.get(p.stem)) for p in md_paths]
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+
+        updated = unchanged = 0
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            if pool is not None:
+                entries = pool.map(_prepare_index_file, jobs, chunksize=16)
+            else:
+                entries = map(_prepare_index_file, jobs)
+            for entry in entries:
+                if entry is None:
+                    unchanged += 1
+                else:
+                    self._write_entry(entry)
+                    updated += 1
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        return updated, unchanged
+
+    def remove_document(self, doc_id: str) -> bool:
+        """Drop a document and its paragraphs. Returns False if it was not indexed."""
+        with self.conn:
+            self._delete_rows(doc_id)
+            cur = self.conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        return cur.rowcount > 0
+
+    def document_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def cited_by(self, citation: str) -> List[Tuple[str, Optional[str], Optional[str], int]]:
+        """
+        Documents that cite a statute, court rule or reporter citation.
+
+        The citation is normalized as by extract_citations, so
+        "MCL 750.316(1)(a)" finds the documents citing "MCL 750.316".
+
+        Returns:
+            List of (doc_id, case_no, case_name, times_cited), most citations first
+        """
+        found = extract_citations(citation)
+        cite = found[0].cite if found else citation.strip()
+        return self.conn.execute(
+            "SELECT c.doc_id, d.case_no, d.case_name, c.count FROM citations c "
+            "JOIN documents d ON d.doc_id = c.doc_id WHERE c.cite = ? "
+            "ORDER BY c.count DESC, c.doc_id", (cite,)).fetchall()
+
+    def citations_of(self, doc: str) -> List[Tuple[str, str, int]]:
+        """
+        Everything a document cites.
+
+        Args:
+            doc: Document id (output stem) or case number
+
+        Returns:
+            List of (kind, cite, times_cited), by kind and citation
+        """
+        return self.conn.execute(
+            "SELECT c.kind, c.cite, SUM(c.count) FROM citations c "
+            "JOIN documents d ON d.doc_id = c.doc_id WHERE d.doc_id = ? OR d.case_no = ? "
+            "GROUP BY c.kind, c.cite ORDER BY c.kind, c.cite", (doc, doc)).fetchall()
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        case_no: Optional[str] = None,
+        ranked: bool = True
+    ) -> List[SearchHit]:
+        """
+        Find the paragraphs matching an FTS5 query.
+
+        Args:
+            query: FTS5 query, e.g. 'summary disposition', '"summary disposition"'
+                or 'heading:background AND motion'
+            limit: Maximum number of hits
+            case_no: Only search this case number
+            ranked: Best matches first (bm25). Ranking scores every matching
+                paragraph, so a term found in most of a large corpus takes
+                seconds; ranked=False returns the first matches found at
+                once, in index order
+
+        Returns:
+            List of SearchHit
+        """
+        # Rank and limit inside FTS5 first, so only the hits returned are
+        # joined to their paragraph and document rows
+        where = "paragraphs_fts MATCH ?"
+        params: list = [query]
+        if case_no is not None:
+            where += (" AND rowid IN (SELECT p.id FROM documents d JOIN paragraphs p ON p.doc_id = d.doc_id"
+                      " WHERE d.case_no = ?)")
+            params.append(case_no)
+        order = "ORDER BY rank " if ranked else ""
+        sql = ("SELECT d.doc_id, d.case_no, d.case_name, d.date, d.judges, p.heading, p.page, p.text, "
+               "f.snippet, f.score FROM ("
+               "SELECT rowid AS id, snippet(paragraphs_fts, 0, '[', ']', ' ... ', 16) AS snippet, "
+               f"rank AS score FROM paragraphs_fts WHERE {where} {order}LIMIT ?) f "
+               "JOIN paragraphs p ON p.id = f.id "
+               "JOIN documents d ON d.doc_id = p.doc_id")
+        if ranked:
+            sql += " ORDER BY f.score"
+        params.append(limit)
+        return [SearchHit(*row) for row in self.conn.execute(sql, params)]
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Async HTTP service for the Michigan Court PDF to Markdown converter.
+
+Conversions are CPU-bound, so they run in supervised worker processes
+while the event loop only moves bytes. A bounded admission queue rejects
+work it cannot start soon (429) instead of letting requests pile up, and
+every request has a deadline (504): a conversion still running at its
+deadline has its worker killed, so a PDF that hangs MuPDF cannot hold on
+to a worker.
+
+Usage:
+    python pdf2md_service.py [--host H] [--port P] [--workers N]
+                             [--queue N] [--timeout SECONDS] [--cache DIR]
+                             [--memory-limit MB]
+
+Endpoints:
+    POST /convert - Upload PDF (multipart field "file") and get Markdown
+    GET /health   - Liveness, with queue depth and worker usage
+    GET /ready    - Readiness: 200 while new work would be accepted, else 503
+
+Requires aiohttp (pip install aiohttp).
+"""
+
+import os
+import sys
+import asyncio
+import tempfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from pdf2md_core import (convert_pdf, ConversionCache, ScannedPdfError, SupervisedPool,
+                         WorkerDied, WorkerTimeout)
+
+# ===============================================
+# SERVICE LIMITS
+# ===============================================
+
+MAX_UPLOAD_BYTES = 16 * 1024 * 1024   # Same 16MB limit as the Flask example
+UPLOAD_CHUNK_BYTES = 64 * 1024
+DEFAULT_QUEUE_SIZE = 16               # Requests allowed to wait for a worker
+DEFAULT_TIMEOUT = 120.0               # Seconds from admission to response
+RETRY_AFTER_SECONDS = 5
+
+class ServiceBusy(Exception):
+    """The admission queue is full; the client should retry later (HTTP 429)."""
+
+class ServiceUnavailable(Exception):
+    """The pool is not running (starting or shutting down; HTTP 503)."""
+
+# ===============================================
+# PROCESS POOL WITH BOUNDED ADMISSION
+# ===============================================
+
+class _Ticket:
+    """An admitted request; ``started`` once it holds a worker slot."""
+    __slots__ = ("started",)
+
+    def __init__(self):
+        self.started = False
+
+def _convert_job(pdf_path: str, inline_footnotes: bool,
+                 cache: Optional[ConversionCache]) -> Tuple[str, dict]:
+    """Worker process entry point."""
+    return convert_pdf(Path(pdf_path), inline_footnotes=inline_footnotes, cache=cache)
+
+class ConversionPool:
+    """
+    Process pool that admits at most ``workers + max_queue`` requests.
+
+    A request is admitted before its upload is read, so slow or oversized
+    uploads count against the queue and rejected clients never have their
+    body buffered. Admitted requests wait for one of ``workers`` slots,
+    then run in a worker process.
+
+    Workers are a SupervisedPool driven by a supervisor thread. A
+    conversion still running at its request's deadline has its worker
+    killed and replaced, which frees its slot at once, even when the PDF
+    hangs inside MuPDF.
+
+    With a memory_limit (bytes), a worker that grows more than memory_limit
+    past its startup size is killed too, and its address space is capped
+    there (see limit_worker_memory), so a pathological PDF fails with
+    MemoryError instead of growing until the OOM killer steps in.
+    """
+
+    def __init__(self, workers: int = None, max_queue: int = DEFAULT_QUEUE_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT, cache: Optional[ConversionCache] = None,
+                 memory_limit: Optional[int] = None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.cache = cache
+        self.memory_limit = memory_limit
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._executor: Optional[SupervisedPool] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._closing = False
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    @property
+    def accepting(self) -> bool:
+        """True if a new request would be admitted right now."""
+        return (self._executor is not None and not self._closing
+                and self.waiting + self.running < self.capacity)
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and counters for health checks."""
+        return {
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    def start(self):
+        """Start the worker processes (call from the running event loop)."""
+        # Workers are spawned rather than forked: forking a process that is
+        # running an event loop and executor threads can deadlock the child.
+        self._executor = SupervisedPool(self.workers, memory_limit=self.memory_limit,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        threading.Thread(target=self._executor.run, name="conversion-supervisor", daemon=True).start()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._closing = False
+
+    def close(self):
+        """Stop accepting work and kill the workers."""
+        self._closing = True
+        if self._executor is not None:
+            self._executor.close(kill=True)  # The supervisor thread stops the workers and exits
+            self._executor = None
+
+    @contextmanager
+    def admit(self):
+        """
+        Reserve a place in the queue for the duration of a request.
+        
+        Yields:
+            Ticket to pass to convert()
+
+        Raises:
+            ServiceUnavailable: If the pool is not running
+            ServiceBusy: If the queue is full
+        """
+        if self._executor is None or self._closing:
+            raise ServiceUnavailable("conversion pool is not running")
+        if self.waiting + self.running >= self.capacity:
+            self.rejected += 1
+            raise ServiceBusy(f"queue full ({self.capacity} requests in progress)")
+
+        ticket = _Ticket()
+        self.waiting += 1
+        try:
+            yield ticket
+        finally:
+            # Still counted as waiting if it never reached a worker
+            if not ticket.started:
+                self.waiting -= 1
+
+    async def convert(self, ticket: "_Ticket", pdf_path: Path,
+                      inline_footnotes: bool = False) -> Tuple[str, dict]:
+        """
+        Convert an admitted request's PDF in a worker process.
+
+        The deadline covers both the wait for a worker and the conversion;
+        a conversion still running at the deadline has its worker killed.
+
+        Args:
+            ticket: Ticket from admit()
+            pdf_path: PDF file to convert
+            inline_footnotes: Whether to convert footnotes inline
+
+        Raises:
+            asyncio.TimeoutError: If the deadline passes
+            MemoryError: If the conversion went over the memory limit
+            ServiceUnavailable: If the pool shut down or the worker crashed
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+
+        slots = self._slots
+        try:
+            await asyncio.wait_for(slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise
+
+        # Move from the queue to a worker
+        ticket.started = True
+        self.waiting -= 1
+        self.running += 1
+
+        try:
+            if self._executor is None:
+                raise RuntimeError("executor closed")
+            future = asyncio.wrap_future(self._executor.submit(
+                _convert_job, str(pdf_path), inline_footnotes, self.cache,
+                timeout=max(0.0, deadline - loop.time())
+            ))
+        except RuntimeError:
+            # Pool shut down while this request waited for a slot
+            self._job_finished(slots, None)
+            raise ServiceUnavailable("conversion pool is shutting down")
+        # Bound to this pool's semaphore, so a restart cannot inflate the new one
+        future.add_done_callback(lambda f: self._job_finished(slots, f))
+
+        try:
+            # Shielded: a disconnected client must not release the slot of
+            # a conversion that is still running
+            return await asyncio.shield(future)
+        except WorkerTimeout as e:
+            self.timed_out += 1
+            raise asyncio.TimeoutError(str(e)) from e
+        except WorkerDied:
+            # Only this conversion is lost; the pool has already replaced the worker
+            raise ServiceUnavailable("conversion worker crashed")
+
+    def _job_finished(self, slots: asyncio.Semaphore, future):
+        self.running -= 1
+        slots.release()
+        if future is None or future.cancelled():
+            return
+        if future.exception() is None:
+            self.completed += 1
+
+# ===============================================
+# UPLOAD HANDLING
+# ===============================================
+
+class UploadTooLarge(Exception):
+    """The upload exceeded MAX_UPLOAD_BYTES (HTTP 413)."""
+
+async def receive_pdf_upload(request, spool_dir: Optional[str] = None,
+                             max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[Optional[Path], str, Dict[str, str]]:
+    """
+    Stream a multipart upload to a temporary file chunk by chunk.
+
+    The upload is never held in memory in one piece; the size limit is
+    enforced as bytes arrive, so an oversized body is cut off early.
+
+    Args:
+        request: aiohttp request
+        spool_dir: Directory for the temporary file (default: system temp)
+        max_bytes: Upload size limit
+
+    Returns:
+        Tuple of (pdf_path or None, filename, other_form_fields).
+        The caller must delete pdf_path.
+
+    Raises:
+        UploadTooLarge: If the file exceeds max_bytes
+    """
+    if request.content_length is not None and request.content_length > max_bytes + UPLOAD_CHUNK_BYTES:
+        raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+
+    reader = await request.multipart()
+    pdf_path = None
+    filename = ""
+    fields = {}
+
+    try:
+        while True:
+            part = await reader.next()
+            if part is None:
+                break
+
+            if part.name != "file":
+                fields[part.name] = (await part.read_chunk(UPLOAD_CHUNK_BYTES)).decode("utf-8", "replace")
+                continue
+
+            filename = part.filename or ""
+            fd, tmp = tempfile.mkstemp(suffix=".pdf", dir=spool_dir)
+            pdf_path = Path(tmp)
+            size = 0
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = await part.read_chunk(UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+                    f.write(chunk)
+    except BaseException:
+        if pdf_path is not None:
+            pdf_path.unlink(missing_ok=True)
+        raise
+
+    return pdf_path, filename, fields
+
+# ===============================================
+# HTTP APPLICATION
+# ===============================================
+
+def create_app(workers: int = None, max_queue: int = DEFAULT_QUEUE_SIZE,
+               timeout: float = DEFAULT_TIMEOUT, cache_dir: str = None,
+               spool_dir: str = None, max_upload_bytes: int = MAX_UPLOAD_BYTES,
+               memory_limit: Optional[int] = None):
+    """
+    Build the aiohttp application.
+
+    Args:
+        workers: Conversion processes (default: CPU count)
+        max_queue: Requests allowed to wait for a worker before 429
+        timeout: Per-request deadline in seconds (504 when exceeded)
+        cache_dir: Optional conversion cache directory
+        spool_dir: Directory for in-flight uploads (default: system temp)
+        max_upload_bytes: Upload size limit (413 when exceeded)
+        memory_limit: Memory in bytes a worker may use on top of its startup
+            size (500 when exceeded)
+
+    Returns:
+        aiohttp.web.Application, or None if aiohttp is not installed
+    """
+    try:
+        from aiohttp import web
+    except ImportError:
+        print("ERROR: aiohttp not installed. Run: pip install aiohttp")
+        return None
+
+    cache = ConversionCache(Path(cache_dir)) if cache_dir else None
+    pool = ConversionPool(workers, max_queue, timeout, cache, memory_limit)
+
+    def busy_response(error: str, status: int):
+        return web.json_response({'error': error, **pool.stats()}, status=status,
+                                 headers={'Retry-After': str(RETRY_AFTER_SECONDS)})
+
+    async def health(request):
+        """Liveness: the event loop is responsive."""
+        return web.json_response({'status': 'healthy', 'service': 'pdf-to-markdown', **pool.stats()})
+
+    async def ready(request):
+        """Readiness: a new conversion would be admitted."""
+        status = 200 if pool.accepting else 503
+        return web.json_response({'ready': pool.accepting, **pool.stats()}, status=status)
+
+    async def convert(request):
+        """Convert uploaded PDF to Markdown."""
+        try:
+            with pool.admit() as ticket:
+                try:
+                    pdf_path, filename, fields = await receive_pdf_upload(
+                        request, spool_dir, max_upload_bytes
+                    )
+                except UploadTooLarge as e:
+                    return web.json_response({'error': str(e)}, status=413)
+                except ValueError as e:
+                    # Not a multipart body
+                    return web.json_response({'error': f'Invalid upload: {e}'}, status=400)
+
+                try:
+                    if pdf_path is None:
+                        return web.json_response({'error': 'No file uploaded'}, status=400)
+                    if not filename.lower().endswith('.pdf'):
+                        return web.json_response({'error': 'File must be a PDF'}, status=400)
+
+                    inline = fields.get('inline_footnotes', 'false').lower() == 'true'
+                    markdown_content, metadata = await pool.convert(ticket, pdf_path, inline)
+                finally:
+                    if pdf_path is not None:
+                        pdf_path.unlink(missing_ok=True)
+        except ServiceBusy as e:
+            return busy_response(str(e), 429)
+        except ServiceUnavailable as e:
+            return busy_response(str(e), 503)
+        except asyncio.TimeoutError:
+            return web.json_response({'error': f'Conversion timed out after {pool.timeout:g}s'}, status=504)
+        except MemoryError:
+            return web.json_response({'error': 'Conversion exceeded the worker memory limit'}, status=500)
+        except ScannedPdfError as e:
+            return web.json_response({'error': str(e), 'triage': e.triage.to_dict()}, status=422)
+        except Exception as e:
+            return web.json_response({'error': f'Processing error: {str(e)}'}, status=500)
+
+        return web.json_response({
+            'success': True,
+            'filename': filename,
+            'markdown': markdown_content,
+            'metadata': metadata,
+            'stats': {
+                'length': len(markdown_content),
+                'paragraphs': markdown_content.count('\n\n'),
+                'headings': markdown_content.count('#')
+            }
+        })
+
+    async def on_startup(app):
+        pool.start()
+
+    async def on_cleanup(app):
+        pool.close()
+
+    # Uploads are streamed by receive_pdf_upload, which enforces the limit;
+    # client_max_size only guards anything that reads a whole body.
+    app = web.Application(client_max_size=max_upload_bytes + UPLOAD_CHUNK_BYTES)
+    app['pool'] = pool
+    app.router.add_get('/health', health)
+    app.router.add_get('/ready', ready)
+    app.router.add_post('/convert', convert)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+def main():
+    """Command line entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Async PDF to Markdown conversion service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None, help='Conversion processes (default: CPU count)')
+    parser.add_argument('--queue', type=int, default=DEFAULT_QUEUE_SIZE, help='Requests allowed to wait for a worker')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Per-request deadline in seconds')
+    parser.add_argument('--cache', default=None, help='Conversion cache directory')
+    parser.add_argument('--memory-limit', type=float, default=None,
+                        help='MB a worker may use on top of its startup size')
+    args = parser.parse_args()
+
+    memory_limit = int(args.memory_limit * (1 << 20)) if args.memory_limit else None
+    app = create_app(args.workers, args.queue, args.timeout, args.cache, memory_limit=memory_limit)
+    if app is None:
+        sys.exit(1)
+
+    from aiohttp import web
+    print(f"Serving on http://{args.host}:{args.port} "
+          f"({app['pool'].workers} workers, queue {args.queue}, timeout {args.timeout:g}s)")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Watch-folder ingestion daemon for the Michigan Court PDF to Markdown converter.
+
+New or changed PDFs dropped into the watched directories are converted by
+supervised worker processes a few seconds after they land. With a timeout
+or memory limit, a conversion that goes over has its worker killed, so a
+PDF that hangs MuPDF fails alone instead of holding on to a worker.
+
+Files still being written are debounced: a PDF is only queued once it has
+been quiet (no writes, same size and modification time) for the debounce
+interval.
+
+Which files are done is kept in a small SQLite state file, so a restart
+only stats the watched directories instead of converting them again. On
+Linux the daemon sleeps in inotify and uses no CPU while idle; elsewhere
+it falls back to rescanning every POLL_INTERVAL seconds.
+
+Usage:
+    python pdf2md_watch.py <input_dir> [<input_dir> ...] --output DIR
+                           [--workers N] [--debounce SECONDS] [--state FILE]
+                           [--cache DIR] [--index DB] [--inline-footnotes]
+                           [--timeout SECONDS] [--memory-limit MB]
+"""
+
+import os
+import sys
+import time
+import signal
+import struct
+import sqlite3
+import ctypes
+import ctypes.util
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from pdf2md_core import ConversionCache, SupervisedPool, WorkerDied, _convert_pdf_to_markdown
+from pdf2md_search import SearchIndex
+
+# ===============================================
+# WATCH SETTINGS
+# ===============================================
+
+DEFAULT_DEBOUNCE = 2.0       # Seconds a file must be quiet before it is queued
+POLL_INTERVAL = 5.0          # Seconds between rescans where inotify is unavailable
+MAX_CRASHES = 2              # Worker deaths a file may cause before it fails
+STATE_FILE_NAME = ".pdf2md_watch.db"
+
+# ===============================================
+# INOTIFY
+# ===============================================
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then len bytes of name
+
+class Inotify:
+    """
+    Minimal inotify binding (Linux, via ctypes): watch directories for writes.
+
+    fileno() can be passed to select(); read() returns the changed paths
+    without blocking.
+    """
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[int, Path] = {}
+
+    def add_watch(self, directory: Path) -> None:
+        wd = self._add_watch(self.fd, os.fsencode(str(directory)), self.MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch failed: {os.strerror(err)}", str(directory))
+        self._dirs[wd] = Path(directory)
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def read(self) -> Tuple[List[Path], bool]:
+        """
+        Drain pending events.
+
+        Returns:
+            Tuple of (changed paths, overflowed); after an overflow events
+            were lost and the directories should be rescanned
+        """
+        paths: List[Path] = []
+        overflowed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, pos)
+                name = data[pos + _INOTIFY_EVENT.size:pos + _INOTIFY_EVENT.size + length].rstrip(b"\0")
+                pos += _INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                elif name and not mask & IN_IGNORED and wd in self._dirs:
+                    paths.append(self._dirs[wd] / os.fsdecode(name))
+        return paths, overflowed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+def _open_inotify() -> Optional[Inotify]:
+    """An Inotify instance, or None where inotify is not available."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return Inotify()
+    except (OSError, AttributeError):
+        return None
+
+# ===============================================
+# PERSISTENT STATE
+# ===============================================
+
+class WatchState:
+    """
+    Which PDFs have been processed, keyed by path, size and modification time.
+
+    A failed file is recorded too, so it is not retried until it changes
+    (a file whose worker died is retried first; see WatchDaemon).
+    """
+
+    def __init__(self, db_path: Path):
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                finished REAL NOT NULL
+            )""")
+
+    def is_done(self, path: Path, size: int, mtime_ns: int) -> bool:
+        row = self.conn.execute("SELECT size, mtime_ns FROM files WHERE path = ?", (str(path),)).fetchone()
+        return row is not None and tuple(row) == (size, mtime_ns)
+
+    def record(self, path: Path, size: int, mtime_ns: int, error: Optional[str] = None) -> None:
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                              (str(path), size, mtime_ns, "failed" if error else "done", error, time.time()))
+
+    def failures(self) -> List[Tuple[str, str]]:
+        return self.conn.execute("SELECT path, error FROM files WHERE status = 'failed' ORDER BY path").fetchall()
+
+    def close(self) -> None:
+        self.conn.close()
+
+# ===============================================
+# DAEMON
+# ===============================================
+
+def _convert_job(pdf_path: str, output_dir: str, inline_footnotes: bool,
+                 cache: Optional[ConversionCache]) -> Tuple[str, Optional[str]]:
+    """Worker process entry point: returns (markdown_path, metadata_path)."""
+    md_path, meta_path = _convert_pdf_to_markdown(Path(pdf_path), Path(output_dir), inline_footnotes, cache)
+    return str(md_path), str(meta_path) if meta_path else None
+
+def _file_key(path: Path) -> Optional[Tuple[int, int]]:
+    """(size, mtime_ns) of a file, or None if it is gone."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def _is_pdf_name(path: Path) -> bool:
+    return path.suffix.lower() == ".pdf" and not path.name.startswith(".")
+
+class WatchDaemon:
+    """
+    Convert PDFs as they appear in watched directories.
+
+    A change only schedules a file: it is queued once it has been quiet
+    for ``debounce`` seconds. While a file converts, further changes to
+    it are collected and it is queued again afterwards.
+
+    Conversions run in a SupervisedPool: one past ``timeout`` seconds or
+    over ``memory_limit`` bytes has its worker killed and fails. A worker
+    that dies on its own only loses its own file, which is queued again
+    until it has killed MAX_CRASHES workers. run() blocks until stop() is
+    called (or SIGINT/SIGTERM); run_once() processes one round of events,
+    for embedding and tests.
+    """
+
+    def __init__(
+        self,
+        input_dirs: List[Path],
+        output_dir: Path,
+        workers: Optional[int] = None,
+        debounce: float = DEFAULT_DEBOUNCE,
+        state_path: Optional[Path] = None,
+        inline_footnotes: bool = False,
+        cache: Optional[ConversionCache] = None,
+        index: Optional[SearchIndex] = None,
+        timeout: Optional[float] = None,
+        memory_limit: Optional[int] = None
+    ):
+        self.input_dirs = [Path(d) for d in input_dirs]
+        self.output_dir = Path(output_dir)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.debounce = debounce
+        self.inline_footnotes = inline_footnotes
+        self.cache = cache
+        self.index = index
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.state = WatchState(Path(state_path) if state_path else self.output_dir / STATE_FILE_NAME)
+
+        self.pending: Dict[Path, Tuple[float, Optional[Tuple[int, int]]]] = {}  # path -> (due, key)
+        self.running: Dict[Future, Tuple[Path, Tuple[int, int]]] = {}
+        self.converted = 0
+        self.failed = 0
+        self._busy: Set[Path] = set()
+        self._changed_while_busy: Set[Path] = set()
+        self._crashes: Dict[Path, int] = {}
+        self._stopping = False
+
+        self._inotify = _open_inotify()
+        if self._inotify is not None:
+            for d in self.input_dirs:
+                self._inotify.add_watch(d)
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._executor = SupervisedPool(self.workers, timeout, memory_limit)
+        self._next_poll = 0.0
+        self.scan()
+
+    @property
+    def polling(self) -> bool:
+        """True if inotify is unavailable and directories are rescanned instead."""
+        return self._inotify is None
+
+    def scan(self) -> int:
+        """
+        Schedule every PDF in the watched directories that is not done yet.
+
+        Only stats files; already converted, unchanged PDFs are skipped.
+
+        Returns:
+            Number of files scheduled
+        """
+        scheduled = 0
+        for d in self.input_dirs:
+            for path in d.glob("*"):
+                if not _is_pdf_name(path) or path in self.pending or path in self._busy:
+                    continue
+                key = _file_key(path)
+                if key is not None and not self.state.is_done(path, *key):
+                    self.notice(path)
+                    scheduled += 1
+        return scheduled
+
+    def notice(self, path: Path) -> None:
+        """Record a change to a file, (re)starting its debounce interval."""
+        if path in self._busy:
+            self._changed_while_busy.add(path)
+            return
+        self.pending[path] = (time.monotonic() + self.debounce, _file_key(path))
+
+    def _dispatch_due(self) -> None:
+        now = time.monotonic()
+        for path, (due, key) in list(self.pending.items()):
+            if due > now:
+                continue
+            current = _file_key(path)
+            if current is None:
+                del self.pending[path]     # Deleted before it settled
+                continue
+            if current != key:
+                self.pending[path] = (now + self.debounce, current)  # Still being written
+                continue
+            del self.pending[path]
+            if self.state.is_done(path, *current):
+                continue
+            future = self._executor.submit(_convert_job, str(path), str(self.output_dir),
+                                           self.inline_footnotes, self.cache)
+            self.running[future] = (path, current)
+            self._busy.add(path)
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_w, b"x")
+        except (BlockingIOError, OSError):
+            pass  # Pipe already holds a wake-up
+
+    def _collect_finished(self) -> None:
+        for future in [f for f in self.running if f.done()]:
+            path, key = self.running.pop(future)
+            self._busy.discard(path)
+            if future.cancelled():
+                continue  # Shut down before it started; picked up again on restart
+            error = future.exception()
+            if isinstance(error, WorkerDied):
+                # Not recorded (the OOM killer may have picked an innocent
+                # worker): converted again until it has killed MAX_CRASHES
+                crashes = self._crashes.get(path, 0) + 1
+                if crashes < MAX_CRASHES:
+                    self._crashes[path] = crashes
+                    print(f"RETRYING: {path}: {error}")
+                    self._changed_while_busy.discard(path)
+                    self.notice(path)
+                    continue
+            self._crashes.pop(path, None)
+            if error is None:
+                md_path, meta_path = future.result()
+                if self.index is not None:
+                    self.index.add_files(Path(md_path), Path(meta_path) if meta_path else None)
+                self.converted += 1
+                print(f"CONVERTED: {path} -> {md_path}")
+            else:
+                self.failed += 1
+                print(f"FAILED: {path}: {type(error).__name__}: {error}")
+            self.state.record(path, *key, error=None if error is None else f"{type(error).__name__}: {error}")
+            if path in self._changed_while_busy:
+                self._changed_while_busy.discard(path)
+                self.notice(path)
+
+    def _timeout(self) -> Optional[float]:
+        """Seconds until something is due; None (sleep until an event) when idle."""
+        deadlines = [due for due, _ in self.pending.values()]
+        if self.polling:
+            deadlines.append(self._next_poll)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def run_once(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for events (at most ``timeout`` seconds, or until the next file is
+        due) and process them.
+        """
+        wait = self._timeout()
+        if timeout is not None:
+            wait = timeout if wait is None else min(wait, timeout)
+        fds = [self._wake_r] + ([self._inotify.fileno()] if self._inotify is not None else [])
+        # Settles finished and overdue conversions while it waits
+        ready = self._executor.poll(wait, also=fds)
+        if self._wake_r in ready:
+            try:
+                os.read(self._wake_r, 4096)
+            except BlockingIOError:
+                pass
+        if self._inotify is not None and self._inotify.fileno() in ready:
+            paths, overflowed = self._inotify.read()
+            for path in paths:
+                if _is_pdf_name(path):
+                    self.notice(path)
+            if overflowed:
+                self.scan()
+        if self.polling and time.monotonic() >= self._next_poll:
+            self.scan()
+            self._next_poll = time.monotonic() + POLL_INTERVAL
+        self._collect_finished()
+        self._dispatch_due()
+
+    def run(self) -> None:
+        """Process events until stop() is called or SIGINT/SIGTERM arrives."""
+        def on_signal(signum, frame):
+            self.stop()
+        previous = {sig: signal.signal(sig, on_signal) for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            while not self._stopping:
+                self.run_once()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+    def stop(self) -> None:
+        """Ask run() to return after the current round."""
+        self._stopping = True
+        self._wake()
+
+    def close(self) -> None:
+        """Wait for running conversions, record them and release resources."""
+        self._executor.shutdown()
+        self._collect_finished()
+        if self._inotify is not None:
+            self._inotify.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+        self.state.close()
+
+def main():
+    """Command line entry point."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert PDFs as they arrive in watched directories")
+    parser.add_argument('input_dirs', nargs='+', help='Directories to watch')
+    parser.add_argument('--output', required=True, help='Output directory for Markdown files')
+    parser.add_argument('--workers', type=int, default=None, help='Conversion processes (default: CPU count)')
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE,
+                        help='Seconds a file must be quiet before it is converted')
+    parser.add_argument('--state', default=None, help=f'State file (default: <output>/{STATE_FILE_NAME})')
+    parser.add_argument('--cache', default=None, help='Conversion cache directory')
+    parser.add_argument('--index', default=None, help='SQLite full-text index to add converted files to')
+    parser.add_argument('--inline-footnotes', action='store_true', help='Link footnote references inline')
+    parser.add_argument('--timeout', type=float, default=None, help='Seconds a conversion may run before it is killed')
+    parser.add_argument('--memory-limit', type=float, default=None,
+                        help='MB a worker may use on top of its startup size')
+    args = parser.parse_args()
+
+    for d in args.input_dirs:
+        if not Path(d).is_dir():
+            print(f"ERROR: Not a directory: {d}")
+            sys.exit(1)
+
+    index = SearchIndex(Path(args.index)) if args.index else None
+    daemon = WatchDaemon(
+        [Path(d) for d in args.input_dirs], Path(args.output), args.workers, args.debounce,
+        Path(args.state) if args.state else None, args.inline_footnotes,
+        ConversionCache(Path(args.cache)) if args.cache else None, index, args.timeout,
+        int(args.memory_limit * (1 << 20)) if args.memory_limit else None
+    )
+    mode = f"polling every {POLL_INTERVAL:g}s" if daemon.polling else "inotify"
+    print(f"Watching {', '.join(args.input_dirs)} ({mode}, {daemon.workers} workers, "
+          f"{len(daemon.pending)} files to catch up)")
+    try:
+        daemon.run()
+    finally:
+        daemon.close()
+        if index is not None:
+            index.close()
+    print(f"Stopped: {daemon.converted} converted, {daemon.failed} failed")
+
+if __name__ == "__main__":
+    main()
@@ -83,6 +83,1317 @@ def test_basic_functionality():
     else:
         print(f"❌ Paragraph joining failed. Got: {joined}")
 
+def test_line_classifier():
+    """Test that the single-pass classifier matches the original line stages."""
+    print("\n🧪 Testing line classifier...")
+    
+    from pdf2md_core import BOILERPLATE_RE, get_line_classifier
+    from benchmarks import legacy_map_headings, legacy_line_stages, classifier_line_stages, synthetic_pages
+    
+    clf = get_line_classifier()
+    tricky = [
+        "STATE OF MICHIGAN", "S T A T E  O F  M I C H I G A N", "\u017ftate of michigan",
+        "-12-", "10:05 am", "no. 5", "LC No. X", "published later",
+        "xx If this opinion indicates that it is 'FOR PUBLICATION'",
+        "\u0130f this opinion indicates that it is 'for publication'",
+        "I. X", "\u0130D. x", "iv. y", " A. indented", "12. c", "PER CURIAM.", "opinions",
+        "", "Regular paragraph",
+    ]
+    
+    for line in tricky:
+        stripped = line.strip()
+        if (clf.is_boilerplate(stripped) != bool(BOILERPLATE_RE.search(stripped))
+                or clf.map_heading(line.rstrip()) != legacy_map_headings([line])[0]):
+            print(f"❌ Line classifier differs on {line!r}")
+            return False
+    
+    pages = synthetic_pages(50)
+    if classifier_line_stages(pages) != legacy_line_stages(pages):
+        print("❌ Line classifier output differs from the original stages")
+        return False
+    
+    print("✅ Line classifier matches the original line stages")
+    return True
+
+def test_batch_engine():
+    """Test that the batch engine reports per-file errors and a failure exit code."""
+    print("\n🧪 Testing batch engine...")
+    
+    from pdf2md_core import run_batch, batch_exit_code
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        bad_pdfs = [temp_dir / "broken1.pdf", temp_dir / "broken2.pdf"]
+        for pdf in bad_pdfs:
+            pdf.write_text("not a pdf")
+        
+        summary = run_batch(bad_pdfs, temp_dir / "out", workers=2, progress=None)
+    
+    names = [r.pdf_path.name for r in summary.results]
+    if (names == ["broken1.pdf", "broken2.pdf"]
+            and summary.failed == 2
+            and all(r.error for r in summary.results)
+            and batch_exit_code(summary) == 2):
+        print("✅ Batch engine reports per-file errors in order")
+        return True
+    
+    print(f"❌ Batch engine failed. Got: {summary.results}")
+    return False
+
+def test_conversion_cache():
+    """Test cache hits, ruleset fingerprinting and LRU eviction."""
+    print("\n🧪 Testing conversion cache...")
+    
+    import pdf2md_core
+    from pdf2md_core import ConversionCache, ruleset_fingerprint
+    
+    ok = True
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        # Not a real PDF: a cache hit must never open it
+        pdf = temp_dir / "opinion.pdf"
+        pdf.write_bytes(b"%PDF-cached")
+        cache = ConversionCache(temp_dir / "cache")
+        cache.put(cache.key_for(pdf), "# I. CACHED\n", {"case_no": "123456"})
+        
+        success, md_path, meta_path = convert_pdf_to_markdown(pdf, temp_dir / "out", cache=cache)
+        if success and md_path.read_text(encoding="utf-8") == "# I. CACHED\n":
+            print("✅ Cache hit returns stored Markdown without opening the PDF")
+        else:
+            print("❌ Cache hit failed")
+            ok = False
+        
+        pdf2md_core.ABBR_TOKENS.add("Test.")
+        try:
+            before = cache.key_for(pdf)
+        finally:
+            pdf2md_core.ABBR_TOKENS.discard("Test.")
+        if before != cache.key_for(pdf) and ruleset_fingerprint(True) != ruleset_fingerprint(False):
+            print("✅ Cache key changes with the active rules")
+        else:
+            print("❌ Cache key ignores rule changes")
+            ok = False
+        
+        small = ConversionCache(temp_dir / "small", max_bytes=300)
+        for i in range(5):
+            small.put(f"{i:064x}", "x" * 100, {})
+        if small.get(f"{0:064x}") is None and small.get(f"{4:064x}") is not None:
+            print("✅ Cache evicts least recently used entries over the size cap")
+        else:
+            print("❌ Cache eviction failed")
+            ok = False
+    
+    return ok
+
+def _write_test_pdf(pdf_path: Path, pages: int = 3):
+    """Write a small COA-style opinion PDF for tests."""
+    import fitz
+    
+    doc = fitz.open()
+    for n in range(pages):
+        page = doc.new_page()
+        lines = []
+        if n == 0:
+            lines += ["STATE OF MICHIGAN", "COURT OF APPEALS", "", "JOHN DOE,",
+                      "UNPUBLISHED", "January 15, 2025", "v", "No. 123456",
+                      "Before: Judge A, Judge B, and Judge C.", "", "PER CURIAM.", "",
+                      "I. BACKGROUND", ""]
+        lines += [f"Plaintiff filed a motion on page {n + 1} for summary disposi-",
+                  "tion pursuant to MCL", "600.2116. The trial court denied the motion,",
+                  "and the case continued onto the next", "",
+                  f"{n + 1}) This footnote explains something important."]
+        page.insert_text((72, 72), "\n".join(lines), fontsize=10)
+        page.insert_text((290, 760), f"-{n + 1}-", fontsize=10)
+    doc.save(str(pdf_path))
+    doc.close()
+
+def test_streaming_conversion():
+    """Test that streaming conversion matches the in-memory pipeline."""
+    print("\n🧪 Testing streaming conversion...")
+    
+    from pdf2md_core import convert_pdf_to_markdown_streaming
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdf = temp_dir / "opinion.pdf"
+        _write_test_pdf(pdf, pages=4)
+        
+        for inline in (False, True):
+            _, md_path, meta_path = convert_pdf_to_markdown(pdf, temp_dir / "full", inline)
+            _, s_md_path, s_meta_path = convert_pdf_to_markdown_streaming(pdf, temp_dir / "stream", inline)
+            
+            if (md_path.read_text(encoding="utf-8") != s_md_path.read_text(encoding="utf-8")
+                    or meta_path.read_text(encoding="utf-8") != s_meta_path.read_text(encoding="utf-8")):
+                print(f"❌ Streaming output differs (inline_footnotes={inline})")
+                return False
+    
+    print("✅ Streaming conversion matches in-memory output")
+    return True
+
+def test_in_memory_conversion():
+    """Test that bytes and file-like inputs convert like a path on disk."""
+    print("\n🧪 Testing in-memory conversion...")
+    
+    import io
+    from pdf2md_core import convert_pdf
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdf = temp_dir / "opinion.pdf"
+        _write_test_pdf(pdf)
+        data = pdf.read_bytes()
+        
+        _, md_path, meta_path = convert_pdf_to_markdown(pdf, temp_dir / "out")
+        expected = (md_path.read_text(encoding="utf-8"),
+                    json.loads(meta_path.read_text(encoding="utf-8")))
+        
+        for source in (pdf, data, io.BytesIO(data)):
+            if convert_pdf(source) != expected:
+                print(f"❌ In-memory output differs for {type(source).__name__} input")
+                return False
+
+    print("✅ Bytes, stream and path inputs give identical output")
+    return True
+
+def test_conversion_pool():
+    """Test the async service's bounded process pool."""
+    print("\n🧪 Testing async conversion pool...")
+    
+    import asyncio
+    from pdf2md_core import convert_pdf
+    from pdf2md_service import ConversionPool, ServiceBusy, ServiceUnavailable
+    
+    async def run(pdf: Path):
+        pool = ConversionPool(workers=1, max_queue=1, timeout=60)
+        pool.start()
+        try:
+            with pool.admit() as ticket:
+                with pool.admit():
+                    try:
+                        with pool.admit():
+                            return "third request admitted past capacity"
+                    except ServiceBusy:
+                        pass
+                result = await pool.convert(ticket, pdf)
+            if result != convert_pdf(pdf):
+                return "pool output differs from convert_pdf"
+            if pool.stats()["queue_depth"] or pool.stats()["running"]:
+                return f"pool did not drain: {pool.stats()}"
+        finally:
+            pool.close()
+        try:
+            with pool.admit():
+                return "closed pool admitted a request"
+        except ServiceUnavailable:
+            return None
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf = Path(temp_dir) / "opinion.pdf"
+        _write_test_pdf(pdf)
+        error = asyncio.run(run(pdf))
+    
+    if error:
+        print(f"❌ {error}")
+        return False
+    
+    print("✅ Pool converts in a worker and rejects requests over capacity")
+    return True
+
+def test_conversion_pool_timeout():
+    """Test that a conversion past its deadline gives its worker back."""
+    print("\n🧪 Testing async conversion pool timeouts...")
+    
+    import os
+    import asyncio
+    from pdf2md_core import ConversionCache
+    from pdf2md_service import ConversionPool
+    
+    async def run(stuck: Path, pdf: Path, cache: ConversionCache):
+        pool = ConversionPool(workers=1, max_queue=1, timeout=2, cache=cache)
+        pool.start()
+        try:
+            with pool.admit() as ticket:
+                try:
+                    await pool.convert(ticket, stuck)
+                    return "stuck conversion returned"
+                except asyncio.TimeoutError:
+                    pass
+            if pool.stats()["running"] or pool.stats()["timed_out"] != 1:
+                return f"timed-out conversion still holds its slot: {pool.stats()}"
+            # The only worker was stuck, so this needs the slot back
+            with pool.admit() as ticket:
+                markdown, metadata = await pool.convert(ticket, pdf)
+            if metadata.get("case_no") != "123456":
+                return f"unexpected conversion after the timeout: {metadata}"
+        except asyncio.TimeoutError:
+            return "stuck conversion kept the only worker"
+        finally:
+            pool.close()
+        return None
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf = Path(temp_dir) / "opinion.pdf"
+        _write_test_pdf(pdf)
+        # Reading a FIFO blocks until something writes to it, so hashing it
+        # for the cache key is a conversion that never ends
+        stuck = Path(temp_dir) / "stuck.pdf"
+        os.mkfifo(stuck)
+        error = asyncio.run(run(stuck, pdf, ConversionCache(Path(temp_dir) / "cache")))
+    
+    if error:
+        print(f"❌ {error}")
+        return False
+    
+    print("✅ A conversion past its deadline is killed and frees its worker")
+    return True
+
+def test_synthetic_opinion_pdf():
+    """Test the benchmark PDF generator and per-stage timings."""
+    print("\n🧪 Testing synthetic opinion PDFs...")
+    
+    from pdf2md_core import convert_pdf
+    from benchmarks import OpinionSpec, STAGES, bench_stages, write_synthetic_opinion_pdf
+    
+    spec = OpinionSpec(pages=4, footnote_density=1.0, heading_depth=4,
+                       spaced_headers=True, two_column=0.5)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf = write_synthetic_opinion_pdf(Path(temp_dir) / "opinion.pdf", spec)
+        markdown, metadata = convert_pdf(pdf)
+        timings = bench_stages(pdf, repeat=1)
+    
+    if (metadata.get("case_no") != "123456" or "# I. " not in markdown
+            or "## Footnotes" not in markdown or "S T A T E" in markdown):
+        print(f"❌ Synthetic opinion converted unexpectedly: {metadata}")
+        return False
+    if timings["pages"] != 4 or any(timings[stage] < 0 for stage in STAGES):
+        print(f"❌ Stage timings incomplete: {timings}")
+        return False
+    
+    print("✅ Synthetic opinion PDF converts and every stage is timed")
+    return True
+
+def test_conversion_stats():
+    """Test per-stage timings and counters."""
+    print("\n🧪 Testing conversion stats...")
+    
+    from pdf2md_core import ConversionStats
+    from benchmarks import OpinionSpec, write_synthetic_opinion_pdf
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdf = write_synthetic_opinion_pdf(temp_dir / "opinion.pdf", OpinionSpec(pages=3, footnote_density=1.0))
+        
+        stats = ConversionStats()
+        _, md_path, meta_path = convert_pdf_to_markdown(pdf, temp_dir / "on", True, stats=stats, stats_in_meta=True)
+        written = md_path.stat().st_size + meta_path.stat().st_size
+        sidecar = json.loads(meta_path.read_text(encoding="utf-8"))
+        
+        _, plain_md, plain_meta = convert_pdf_to_markdown(pdf, temp_dir / "off", True)
+        same_output = plain_md.read_text(encoding="utf-8") == md_path.read_text(encoding="utf-8")
+        plain_sidecar = json.loads(plain_meta.read_text(encoding="utf-8"))
+    
+    counters_ok = (stats.pages == 3 and stats.blocks > 0 and stats.boilerplate_lines > 0
+                   and stats.headings > 0 and stats.paragraphs > 0 and stats.footnotes > 0
+                   and stats.inline_footnotes > 0 and stats.bytes_written == written)
+    stages_ok = {"extract", "meta", "line_classifier", "link_footnotes", "write"} <= set(stats.seconds)
+    
+    if not (counters_ok and stages_ok):
+        print(f"❌ Stats incomplete: {stats}")
+        return False
+    if not same_output or sidecar.get("stats", {}).get("pages") != 3 or "stats" in plain_sidecar:
+        print("❌ Stats changed the output or were not stored in the sidecar as requested")
+        return False
+    
+    print("✅ Stats record every stage and counter without changing the output")
+    return True
+
+def test_extraction_snapshot():
+    """Test that replaying an extraction snapshot matches converting the PDF."""
+    print("\n🧪 Testing extraction snapshots...")
+    
+    import fitz
+    from pdf2md_core import ExtractionSnapshot, pdf_content_hash
+    from benchmarks import OpinionSpec, write_synthetic_opinion_pdf
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdf = write_synthetic_opinion_pdf(temp_dir / "opinion.pdf", OpinionSpec(pages=4, two_column=0.5))
+        
+        _, md_path, meta_path = convert_pdf_to_markdown(pdf, temp_dir / "pdf", True, snapshot_dir=temp_dir / "snap")
+        snapshot = temp_dir / "snap" / "opinion.blocks"
+        _, r_md_path, r_meta_path = convert_pdf_to_markdown(snapshot, temp_dir / "replay", True)
+        
+        with fitz.open(pdf) as doc, ExtractionSnapshot(snapshot) as snap:
+            blocks_ok = (snap.page_count == len(doc)
+                         and all(snap.page_blocks(i) == page.get_text("blocks") for i, page in enumerate(doc))
+                         and snap.source_hash == pdf_content_hash(pdf))
+        
+        same = (md_path.read_text(encoding="utf-8") == r_md_path.read_text(encoding="utf-8")
+                and meta_path.read_text(encoding="utf-8") == r_meta_path.read_text(encoding="utf-8"))
+    
+    if not blocks_ok:
+        print("❌ Snapshot blocks differ from PyMuPDF's")
+        return False
+    if not same:
+        print("❌ Replayed output differs from PDF conversion")
+        return False
+    
+    print("✅ Snapshot replay matches PDF conversion")
+    return True
+
+def test_footnote_ref_linking():
+    """Test that inline footnotes link superscript references only."""
+    print("\n🧪 Testing footnote reference linking...")
+    
+    import fitz
+    from pdf2md_core import (FOOTNOTE_REF_OPEN as REF, FOOTNOTE_REF_CLOSE as END, convert_pdf,
+                             convert_pdf_to_markdown_streaming)
+    from benchmarks import _write_lines
+    
+    doc = fitz.open()
+    page = doc.new_page()
+    _write_lines(page, 72, 72, ["PER CURIAM.", "",
+                                f"The trial court denied the motion.{REF}1{END} See Smith, 123 NW2d 45",
+                                f"(2001), and MCL 600.2116. The record{REF}7{END} was complete."], 11)
+    _write_lines(page, 72, 700, [f"{REF}1{END} The court relied on the earlier ruling."], 8)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    
+    inline_md, _ = convert_pdf(pdf_bytes, inline_footnotes=True)
+    plain_md, _ = convert_pdf(pdf_bytes)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf = Path(temp_dir) / "refs.pdf"
+        pdf.write_bytes(pdf_bytes)
+        _, md_path, _ = convert_pdf_to_markdown_streaming(pdf, Path(temp_dir) / "stream", True)
+        streamed_md = md_path.read_text(encoding="utf-8")
+        leftovers = [p.name for p in md_path.parent.iterdir() if p.suffix != ".json" and p != md_path]
+    
+    expected = ("the motion.[^1] See Smith, 123 NW2d 45 (2001), and MCL 600.2116. The record7 was",
+                "[^1]: The court relied on the earlier ruling.")
+    if not all(e in inline_md for e in expected) or REF in inline_md or END in inline_md:
+        print(f"❌ Unexpected inline footnotes:\n{inline_md}")
+        return False
+    if "[^" in plain_md.split("## Footnotes")[0]:
+        print("❌ References linked without inline_footnotes")
+        return False
+    if streamed_md != inline_md or leftovers:
+        print(f"❌ Streaming links differ from in-memory ones:\n{streamed_md}\n{leftovers}")
+        return False
+    
+    print("✅ Superscript references linked, citations left alone")
+    return True
+
+def test_metadata_only():
+    """Test that the first-page metadata path matches full conversion."""
+    print("\n🧪 Testing metadata-only extraction...")
+    
+    from pdf2md_core import convert_pdf, extract_pdf_meta, run_batch
+    from benchmarks import OpinionSpec, write_synthetic_opinion_pdf
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdfs = [write_synthetic_opinion_pdf(temp_dir / f"opinion{i}.pdf", OpinionSpec(pages=5, seed=i))
+                for i in (1, 2)]
+        
+        _, _, full_meta_path = convert_pdf_to_markdown(pdfs[0], temp_dir / "full")
+        summary = run_batch(pdfs, temp_dir / "meta", workers=1, progress=None, meta_only=True)
+        
+        # Metadata-only runs triage the first page alone; everything else matches
+        def without_triage(meta: dict) -> dict:
+            return {k: v for k, v in meta.items() if k != "triage"}
+        
+        meta, full_meta = extract_pdf_meta(pdfs[1]), convert_pdf(pdfs[1])[1]
+        same_meta = (without_triage(meta) == without_triage(full_meta)
+                     and meta["triage"]["kind"] == full_meta["triage"]["kind"] and meta["triage"]["sampled"] == 1)
+        batch_meta = json.loads((temp_dir / "meta" / "opinion1.meta.json").read_text(encoding="utf-8"))
+        same_file = without_triage(batch_meta) == without_triage(json.loads(full_meta_path.read_text(encoding="utf-8")))
+        meta_only = (summary.succeeded == 2 and all(r.md_path is None for r in summary.results)
+                     and not list((temp_dir / "meta").glob("*.md")))
+    
+    if not (same_meta and same_file):
+        print("❌ Metadata-only output differs from full conversion")
+        return False
+    if not meta_only:
+        print("❌ Metadata-only batch wrote Markdown or failed")
+        return False
+    
+    print("✅ Metadata-only extraction matches full conversion")
+    return True
+
+def test_page_layout():
+    """Test that layout analysis drops running headers and reads columns in order."""
+    print("\n🧪 Testing page layout analysis...")
+    
+    import fitz
+    from pdf2md_core import ConversionStats, convert_pdf
+    
+    doc = fitz.open()
+    for n in range(4):
+        page = doc.new_page()
+        page.insert_text((72, 40), f"Doe v Smith, Docket No. 12345, page {n + 1}", fontsize=9)
+        if n == 0:
+            page.insert_text((72, 90), "STATE OF MICHIGAN\nCOURT OF APPEALS\n\nPER CURIAM.", fontsize=10)
+        if n == 2:
+            for x, column in ((72, "Left"), (320, "Right")):
+                paragraphs = [f"{column} column paragraph {i} starts on this line\nand it ends on this one."
+                              for i in range(3)]
+                page.insert_text((x, 160), "\n\n".join(paragraphs), fontsize=10)
+        else:
+            page.insert_text((72, 160), f"The body text of page {n + 1} continues here.", fontsize=10)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    
+    stats = ConversionStats()
+    plain_md, _ = convert_pdf(pdf_bytes)
+    layout_md, _ = convert_pdf(pdf_bytes, stats=stats, layout_analysis=True)
+    
+    left, right = layout_md.find("Left column paragraph 2"), layout_md.find("Right column paragraph 0")
+    if "Docket No." not in plain_md or "Docket No." in layout_md or stats.layout_dropped != 3:
+        print(f"❌ Running header not dropped:\n{layout_md}")
+        return False
+    if stats.two_column_pages != 1 or not 0 <= left < right:
+        print(f"❌ Two-column page not read column by column:\n{layout_md}")
+        return False
+    
+    print("✅ Running headers dropped, two-column page read by column")
+    return True
+
+def test_parallel_page_extraction():
+    """Test that page-range workers give the same output as serial extraction."""
+    print("\n🧪 Testing parallel page extraction...")
+    
+    import pdf2md_core
+    from pdf2md_core import ConversionStats, convert_pdf
+    from benchmarks import OpinionSpec, write_synthetic_opinion_pdf
+    
+    import multiprocessing
+    from pdf2md_core import run_batch
+    
+    saved = pdf2md_core.PARALLEL_PAGE_THRESHOLD, pdf2md_core.PARALLEL_MIN_RANGE
+    pdf2md_core.PARALLEL_PAGE_THRESHOLD, pdf2md_core.PARALLEL_MIN_RANGE = 6, 2
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_dir = Path(temp_dir)
+            pdf = write_synthetic_opinion_pdf(temp_dir / "opinion.pdf", OpinionSpec(pages=9))
+            short = write_synthetic_opinion_pdf(temp_dir / "short.pdf", OpinionSpec(pages=2))
+            stats = ConversionStats()
+            serial = convert_pdf(pdf, inline_footnotes=True)
+            parallel = convert_pdf(pdf, inline_footnotes=True, stats=stats, page_workers=2)
+            from_bytes = convert_pdf(pdf.read_bytes(), inline_footnotes=True, page_workers=2)
+            
+            # Inside a batch worker, page workers only come from free batch slots
+            slots = multiprocessing.BoundedSemaphore(3)
+            pdf2md_core._init_batch_worker(slots)
+            try:
+                slots.acquire()  # This worker's own slot
+                slots.acquire()  # Another worker, busy
+                granted = [pdf2md_core._reserve_page_workers(4), pdf2md_core._reserve_page_workers(4)]
+                pdf2md_core._release_page_workers(granted[0])
+                slots.release()  # The other worker ran out of files
+                granted.append(pdf2md_core._reserve_page_workers(4))
+                pdf2md_core._release_page_workers(granted[2])
+                slots.release()
+                restored = all(slots.acquire(block=False) for _ in range(3)) and not slots.acquire(block=False)
+            finally:
+                pdf2md_core._init_batch_worker(None)
+            
+            summary = run_batch([pdf, short], temp_dir / "batch", workers=2, progress=None)
+            batch_md = (temp_dir / "batch" / "opinion.md").read_text(encoding="utf-8")
+            plain_md = convert_pdf(pdf)[0]
+    finally:
+        pdf2md_core.PARALLEL_PAGE_THRESHOLD, pdf2md_core.PARALLEL_MIN_RANGE = saved
+    
+    if parallel != serial or from_bytes != serial or stats.pages != 9:
+        print("❌ Parallel extraction output differs from serial")
+        return False
+    if granted != [2, 1, 3] or not restored:
+        print(f"❌ Page workers not limited to free batch slots: granted {granted}, restored {restored}")
+        return False
+    if summary.succeeded != 2 or batch_md != plain_md:
+        print("❌ Batch with shared page-worker slots failed or changed output")
+        return False
+    
+    print("✅ Parallel page extraction matches serial output")
+    return True
+
+def test_search_index():
+    """Test the paragraph-level search index and its incremental updates."""
+    print("\n🧪 Testing full-text search index...")
+    
+    from pdf2md_core import run_batch
+    from pdf2md_search import SearchIndex
+    from benchmarks import OpinionSpec, write_synthetic_opinion_pdf
+    
+    md = ("PER CURIAM.\n\n# I. BACKGROUND\n\nThe zoning variance was denied.\n\n---PAGE---\n\n"
+          "## A. Appeal\n\nThe board affirmed the zoning decision.[^1]\n\n---\n\n## Footnotes\n\n"
+          "[^1]: Zoning board minutes.\n")
+    meta = {"case_no": "999001", "date": "March 3, 2025", "judges": "Judge A"}
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdfs = [write_synthetic_opinion_pdf(temp_dir / f"opinion{i}.pdf", OpinionSpec(pages=3, seed=i))
+                for i in (1, 2)]
+        with SearchIndex(temp_dir / "index.db") as index:
+            summary = run_batch(pdfs, temp_dir / "out", workers=1, progress=None, index=index)
+            index.add_document("zoning", md, meta)
+            hits = {h.text: h for h in index.search("zoning")}
+            affirmed = hits.get("The board affirmed the zoning decision.[^1]")
+            footnote = hits.get("Zoning board minutes.")
+            
+            # Re-indexing unchanged output is a no-op; a changed document
+            # only rewrites its own rows
+            rows = index.conn.execute("SELECT id FROM paragraphs WHERE doc_id = 'opinion1'").fetchall()
+            unchanged = index.add_directory(temp_dir / "out") == (0, 2) and not index.add_document("zoning", md, meta)
+            updated = index.add_document("zoning", md.replace("denied", "granted"), meta)
+            kept = index.conn.execute("SELECT id FROM paragraphs WHERE doc_id = 'opinion1'").fetchall() == rows
+            regranted = [h.text for h in index.search("granted", case_no="999001")]
+    
+    if summary.succeeded != 2 or len(hits) != 3 or affirmed is None or footnote is None:
+        print(f"❌ Unexpected search hits: {sorted(hits)}")
+        return False
+    if (affirmed.page, affirmed.heading, affirmed.case_no, footnote.page) != (2, "I. BACKGROUND > A. Appeal", "999001", None):
+        print(f"❌ Wrong page/heading/case number on hit: {affirmed} / {footnote}")
+        return False
+    if not (unchanged and updated and kept and regranted == ["The zoning variance was granted."]):
+        print("❌ Index was not updated incrementally")
+        return False
+    
+    print("✅ Search index returns located paragraphs and updates incrementally")
+    return True
+
+def test_search_index_pages():
+    """Test that indexed paragraphs keep their PDF page when pages are dropped."""
+    print("\n🧪 Testing search index pages with a blank page...")
+    
+    import fitz
+    from pdf2md_core import convert_pdf_to_markdown, run_batch
+    from pdf2md_search import SearchIndex
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdf = temp_dir / "blank.pdf"
+        _write_test_pdf(pdf, 3)
+        doc = fitz.open(str(pdf))
+        doc.new_page(pno=1)
+        doc.saveIncr()
+        doc.close()
+        
+        found = {}
+        with SearchIndex(temp_dir / "single.db") as index:
+            convert_pdf_to_markdown(pdf, temp_dir / "single", index=index)
+            found["convert"] = sorted(h.page for h in index.search('"plaintiff filed"'))
+        with SearchIndex(temp_dir / "batch.db") as index:
+            run_batch([pdf], temp_dir / "batch", workers=1, progress=None, index=index, blocks=True)
+            found["run_batch"] = sorted(h.page for h in index.search('"plaintiff filed"'))
+        with SearchIndex(temp_dir / "rebuilt.db") as index:
+            index.add_directory(temp_dir / "batch", workers=1)
+            found["add_directory"] = sorted(h.page for h in index.search('"plaintiff filed"'))
+    
+    wrong = {k: v for k, v in found.items() if v != [1, 3, 4]}
+    if wrong:
+        print(f"❌ Paragraphs indexed on the wrong pages (expected [1, 3, 4]): {wrong}")
+        return False
+    
+    print("✅ Indexed paragraphs keep their PDF pages across a blank page")
+    return True
+
+def test_citation_index():
+    """Test citation extraction and citation lookups in both directions."""
+    print("\n🧪 Testing citation extraction and index...")
+    
+    from pdf2md_search import SearchIndex, extract_citations
+    
+    text = ("See MCL 750.316(1)(a), MCR 2.116(C)(10) and MRE 404(b); People v Smith, 500 Mich. 1, 5; "
+            "900 N.W.2d 12 (2017); Doe v Roe, 320 Mich App 45; 42 U.S.C. § 1983; 2019 WL 123456.")
+    expected = ["MCL 750.316", "MCR 2.116", "MRE 404", "500 Mich 1", "900 NW2d 12", "320 Mich App 45",
+                "42 USC 1983", "2019 WL 123456"]
+    found = [c.cite for c in extract_citations(text + " Lansing had 300 Michigan Avenue addresses.")]
+    if found != expected:
+        print(f"❌ Citations not extracted as expected: {found}")
+        return False
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        for name, case_no, body in (("a", "100001", "Under MCL 750.316 and 500 Mich 1."),
+                                    ("b", "100002", "MCL 750.316(1); MCL 750.316. See 500 Mich 1."),
+                                    ("c", "100003", "Nothing cited here.")):
+            (temp_dir / f"{name}.md").write_text(f"PER CURIAM.\n\n{body}\n", encoding="utf-8")
+            (temp_dir / f"{name}.meta.json").write_text(json.dumps({"case_no": case_no}), encoding="utf-8")
+        
+        with SearchIndex(temp_dir / "index.db") as index:
+            counts = index.add_directory(temp_dir, workers=2)
+            cited_by = [(doc_id, n) for doc_id, _, _, n in index.cited_by("MCL 750.316(1)(a)")]
+            cites = index.citations_of("100002")
+            (temp_dir / "b.md").write_text("PER CURIAM.\n\nOnly 500 Mich 1.\n", encoding="utf-8")
+            recounts = index.add_directory(temp_dir, workers=1)
+            cited_after = [doc_id for doc_id, *_ in index.cited_by("MCL 750.316")]
+    
+    if counts != (3, 0) or cited_by != [("b", 2), ("a", 1)]:
+        print(f"❌ Wrong citing documents: {cited_by}")
+        return False
+    if cites != [("reporter", "500 Mich 1", 1), ("statute", "MCL 750.316", 2)]:
+        print(f"❌ Wrong citations for a case: {cites}")
+        return False
+    if recounts != (1, 2) or cited_after != ["a"]:
+        print("❌ Citation index was not updated incrementally")
+        return False
+    
+    print("✅ Citations extracted, indexed and looked up both ways")
+    return True
+
+def test_near_duplicates():
+    """Test that batch mode skips near-duplicate opinions via the signature store."""
+    print("\n🧪 Testing near-duplicate detection...")
+    
+    from pdf2md_core import BatchResult, run_batch
+    from pdf2md_dedup import DuplicateIndex
+    from pdf2md_ledger import JobLedger
+    from benchmarks import OpinionSpec, write_synthetic_opinion_pdf
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        # A re-bannered copy and a longer (amended) copy of the same opinion
+        specs = {"original": OpinionSpec(pages=5), "rebannered": OpinionSpec(pages=5, spaced_headers=True),
+                 "amended": OpinionSpec(pages=6), "other": OpinionSpec(pages=5, seed=2)}
+        pdfs = {name: write_synthetic_opinion_pdf(temp_dir / f"{name}.pdf", spec) for name, spec in specs.items()}
+        
+        with DuplicateIndex(temp_dir / "signatures.db") as dedup:
+            first = run_batch([pdfs["original"], pdfs["other"]], temp_dir / "out", workers=1,
+                              progress=None, dedup=dedup)
+            second = run_batch([pdfs["rebannered"], pdfs["amended"], pdfs["original"]], temp_dir / "out",
+                               workers=1, progress=None, dedup=dedup, link_duplicates=True)
+            stored = len(dedup)
+        
+        duplicates = {r.pdf_path.stem: r.duplicate_of for r in second.results}
+        link = json.loads((temp_dir / "out" / "amended.meta.json").read_text(encoding="utf-8"))
+        converted = sorted(p.stem for p in (temp_dir / "out").glob("*.md"))
+        
+        # When the original fails (its output path is a directory), its
+        # duplicates are converted after all, the first as the new original
+        (temp_dir / "failing" / "original.md").mkdir(parents=True)
+        with DuplicateIndex(temp_dir / "fresh.db") as dedup, JobLedger(temp_dir / "ledger.db") as ledger:
+            third = run_batch([pdfs["original"], pdfs["rebannered"], pdfs["amended"]], temp_dir / "failing",
+                              workers=1, progress=None, dedup=dedup, ledger=ledger)
+            # A duplicate recorded before its original failed is due again (the
+            # original itself waits for its retry backoff)
+            ledger.record(BatchResult(pdfs["other"], True, duplicate_of="original"))
+            due = ledger.remaining(list(pdfs.values()), failed_only=True)
+        outcome = {r.pdf_path.stem: (r.success, r.duplicate_of) for r in third.results}
+    
+    if first.duplicates != 0 or first.succeeded != 2:
+        print("❌ Distinct opinions were treated as duplicates")
+        return False
+    if duplicates != {"rebannered": "original", "amended": "original", "original": None} or stored != 2:
+        print(f"❌ Near-duplicates not found: {duplicates}")
+        return False
+    if link.get("duplicate_of") != "original" or converted != ["original", "other"]:
+        print("❌ Duplicates were converted or not linked")
+        return False
+    if outcome != {"original": (False, None), "rebannered": (True, None), "amended": (True, "rebannered")}:
+        print(f"❌ Duplicates of a failed original were not converted: {outcome}")
+        return False
+    if due != [pdfs["other"]]:
+        print(f"❌ Duplicate of a failed original not due for retry: {due}")
+        return False
+    
+    print("✅ Near-duplicates skipped and linked to the original")
+    return True
+
+def test_watch_daemon():
+    """Test that the watch daemon converts new files once and remembers them."""
+    print("\n🧪 Testing watch-folder daemon...")
+    
+    import time
+    from pdf2md_watch import WatchDaemon
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        inbox, out = Path(temp_dir) / "inbox", Path(temp_dir) / "out"
+        inbox.mkdir()
+        _write_test_pdf(inbox / "waiting.pdf")  # Arrived while the daemon was down
+        data = (inbox / "waiting.pdf").read_bytes()
+        
+        daemon = WatchDaemon([inbox], out, workers=1, debounce=0.3)
+        try:
+            # A PDF written in two parts must only be converted once complete
+            with open(inbox / "upload.pdf", "wb") as f:
+                f.write(data[:len(data) // 2])
+                f.flush()
+                daemon.run_once(timeout=0.1)
+                f.write(data[len(data) // 2:])
+            deadline = time.monotonic() + 30
+            while daemon.converted + daemon.failed < 2 and time.monotonic() < deadline:
+                daemon.run_once(timeout=0.5)
+            converted, failed = daemon.converted, daemon.failed
+        finally:
+            daemon.close()
+        
+        restarted = WatchDaemon([inbox], out, workers=1, debounce=0.3)
+        caught_up = not restarted.pending
+        restarted.close()
+        outputs = sorted(p.name for p in out.glob("*.md"))
+    
+    if (converted, failed) != (2, 0) or outputs != ["upload.md", "waiting.md"]:
+        print(f"❌ Daemon converted {converted}, failed {failed}: {outputs}")
+        return False
+    if not caught_up:
+        print("❌ Restarted daemon queued already converted files")
+        return False
+    
+    print("✅ Watch daemon converts settled uploads and skips them after a restart")
+    return True
+
+_REAL_WATCH_JOB = None
+
+def _crashing_watch_job(pdf_path: str, *args):
+    """Watch daemon job stand-in: a PDF named crash*.pdf kills its worker."""
+    import os
+    if Path(pdf_path).name.startswith("crash"):
+        os._exit(9)
+    return _REAL_WATCH_JOB(pdf_path, *args)
+
+def test_watch_worker_crash():
+    """Test that a dying worker neither stops the daemon nor fails other files for good."""
+    print("\n🧪 Testing watch daemon worker crash...")
+    
+    import time
+    import pdf2md_watch
+    from pdf2md_watch import WatchDaemon, MAX_CRASHES
+    
+    global _REAL_WATCH_JOB
+    _REAL_WATCH_JOB = pdf2md_watch._convert_job
+    pdf2md_watch._convert_job = _crashing_watch_job
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            inbox, out = Path(temp_dir) / "inbox", Path(temp_dir) / "out"
+            inbox.mkdir()
+            for name in ("a.pdf", "crash.pdf", "b.pdf"):
+                _write_test_pdf(inbox / name, pages=1)
+            
+            daemon = WatchDaemon([inbox], out, workers=2, debounce=0.1)
+            try:
+                deadline = time.monotonic() + 60
+                while daemon.converted + daemon.failed < 3 and time.monotonic() < deadline:
+                    daemon.run_once(timeout=0.2)
+                converted, failed = daemon.converted, daemon.failed
+                failures = [Path(path).name for path, _ in daemon.state.failures()]
+            finally:
+                daemon.close()
+            outputs = sorted(p.name for p in out.glob("*.md"))
+    finally:
+        pdf2md_watch._convert_job = _REAL_WATCH_JOB
+    
+    if (converted, failed) != (2, 1) or outputs != ["a.md", "b.md"] or failures != ["crash.pdf"]:
+        print(f"❌ Daemon converted {converted}, failed {failures}: {outputs}")
+        return False
+    
+    print(f"✅ Worker deaths are retried; only the file that crashed {MAX_CRASHES} times is failed")
+    return True
+
+def test_content_blocks():
+    """Test that blocks.jsonl keeps each block's real PDF page."""
+    print("\n🧪 Testing content blocks...")
+    
+    import fitz
+    from pdf2md_core import read_blocks_jsonl
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdf = temp_dir / "opinion.pdf"
+        _write_test_pdf(pdf, pages=3)
+        # A blank page (e.g. a scanned separator) must not shift the page numbers
+        doc = fitz.open(str(pdf))
+        doc.new_page(pno=1)
+        doc.saveIncr()
+        doc.close()
+        
+        _, md_path, _ = convert_pdf_to_markdown(pdf, temp_dir / "plain")
+        ok, blocks_md_path, _ = convert_pdf_to_markdown(pdf, temp_dir / "out", blocks=True)
+        records = list(read_blocks_jsonl(temp_dir / "out" / "opinion.blocks.jsonl"))
+        same_md = md_path.read_text(encoding="utf-8") == blocks_md_path.read_text(encoding="utf-8")
+    
+    pages = [(r["text"][:34], r["sourceRef"]["page"]) for r in records
+             if r["text"].startswith("Plaintiff filed")]
+    expected = [("Plaintiff filed a motion on page 1", 1), ("Plaintiff filed a motion on page 2", 3),
+                ("Plaintiff filed a motion on page 3", 4)]
+    if not ok or not same_md or pages != expected:
+        print(f"❌ Unexpected block pages: {pages}")
+        return False
+    heading = records[1]
+    notes = [(r["footnote"], r["sourceRef"]["page"]) for r in records if r["type"] == "footnote"]
+    if (heading["type"], heading["text"], heading.get("level")) != ("heading", "I. BACKGROUND", 1):
+        print(f"❌ Unexpected heading block: {heading}")
+        return False
+    if notes != [("1", 1), ("2", 3), ("3", 4)] or [r["sequence"] for r in records] != list(range(len(records))):
+        print(f"❌ Unexpected footnote blocks or sequence: {notes}")
+        return False
+    if records[0]["id"] != "opinion:0" or records[0]["sourceRef"]["sourceId"] != "opinion.pdf":
+        print(f"❌ Unexpected block ids: {records[0]}")
+        return False
+    
+    print("✅ Blocks carry exact PDF pages, headings and footnotes")
+    return True
+
+def test_paragraph_index():
+    """Test random access to paragraphs through the .paraidx sidecar."""
+    print("\n🧪 Testing paragraph offset index...")
+    
+    from pdf2md_paraidx import ParagraphIndex
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdf = temp_dir / "opinion.pdf"
+        _write_test_pdf(pdf, pages=4)
+        ok, md_path, _ = convert_pdf_to_markdown(pdf, temp_dir / "out", paragraph_index=True)
+        md = md_path.read_text(encoding="utf-8")
+        expected = [p for p in md.split("\n") if p and p not in ("---PAGE---", "---", "## Footnotes")]
+        
+        with ParagraphIndex(md_path) as paragraphs:
+            texts = [paragraphs[i].text for i in range(len(paragraphs))]
+            heading = paragraphs[1]
+            page_three = paragraphs.pages(3, footnotes=True)
+            last = paragraphs[-1]
+    
+    if not ok or texts != expected:
+        print(f"❌ Index entries do not match the Markdown: {texts}")
+        return False
+    if (heading.kind, heading.text, heading.page) != ("heading", "# I. BACKGROUND", 1):
+        print(f"❌ Unexpected heading entry: {heading}")
+        return False
+    if ([(p.kind, p.page) for p in page_three] != [("paragraph", 3), ("footnote", 3)]
+            or page_three[0].heading != "I. BACKGROUND"
+            or (last.text, last.heading) != ("[^4]: This footnote explains something important.", "Footnotes > 4")):
+        print(f"❌ Unexpected page lookup: {page_three}, {last}")
+        return False
+    
+    print("✅ Paragraph index reads single paragraphs and page ranges")
+    return True
+
+def test_job_ledger():
+    """Test that a ledger-backed batch resumes and retries only failures."""
+    print("\n🧪 Testing batch job ledger...")
+    
+    import time
+    from pdf2md_core import run_batch
+    from pdf2md_ledger import JobLedger
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdfs = [temp_dir / f"op{i}.pdf" for i in range(3)]
+        for pdf in pdfs:
+            _write_test_pdf(pdf, pages=1)
+        broken = temp_dir / "broken.pdf"
+        broken.write_text("not a pdf")
+        inputs = pdfs[:2] + [broken] + pdfs[2:]
+        
+        with JobLedger(temp_dir / "ledger.db") as ledger:
+            # The first run "dies" after two files
+            run_batch(inputs[:2], temp_dir / "out", workers=1, progress=None, ledger=ledger)
+            resumed = run_batch(inputs, temp_dir / "out", workers=1, progress=None, ledger=ledger, resume=True)
+            again = run_batch(inputs, temp_dir / "out", workers=1, progress=None, ledger=ledger, resume=True)
+            done = ledger.get(pdfs[0])
+            failed = ledger.get(broken)
+            due_later = ledger.remaining(inputs, failed_only=True, now=time.time() + 3600)
+            report = ledger.report()
+    
+    if ([r.pdf_path.name for r in resumed.results] != ["broken.pdf", "op2.pdf"]
+            or resumed.skipped != 2 or again.results or again.skipped != 4):
+        print(f"❌ Resume converted {[r.pdf_path.name for r in resumed.results]}, then {again.results}")
+        return False
+    if (done.status, done.attempts) != ("done", 1) or not done.md_sha256 or done.seconds <= 0:
+        print(f"❌ Unexpected ledger entry: {done}")
+        return False
+    if (failed.status, failed.attempts) != ("failed", 1) or not failed.error or due_later != [broken]:
+        print(f"❌ Failed file not scheduled for retry: {failed}, {due_later}")
+        return False
+    if "3 done, 1 failed" not in report or "broken.pdf" not in report:
+        print(f"❌ Unexpected ledger report:\n{report}")
+        return False
+    
+    print("✅ Job ledger resumes interrupted runs and backs off failed files")
+    return True
+
+def test_document_watchdog():
+    """Test that a hung or oversized document fails alone in a batch."""
+    print("\n🧪 Testing per-document watchdog...")
+    
+    import os
+    import fitz
+    from pdf2md_core import run_batch
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        good = [temp_dir / "a.pdf", temp_dir / "b.pdf"]
+        for pdf in good:
+            _write_test_pdf(pdf, pages=1)
+        # Opening a FIFO blocks until something writes to it: a conversion that never ends
+        stuck = temp_dir / "stuck.blocks"
+        os.mkfifo(stuck)
+        
+        # Dense enough to grow the worker by several MB and outlast a memory check
+        large = temp_dir / "large.pdf"
+        doc = fitz.open()
+        for _ in range(80):
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (36, 36, -36, -36),
+                                " ".join(f"word{i}" for i in range(1500)), fontsize=6)
+        doc.save(str(large))
+        doc.close()
+        
+        timed = run_batch([good[0], stuck, good[1]], temp_dir / "out", workers=1, progress=None, timeout=1.0)
+        capped = run_batch([large], temp_dir / "out", workers=1, progress=None, timeout=30, memory_limit=1 << 20)
+        # The limit counts from the worker's startup size, which is already
+        # more than this, so an idle document is not over it
+        idle = run_batch([stuck], temp_dir / "out", workers=1, progress=None, timeout=1.0, memory_limit=32 << 20)
+    
+    outcome = [(r.pdf_path.name, r.success, r.failure) for r in timed.results]
+    if outcome != [("a.pdf", True, None), ("stuck.blocks", False, "timeout"), ("b.pdf", True, None)]:
+        print(f"❌ Unexpected timeout handling: {outcome}")
+        return False
+    if [(r.success, r.failure) for r in capped.results] != [(False, "oom")]:
+        print(f"❌ Unexpected memory limit handling: {capped.results}")
+        return False
+    if [(r.success, r.failure) for r in idle.results] != [(False, "timeout")]:
+        print(f"❌ Memory limit not counted from the worker's startup size: {idle.results}")
+        return False
+    
+    print("✅ Stuck and oversized documents are killed without stalling the batch")
+    return True
+
+def _startup_seconds(args, runs=3):
+    """Best-of-N wall time for a fresh interpreter running ``args``."""
+    import subprocess
+    import time
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable] + args, cwd=Path(__file__).parent,
+                              capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, proc
+
+def test_import_time():
+    """Test that the converter and its entry points stay within their cold-start budgets."""
+    print("\n🧪 Testing import time...")
+    
+    import os
+    # Seconds allowed on top of a baseline measured in the same run, so a
+    # loaded machine slows both sides; PDF2MD_STARTUP_BUDGET overrides it.
+    # Measured ~0.10-0.18s over bare startup on a 1-CPU box, so about twice
+    # that; the eager tree (PyMuPDF and every pattern at import) was ~0.40s
+    budget = float(os.environ.get("PDF2MD_STARTUP_BUDGET", "0.25"))
+    probe = (
+        "import sys, pdf2md_core; "
+        "print(int('fitz' in sys.modules or 'pymupdf' in sys.modules), "
+        "int(pdf2md_core.BOILERPLATE_RE._compiled is not None))"
+    )
+    
+    _, proc = _startup_seconds(["-X", "importtime", "-c", probe], runs=1)
+    if proc.returncode != 0:
+        print(f"❌ Import probe failed: {proc.stderr.strip()[-200:]}")
+        return False
+    if proc.stdout.split() != ["0", "0"]:
+        print(f"❌ PyMuPDF or rule patterns loaded at import time: {proc.stdout.strip()}")
+        return False
+    
+    # --help of the examples CLI must not load the converter at all
+    _, proc = _startup_seconds(["-X", "importtime", "examples.py", "cli", "--help"], runs=1)
+    loaded = [name for name in ("pdf2md_core", "fitz", "pymupdf")
+              if any(line.rstrip().endswith("| " + name) for line in proc.stderr.splitlines())]
+    if proc.returncode != 0 or loaded:
+        print(f"❌ examples.py cli --help loaded {loaded or proc.stderr.strip()[-200:]}")
+        return False
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_path = Path(temp_dir) / "info.pdf"
+        _write_test_pdf(pdf_path, pages=2)
+        bare, _ = _startup_seconds(["-c", "pass"])
+        with_fitz, _ = _startup_seconds(["-c", "import fitz"])
+        # (label, command, baseline it must stay within budget of)
+        entry_points = [
+            ("import pdf2md_core", ["-c", "import pdf2md_core"], bare),
+            ("pdf2md_core.py", ["pdf2md_core.py"], bare),
+            ("examples.py cli --help", ["examples.py", "cli", "--help"], bare),
+            # info needs PyMuPDF, so only the converter's own share is budgeted
+            ("examples.py cli info", ["examples.py", "cli", "info", str(pdf_path)], with_fitz),
+        ]
+        for label, args, baseline in entry_points:
+            elapsed, proc = _startup_seconds(args)
+            if label == "examples.py cli info" and proc.returncode != 0:
+                print(f"❌ {label} failed: {proc.stderr.strip()[-200:]}")
+                return False
+            if elapsed - baseline > budget:
+                print(f"❌ {label} took {elapsed:.3f}s, {elapsed - baseline:.3f}s over "
+                      f"its {baseline:.3f}s baseline (budget {budget}s)")
+                return False
+            print(f"   {label}: {elapsed - baseline:+.3f}s over baseline")
+    
+    print(f"✅ Entry points start within {budget}s of baseline without loading PyMuPDF early")
+    return True
+
+def test_command_line():
+    """Test that the converter's command line rejects malformed arguments cleanly."""
+    print("\n🧪 Testing command line parsing...")
+    
+    import subprocess
+    
+    def run(*args):
+        return subprocess.run([sys.executable, "pdf2md_core.py", *args], cwd=Path(__file__).parent,
+                              capture_output=True, text=True)
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        pdf = temp_dir / "opinion.pdf"
+        _write_test_pdf(pdf, pages=1)
+        out = temp_dir / "out"
+        
+        malformed = [
+            ([str(temp_dir), str(out), "--workers"], "expected one argument"),
+            ([str(temp_dir), str(out), "--workers", "x"], "not a whole number"),
+            ([str(temp_dir), str(out), "--bogus"], "unrecognized arguments"),
+            ([str(temp_dir), str(out), "--resume"], "need --ledger"),
+            (["search", str(temp_dir / "opinions.db")], "required"),
+            (["paragraphs", str(out / "opinion.md"), "two"], "not a whole number"),
+        ]
+        for args, message in malformed:
+            proc = run(*args)
+            if proc.returncode != 2 or "Traceback" in proc.stderr or message not in proc.stderr:
+                print(f"❌ {' '.join(args[-2:])}: exit {proc.returncode}: {proc.stderr.strip()[-200:]}")
+                return False
+        
+        # Options may come before the paths, and convert is the default command
+        proc = run("--meta-only", str(pdf), str(out))
+        if proc.returncode != 0 or not (out / "opinion.meta.json").exists():
+            print(f"❌ Options before the paths failed: {proc.stdout.strip()[-200:]}")
+            return False
+        proc = run("ledger-report", str(temp_dir / "missing.db"))
+        if proc.returncode != 1 or not proc.stdout.startswith("ERROR:"):
+            print(f"❌ Missing ledger not reported cleanly: {proc.stdout.strip()[-200:]}")
+            return False
+    
+    print("✅ Malformed arguments give a usage error instead of a traceback")
+    return True
+
+def _fake_ocr(png: bytes) -> str:
+    """OCR engine stand-in for tests: every page reads the same."""
+    return "Text recovered by OCR from a scanned page.\n\nSecond OCR paragraph."
+
+def test_scanned_triage():
+    """Test that scanned PDFs are triaged away from the text path and OCRed."""
+    print("\n🧪 Testing scanned PDF triage and OCR...")
+    
+    import fitz
+    from pdf2md_core import (triage_pdf, register_ocr_engine, run_batch, convert_pdf, ScannedPdfError,
+                             ConversionCache)
+    
+    register_ocr_engine("test", _fake_ocr)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_dir = Path(temp_dir)
+        text_pdf = temp_dir / "a_text.pdf"
+        scanned_pdf = temp_dir / "b_scanned.pdf"
+        _write_test_pdf(text_pdf, pages=2)
+        # Rasterize the text PDF: same pages, images only
+        src, scan = fitz.open(str(text_pdf)), fitz.open()
+        for page in src:
+            scan.new_page(width=page.rect.width, height=page.rect.height).insert_image(
+                page.rect, pixmap=page.get_pixmap(dpi=50))
+        scan.save(str(scanned_pdf))
+        src.close()
+        scan.close()
+        
+        kinds = (triage_pdf(text_pdf).kind, triage_pdf(scanned_pdf).kind)
+        try:
+            convert_pdf(scanned_pdf)
+            refused = False
+        except ScannedPdfError:
+            refused = True
+        plain = run_batch([text_pdf, scanned_pdf], temp_dir / "plain", workers=1, progress=None)
+        ocred = run_batch([scanned_pdf, text_pdf], temp_dir / "ocr", workers=2, progress=None,
+                          ocr_engine="test", ocr_workers=1)
+        # One cache, several engines: a cached OCR result belongs to its engine only
+        cache = ConversionCache(temp_dir / "cache")
+        register_ocr_engine("other", lambda png: "Another engine's reading of the page.")
+        cached_runs = [convert_pdf(scanned_pdf, cache=cache, ocr_engine="test")[0],
+                       convert_pdf(scanned_pdf, cache=cache, ocr_engine="other")[0]]
+        try:
+            convert_pdf(scanned_pdf, cache=cache)
+            refused_cached = False
+        except ScannedPdfError:
+            refused_cached = True
+        md = (temp_dir / "ocr" / "b_scanned.md").read_text(encoding="utf-8")
+        meta = json.loads((temp_dir / "ocr" / "b_scanned.meta.json").read_text(encoding="utf-8"))
+        text_meta = json.loads((temp_dir / "plain" / "a_text.meta.json").read_text(encoding="utf-8"))
+    
+    if kinds != ("text", "scanned") or not refused:
+        print(f"❌ Triage kinds {kinds}, scanned conversion refused: {refused}")
+        return False
+    if ("Text recovered by OCR" not in cached_runs[0] or "Another engine" not in cached_runs[1]
+            or not refused_cached):
+        print(f"❌ Cached OCR output reused across engines: {cached_runs}, refused {refused_cached}")
+        return False
+    if [(r.success, r.failure) for r in plain.results] != [(True, None), (False, "scanned")]:
+        print(f"❌ Scanned PDF not failed on the text path: {plain.results}")
+        return False
+    if [r.pdf_path.name for r in ocred.results] != ["b_scanned.pdf", "a_text.pdf"] or ocred.failed:
+        print(f"❌ OCR stage results out of order or failed: {ocred.results}")
+        return False
+    if "Text recovered by OCR" not in md or meta["triage"]["kind"] != "scanned" \
+            or meta["triage"]["ocr_engine"] != "test" or text_meta["triage"]["kind"] != "text":
+        print(f"❌ Unexpected OCR output or triage metadata: {meta.get('triage')}")
+        return False
+    
+    print("✅ Scanned PDFs are detected, refused without OCR and converted by the OCR pool")
+    return True
+
+def test_court_profiles():
+    """Test that the first page selects the court profile and only its rules run."""
+    print("\n🧪 Testing court profiles...")
+    
+    import fitz
+    import pdf2md_core
+    from pdf2md_core import (COURT_PROFILES, COURT_PROFILE_DIR, select_court_profile, get_line_classifier,
+                             convert_pdf, profile_cache_path, ConversionCache, _FilteredPatterns,
+                             _save_profile_filters)
+    
+    opinions = {
+        "msc": ["MICHIGAN SUPREME COURT", "Lansing, Michigan", "Chief Justice: Jane Roe",
+                "Justices: A, B, C", "MSC 165432 DOE V ROE Opinion - Published 7/9/2025",
+                "FILED July 9, 2025", "No. 165432", "BEFORE THE ENTIRE BENCH", "",
+                "The question presented is narrow. We affirm."],
+        "trial_order": ["STATE OF MICHIGAN", "IN THE CIRCUIT COURT FOR THE COUNTY OF WAYNE",
+                        "Case No. 24-001234-CZ", "At a session of said Court held on March 3, 2025",
+                        "OPINION AND ORDER", "", "The motion is granted. IT IS SO ORDERED."],
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, lines in opinions.items():
+            pdf = Path(temp_dir) / f"{name}.pdf"
+            doc = fitz.open()
+            doc.new_page().insert_text((72, 72), "\n".join(lines), fontsize=10)
+            doc.save(str(pdf))
+            doc.close()
+            results[name] = convert_pdf(pdf)
+    
+    picked = {name: select_court_profile("\n".join(lines)).name for name, lines in opinions.items()}
+    picked["coa"] = select_court_profile("STATE OF MICHIGAN\nCOURT OF APPEALS\n").name
+    picked["unknown"] = select_court_profile("Some other document").name
+    if picked != {"msc": "msc", "trial_order": "trial_order", "coa": "coa", "unknown": "coa"}:
+        print(f"❌ Wrong profiles selected: {picked}")
+        return False
+    
+    msc_md, msc_meta = results["msc"]
+    order_md, order_meta = results["trial_order"]
+    if (msc_meta["court"] != "Michigan Supreme Court" or msc_meta["case_name"] != "DOE v ROE"
+            or "Chief Justice" in msc_md or not msc_md.startswith("BEFORE THE ENTIRE BENCH")):
+        print(f"❌ Supreme Court profile not applied: {msc_meta}\n{msc_md}")
+        return False
+    if (order_meta["court"] != "CIRCUIT COURT FOR THE COUNTY OF WAYNE" or order_meta["case_no"] != "24-001234-CZ"
+            or not order_md.startswith("OPINION AND ORDER")):
+        print(f"❌ Trial order profile not applied: {order_meta}\n{order_md}")
+        return False
+    
+    # Filters restored from the profile cache behave like freshly analyzed ones
+    clf = get_line_classifier(COURT_PROFILES["msc"])
+    for kind, filt in clf.filters().items():
+        restored = _FilteredPatterns.from_dict(json.loads(json.dumps(filt.to_dict())))
+        for line in ["Chief Justice: X", "  lansing, michigan", "-3-", "The court held", "BEFORE THE ENTIRE BENCH"]:
+            if restored.candidates(line) != filt.candidates(line):
+                print(f"❌ Cached {kind} filter differs on {line!r}")
+                return False
+    
+    # The profile cache lives outside the source tree (next to a conversion
+    # cache when one is used), and a save keeps other processes' profiles
+    if COURT_PROFILE_DIR in profile_cache_path().parents:
+        print(f"❌ Court profile cache written into the source tree: {profile_cache_path()}")
+        return False
+    saved_dir = pdf2md_core._PROFILE_CACHE_DIR
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pdf = Path(temp_dir) / "coa.pdf"
+            _write_test_pdf(pdf, pages=1)
+            cache = ConversionCache(Path(temp_dir) / "cache")
+            convert_pdf(pdf, cache=cache)
+            path = profile_cache_path()
+            if path.parent != cache.cache_dir:
+                print(f"❌ Court profile cache not kept with the conversion cache: {path}")
+                return False
+            other = {"version": pdf2md_core.PROFILE_CACHE_VERSION, "profiles": {"other": {"sources": {}}}}
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(other), encoding="utf-8")
+            msc = COURT_PROFILES["msc"]
+            sources = {"boilerplate": list(msc.boilerplate), "body": []}
+            _save_profile_filters("msc", sources, clf.filters())
+            saved = json.loads(path.read_text(encoding="utf-8"))["profiles"]
+            if sorted(saved) != ["msc", "other"]:
+                print(f"❌ Saving a profile dropped another worker's entries: {sorted(saved)}")
+                return False
+    finally:
+        pdf2md_core._use_profile_cache_dir(saved_dir)
+    
+    print("✅ Supreme Court and trial order documents use their own profiles")
+    return True
+
+def test_regression_gate():
+    """Test that the corpus regression gate reports changed output between versions."""
+    print("\n🧪 Testing regression gate...")
+    
+    import shutil
+    from pdf2md_regress import run_regression, check_gate, checkout_version
+    
+    here = Path(__file__).parent
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp = Path(temp_dir)
+        corpus = temp / "corpus"
+        corpus.mkdir()
+        for name, pages in (("short", 1), ("long", 3)):
+            _write_test_pdf(corpus / f"{name}.pdf", pages)
+        pdfs = sorted(corpus.glob("*.pdf"))
+        
+        # A rule edit: copy the converter and drop one more line as boilerplate
+        edited = temp / "edited"
+        edited.mkdir()
+        shutil.copy(here / "pdf2md_core.py", edited)
+        shutil.copytree(here / "court_profiles", edited / "court_profiles",
+                        ignore=shutil.ignore_patterns("__pycache__"))
+        profile_path = edited / "court_profiles" / "coa.json"
+        profile = json.loads(profile_path.read_text(encoding="utf-8"))
+        profile["boilerplate"].append(r"^and\s+the\s+case\s+continued\b.*$")
+        profile_path.write_text(json.dumps(profile), encoding="utf-8")
+        
+        same = run_regression(str(here), str(here), pdfs, temp / "same")
+        if same["changed"] or check_gate(same, max_slowdown=100, max_memory=100):
+            print(f"❌ Identical versions reported as different: {same['changed']}")
+            return False
+        
+        drift = run_regression(str(here), str(edited), pdfs, temp / "drift")
+        lines = {d["name"]: d["md_lines_changed"] for d in drift["documents"]}
+        if sorted(drift["changed"]) != ["long.pdf", "short.pdf"] or not all(lines.values()):
+            print(f"❌ Rule edit not detected: {drift['changed']} {lines}")
+            return False
+        if not check_gate(drift, max_slowdown=100, max_memory=100):
+            print("❌ Gate passed although every document changed")
+            return False
+        if check_gate(drift, max_changed="100%", max_slowdown=100, max_memory=100):
+            print("❌ Gate failed although all changes were allowed")
+            return False
+        if not (temp / "drift" / "diffs" / "long.diff").exists():
+            print("❌ No diff written for a changed document")
+            return False
+        if drift["summary"]["new"]["p95_seconds"] is None:
+            print(f"❌ No timings collected: {drift['summary']}")
+            return False
+        
+        try:
+            version_dir, _ = checkout_version("HEAD", temp / "head")
+            if not (version_dir / "pdf2md_core.py").exists():
+                print("❌ Git revision export has no pdf2md_core.py")
+                return False
+        except ValueError:
+            print("⚠️  Not a git checkout; revision export not tested")
+    
+    print("✅ Regression gate flags rule changes and passes identical versions")
+    return True
+
 def test_with_sample_pdf(pdf_path: Path):
     """Test conversion with an actual PDF file."""
     print(f"\n📄 Testing with PDF: {pdf_path}")
@@ -153,6 +1464,35 @@ def main():
     
     # Test basic functionality first
     test_basic_functionality()
+    test_line_classifier()
+    test_batch_engine()
+    test_conversion_cache()
+    test_streaming_conversion()
+    test_in_memory_conversion()
+    test_conversion_pool()
+    test_conversion_pool_timeout()
+    test_synthetic_opinion_pdf()
+    test_conversion_stats()
+    test_extraction_snapshot()
+    test_footnote_ref_linking()
+    test_metadata_only()
+    test_page_layout()
+    test_parallel_page_extraction()
+    test_search_index()
+    test_search_index_pages()
+    test_citation_index()
+    test_near_duplicates()
+    test_watch_daemon()
+    test_watch_worker_crash()
+    test_content_blocks()
+    test_paragraph_index()
+    test_job_ledger()
+    test_document_watchdog()
+    test_import_time()
+    test_command_line()
+    test_scanned_triage()
+    test_court_profiles()
+    test_regression_gate()
     
     # Look for sample PDF files to test with
     current_dir = Path(__file__).parent